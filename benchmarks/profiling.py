@@ -0,0 +1,256 @@
+"""
+Produces a detailed profile of a single benchmark, attributing its time to
+Python functions, to git processes and to memory allocations.
+
+The benchmark is executed several times, once for each kind of measurement,
+so that the overhead of one profiler does not distort the results of the
+others:
+
+1. a timing pass, which splits the wall time of the benchmark into the CPU
+   time spent in Python and the time spent blocked (i.e., waiting on git),
+   and counts the git processes that were launched;
+2. a cProfile pass, whose statistics are sorted by cumulative time;
+3. a sampling pass, which periodically records the stack of the main thread
+   and writes the samples in the collapsed-stack format accepted by
+   flamegraph tools (e.g., flamegraph.pl and speedscope); and
+4. a tracemalloc pass, which reports the peak traced memory and the sites
+   responsible for the most allocated memory.
+"""
+from typing import Any, Callable, Dict, List, Optional
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import git
+from blameandshame.stats import InstrumentedGit, Recorder
+
+
+def _timing(f: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Measures the wall time of a function, together with the CPU time used by
+    the calling thread, the CPU time used by (finished) child processes, and
+    the git processes launched by any repository opened during the call.
+    """
+    recorder = Recorder(lambda: (0, 0))
+    wrapper_type = git.Repo.GitCommandWrapperType
+    git.Repo.GitCommandWrapperType = InstrumentedGit
+    InstrumentedGit.recorder = recorder
+    try:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = time.thread_time()
+        start = time.perf_counter()
+        f()
+        wall_time = time.perf_counter() - start
+        cpu_time = time.thread_time() - cpu
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    finally:
+        git.Repo.GitCommandWrapperType = wrapper_type
+        InstrumentedGit.recorder = None
+
+    commands = recorder.summary()['git']
+    return {
+        'wall_time': wall_time,
+        'python_cpu_time': cpu_time,
+        'blocked_time': max(0.0, wall_time - cpu_time),
+        'git_processes': sum(c['calls'] for c in commands.values()),
+        'git_process_time': sum(c['time'] for c in commands.values()),
+        'git_cpu_time': (children_after.ru_utime - children.ru_utime) +
+                        (children_after.ru_stime - children.ru_stime),
+        'git_commands': commands
+    }
+
+
+def _cprofile(f: Callable[[], Any], outdir: str, top: int) -> str:
+    """
+    Profiles a function with cProfile, writing the raw statistics to
+    `cprofile.prof` and a report sorted by cumulative time to
+    `cprofile.txt`, and returns the report.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(f)
+    profiler.dump_stats(os.path.join(outdir, 'cprofile.prof'))
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(top)
+    report = out.getvalue()
+    with open(os.path.join(outdir, 'cprofile.txt'), 'w') as fh:
+        fh.write(report)
+    return report
+
+
+class StackSampler(object):
+    """
+    Periodically samples the stack of a given thread from a background
+    thread, counting the number of times that each distinct stack is seen.
+    """
+    def __init__(self, thread_id: int, interval: float = 0.001) -> None:
+        self.__thread_id = thread_id
+        self.__interval = interval
+        self.__counts: Dict[str, int] = {}
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    @staticmethod
+    def _frame_name(frame: Any) -> str:
+        code = frame.f_code
+        return '{} ({}:{})'.format(code.co_name,
+                                   os.path.basename(code.co_filename),
+                                   code.co_firstlineno)
+
+    def __run(self) -> None:
+        while not self.__stop.wait(self.__interval):
+            frame = sys._current_frames().get(self.__thread_id)
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                names.append(StackSampler._frame_name(frame))
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.__counts[stack] = self.__counts.get(stack, 0) + 1
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        self.__thread.join()
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        """
+        The number of samples of each stack, given in collapsed form (i.e.,
+        as a semicolon-separated list of frames, outermost first).
+        """
+        return self.__counts
+
+    def write(self, path: str) -> None:
+        """
+        Writes the samples in the collapsed-stack format, with one line per
+        distinct stack, followed by its number of samples.
+        """
+        with open(path, 'w') as fh:
+            for (stack, count) in sorted(self.__counts.items()):
+                fh.write('{} {}\n'.format(stack, count))
+
+
+def _sample(f: Callable[[], Any], outdir: str, interval: float) -> int:
+    """
+    Samples the stack of the current thread while executing a function, and
+    writes the samples to `stacks.folded`.
+
+    Returns:
+        The number of samples that were taken.
+    """
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        f()
+    finally:
+        sampler.stop()
+    sampler.write(os.path.join(outdir, 'stacks.folded'))
+    return sum(sampler.counts.values())
+
+
+def _tracemalloc(f: Callable[[], Any],
+                 outdir: str,
+                 top: int
+                 ) -> Dict[str, Any]:
+    """
+    Traces the memory allocated by a function, writing the sites responsible
+    for the most allocated memory that was still alive at the end of the
+    call to `tracemalloc.txt`.
+    """
+    tracemalloc.start(10)
+    try:
+        f()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+    ])
+    sites = snapshot.statistics('lineno')[:top]
+    with open(os.path.join(outdir, 'tracemalloc.txt'), 'w') as fh:
+        fh.write('peak traced memory: {} bytes\n\n'.format(peak))
+        for stat in sites:
+            fh.write('{}\n'.format(stat))
+    return {
+        'peak_bytes': peak,
+        'top_sites': [{'site': str(stat.traceback),
+                       'bytes': stat.size,
+                       'count': stat.count}
+                      for stat in sites]
+    }
+
+
+def profile(f: Callable[[], Any],
+            outdir: str,
+            interval: float = 0.001,
+            top: int = 25
+            ) -> Dict[str, Any]:
+    """
+    Profiles a given benchmark and writes the results to a given directory.
+
+    Params:
+      outdir: The directory to which the profiles should be written.
+      interval: The number of seconds between each sample of the stack.
+      top: The number of functions (and allocation sites) to report.
+
+    Returns:
+        A summary of the profile, which is also written to `summary.json`.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    summary: Dict[str, Any] = {'timing': _timing(f)}
+    summary['cprofile'] = _cprofile(f, outdir, top)
+    summary['samples'] = _sample(f, outdir, interval)
+    summary['tracemalloc'] = _tracemalloc(f, outdir, top)
+    with open(os.path.join(outdir, 'summary.json'), 'w') as fh:
+        json.dump({k: v for (k, v) in summary.items() if k != 'cprofile'},
+                  fh, indent=2)
+    return summary
+
+
+def report(summary: Dict[str, Any], outdir: Optional[str] = None) -> str:
+    """
+    Formats a summary of a profile for display.
+    """
+    timing = summary['timing']
+    wall_time = timing['wall_time'] or 1.0
+    lines = [
+        '  wall time: {:.3f} seconds'.format(timing['wall_time']),
+        '  python (cpu): {:.3f} seconds ({:.0%})'.format(
+            timing['python_cpu_time'],
+            timing['python_cpu_time'] / wall_time),
+        '  blocked (waiting on git): {:.3f} seconds ({:.0%})'.format(
+            timing['blocked_time'], timing['blocked_time'] / wall_time),
+        '  git processes: {} ({:.3f} seconds in synchronous calls, '
+        '{:.3f} seconds of git cpu)'.format(timing['git_processes'],
+                                            timing['git_process_time'],
+                                            timing['git_cpu_time']),
+    ]
+    for (command, c) in sorted(timing['git_commands'].items(),
+                               key=lambda kv: -kv[1]['time']):
+        lines.append('    git {}: {} processes, {:.3f} seconds'.format(
+            command, c['calls'], c['time']))
+    lines.append('  peak traced memory: {:.1f} MiB'.format(
+        summary['tracemalloc']['peak_bytes'] / 2 ** 20))
+    for site in summary['tracemalloc']['top_sites'][:5]:
+        lines.append('    {:.1f} KiB in {} blocks at {}'.format(
+            site['bytes'] / 1024, site['count'], site['site']))
+    lines.append('  stack samples: {}'.format(summary['samples']))
+    if outdir is not None:
+        lines.append('  profiles written to: {}'.format(outdir))
+    lines.append('')
+    lines.append(summary['cprofile'])
+    return '\n'.join(lines)
@@ -0,0 +1,212 @@
+"""
+Generates deterministic git repositories for use by the benchmarks.
+
+Each repository is described by a small set of scaling parameters, and is
+built from a seeded random number generator using `git fast-import`, so
+that the same parameters always produce the same repository (down to its
+commit hashes) without requiring network access.
+"""
+from typing import Dict, Iterator, List, NamedTuple, Set
+import os
+import random
+import shutil
+import subprocess
+
+# A small vocabulary, used to generate the contents of each line.
+WORDS = ['int', 'return', 'if', 'else', 'for', 'while', 'x', 'y', 'count',
+         'value', 'node', 'result', '=', '+', '(', ')', '{', '}', ';', '0',
+         '1', 'null', 'this', 'self', 'list', 'map', 'get', 'set']
+
+AUTHORS = [('Alice', 'alice@example.com'),
+           ('Bob', 'bob@example.com'),
+           ('Carol', 'carol@example.com'),
+           ('Dave', 'dave@example.com')]
+
+# The time of the first commit in each repository.
+EPOCH = 1500000000
+
+
+class Params(NamedTuple):
+    """
+    Describes the shape of a synthetic repository.
+
+    Attributes:
+      commits: The number of commits on the main line of history,
+        including merges.
+      files: The number of files in the repository.
+      lines: The number of lines initially contained in each file.
+      churn: The fraction of files that are modified by each commit.
+      merge_every: The number of commits between each merge of a side
+        branch into the main line, or zero if no merges should be made.
+      seed: The seed used to generate the repository.
+    """
+    commits: int = 100
+    files: int = 20
+    lines: int = 200
+    churn: float = 0.1
+    merge_every: int = 0
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        """
+        A name that uniquely identifies these parameters.
+        """
+        return 'c{}-f{}-l{}-ch{}-m{}-s{}'.format(*self)
+
+
+def filename(i: int) -> str:
+    """
+    Returns the name of the i-th file in a synthetic repository.
+    """
+    return 'src/mod{}/file{:04d}.txt'.format(i % 8, i)
+
+
+class _Generator(object):
+    def __init__(self, params: Params) -> None:
+        self.params = params
+        self.rng = random.Random(params.seed)
+        self.time = EPOCH
+        self.mark = 0
+
+    def line(self) -> str:
+        return ' '.join(self.rng.choice(WORDS)
+                        for _ in range(self.rng.randint(1, 8)))
+
+    def edit(self, lines: List[str]) -> List[str]:
+        """
+        Applies between one and three random hunks to a file.
+        """
+        lines = list(lines)
+        for _ in range(self.rng.randint(1, 3)):
+            start = self.rng.randint(0, len(lines))
+            removed = self.rng.randint(0, 4)
+            added = self.rng.randint(0 if removed else 1, 4)
+            lines[start:start + removed] = [self.line()
+                                            for _ in range(added)]
+        return lines
+
+    def commit(self,
+               ref: str,
+               message: str,
+               changes: Dict[str, List[str]],
+               parents: List[int]
+               ) -> Iterator[bytes]:
+        """
+        Yields the fast-import commands for a single commit on a given ref,
+        with the given parents (identified by their marks), that replaces
+        the contents of each of the given files.
+        """
+        self.mark += 1
+        self.time += self.rng.randint(60, 7200)
+        name, email = AUTHORS[self.rng.randrange(len(AUTHORS))]
+        msg = message.encode()
+        yield 'commit {}\nmark :{}\n'.format(ref, self.mark).encode()
+        yield 'author {} <{}> {} +0000\n'.format(name, email,
+                                                 self.time).encode()
+        yield 'committer {} <{}> {} +0000\n'.format(name, email,
+                                                    self.time).encode()
+        yield 'data {}\n'.format(len(msg)).encode() + msg + b'\n'
+        for (i, parent) in enumerate(parents):
+            yield '{} :{}\n'.format('from' if i == 0 else 'merge',
+                                    parent).encode()
+        for (path, lines) in sorted(changes.items()):
+            data = ''.join(line + '\n' for line in lines).encode()
+            yield 'M 100644 inline {}\ndata {}\n'.format(path,
+                                                         len(data)).encode()
+            yield data + b'\n'
+
+    def changed_files(self, candidates: List[int]) -> Set[int]:
+        num = max(1, int(round(self.params.churn * self.params.files)))
+        num = min(num, len(candidates))
+        return set(self.rng.sample(candidates, num))
+
+    def stream(self) -> Iterator[bytes]:
+        params = self.params
+        contents = {i: [self.line() for _ in range(params.lines)]
+                    for i in range(params.files)}
+        yield from self.commit('refs/heads/master', 'initial commit',
+                               {filename(i): lines
+                                for (i, lines) in contents.items()},
+                               [])
+        head = self.mark
+        everything = list(range(params.files))
+
+        num = 1
+        while num < params.commits:
+            merging = params.merge_every > 0 and params.files > 1 \
+                and num + 1 < params.commits \
+                and num % params.merge_every == 0
+            if not merging:
+                changed = self.changed_files(everything)
+                for i in changed:
+                    contents[i] = self.edit(contents[i])
+                yield from self.commit(
+                    'refs/heads/master', 'commit {}'.format(num),
+                    {filename(i): contents[i] for i in changed},
+                    [head])
+                head = self.mark
+                num += 1
+                continue
+
+            # develop a side branch alongside the main line, with each
+            # touching a disjoint set of files, and then merge it back.
+            side_files = everything[1::2]
+            main_files = everything[0::2]
+            side_contents = dict(contents)
+            side_head = head
+            length = max(1, params.merge_every // 2)
+            for k in range(length):
+                changed = self.changed_files(side_files)
+                for i in changed:
+                    side_contents[i] = self.edit(side_contents[i])
+                yield from self.commit(
+                    'refs/heads/side', 'side commit {}.{}'.format(num, k),
+                    {filename(i): side_contents[i] for i in changed},
+                    [side_head])
+                side_head = self.mark
+
+                if num + 1 < params.commits:
+                    changed = self.changed_files(main_files)
+                    for i in changed:
+                        contents[i] = self.edit(contents[i])
+                    yield from self.commit(
+                        'refs/heads/master', 'commit {}'.format(num),
+                        {filename(i): contents[i] for i in changed},
+                        [head])
+                    head = self.mark
+                    num += 1
+
+            for i in side_files:
+                contents[i] = side_contents[i]
+            yield from self.commit(
+                'refs/heads/master', 'merge side branch',
+                {filename(i): contents[i] for i in side_files},
+                [head, side_head])
+            head = self.mark
+            num += 1
+
+
+def generate(params: Params, path: str) -> str:
+    """
+    Generates a synthetic repository with the given parameters at a given
+    location, unless it already exists, and returns its location.
+    """
+    if os.path.exists(os.path.join(path, '.git')):
+        return path
+    tmp = '{}.tmp'.format(path)
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    subprocess.check_call(['git', 'init', '-q', tmp])
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet'],
+                            cwd=tmp, stdin=subprocess.PIPE)
+    try:
+        for chunk in _Generator(params).stream():
+            proc.stdin.write(chunk)
+        proc.stdin.close()
+    finally:
+        if proc.wait() != 0:
+            raise RuntimeError('git fast-import failed')
+    subprocess.check_call(['git', 'checkout', '-q', '-f', 'master'], cwd=tmp)
+    os.rename(tmp, path)
+    return path
@@ -0,0 +1,387 @@
+"""
+Provides an asyncio interface to a Project, allowing many git queries to be
+answered concurrently from a single thread.
+
+Each query launches its git processes using asyncio.create_subprocess_exec,
+subject to a limit on the number of git processes that may run at once, and
+stores its results in the same in-memory and on-disk caches as the
+synchronous Project API, under the same keys. Results computed by either API
+are therefore reused by the other.
+
+Queries that are answered from the caches, or that require only cheap
+lookups via the project's persistent `git cat-file` process, are answered
+inline by the synchronous API. Since GitPython's persistent processes are
+not thread-safe, the only work done on another thread is the walk over the
+history of a file performed by `commits_to_lines`, which uses its own handle
+on the repository.
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, \
+    Optional, Tuple
+import asyncio
+import time
+import weakref
+import git
+from blameandshame.annotate import Column, annotate, \
+    column_num_file_commits_after_modified, \
+    column_num_project_commits_after_modified, \
+    column_project_age_commits, column_was_modified_by_commit
+from blameandshame.base import LineSet
+from blameandshame.project import Project
+from blameandshame.project.blobs import BlobReader
+from blameandshame.project.diff import DIFF_TREE_ARGS, DiffSummary, \
+    parse_diff
+from blameandshame.project.graph import CommitGraph
+from blameandshame.stats import InstrumentedGit
+
+
+class AsyncProject(object):
+    """
+    Answers queries about a given project using concurrent git processes.
+    """
+    def __init__(self, project: Project, max_processes: int = 8) -> None:
+        """
+        Params:
+          project: The project whose queries should be answered, and whose
+            caches should be used to store the results.
+          max_processes: The maximum number of git processes that may be
+            running at any one time.
+        """
+        assert max_processes > 0
+        self.__project = project
+        self.__max_processes = max_processes
+        self.__semaphores: weakref.WeakKeyDictionary = \
+            weakref.WeakKeyDictionary()
+        self.__pending: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def project(self) -> Project:
+        """
+        The project whose queries are answered by this object.
+        """
+        return self.__project
+
+    @property
+    def max_processes(self) -> int:
+        """
+        The maximum number of git processes that may run concurrently.
+        """
+        return self.__max_processes
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """
+        Returns the semaphore that limits the number of git processes run
+        by the current event loop. Semaphores are bound to the loop in which
+        they are created, so each loop that uses this object has its own.
+        """
+        loop = asyncio.get_event_loop()
+        semaphore = self.__semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.__max_processes)
+            self.__semaphores[loop] = semaphore
+        return semaphore
+
+    async def _git(self, *args: str) -> bytes:
+        """
+        Runs git with the given arguments within the project's repository,
+        once a process becomes available, and returns its output.
+
+        Raises:
+            git.exc.GitCommandError: if git exits with a non-zero status.
+        """
+        command = [git.Git.GIT_PYTHON_GIT_EXECUTABLE or 'git'] + list(args)
+        async with self._semaphore():
+            start = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                *command,
+                cwd=self.project.repo.working_dir,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+            out, err = await proc.communicate()
+            recorder = self.project.recorder
+            if recorder is not None:
+                recorder.record_git(InstrumentedGit._subcommand(command),
+                                    time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise git.exc.GitCommandError(command, proc.returncode, err, out)
+        return out
+
+    async def _once(self,
+                    key: Hashable,
+                    compute: Callable[[], Awaitable[Any]]
+                    ) -> Any:
+        """
+        Computes the result for a given key, unless it is already being
+        computed by another task, in which case that task's result is
+        awaited instead.
+        """
+        pending = self.__pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.ensure_future(compute())
+        self.__pending[key] = future
+        future.add_done_callback(lambda _: self.__pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    def _head(self, before: Optional[git.Commit]) -> git.Commit:
+        return before if before else self.project._head()
+
+    async def commit_graph(self) -> CommitGraph:
+        """
+        Returns the index of the project's commit graph, building it with
+        a single asynchronous call to `git rev-list` if necessary.
+        """
+        graph = self.project._built_commit_graph()
+        if graph is not None:
+            return graph
+
+        async def build() -> CommitGraph:
+            out = await self._git('rev-list', *CommitGraph.ARGS)
+            graph = CommitGraph.parse(out.decode(),
+                                      **self.project._commit_graph_tables())
+            self.project._install_commit_graph(graph)
+            return graph
+
+        return await self._once(('commit_graph',), build)
+
+    async def commits_to_repo(self,
+                              after: Optional[git.Commit] = None,
+                              before: Optional[git.Commit] = None
+                              ) -> List[git.Commit]:
+        """
+        Returns a list of all commits that have been made to the repo. See
+        Project.commits_to_repo.
+        """
+        project = self.project
+        before = self._head(before)
+        rev_range = Project._rev_range(after, before)
+        cache = project._cache('commits_to_repo')
+        graph = await self.commit_graph()
+        if rev_range in cache or (before.hexsha in graph and
+                                  (not after or after.hexsha in graph)):
+            return project.commits_to_repo(after, before)
+
+        async def compute() -> List[git.Commit]:
+            shas = project._load('commits_to_repo', rev_range)
+            if shas is None:
+                out = await self._git('log', '--format=commit %H', rev_range)
+                shas = Project._parse_hashes(out.decode())
+                project._store('commits_to_repo', rev_range, shas)
+            commits = [project._commit(sha) for sha in shas]
+            cache[rev_range] = commits
+            return commits
+
+        return await self._once(('commits_to_repo', rev_range), compute)
+
+    async def commits_to_file(self,
+                              filename: str,
+                              lineno: Optional[int] = None,
+                              after: Optional[git.Commit] = None,
+                              before: Optional[git.Commit] = None
+                              ) -> List[git.Commit]:
+        """
+        Returns the list of all commits that have been made to a given file.
+        See Project.commits_to_file.
+
+        Note: When a line number is given, the result is computed from the
+          histories of every line in the file. See commits_to_lines.
+        """
+        assert lineno is None or lineno > 0
+        project = self.project
+        before = self._head(before)
+        if lineno is not None:
+            histories = await self.commits_to_lines(filename, after, before)
+            if lineno > len(histories):
+                msg = "file {} has only {} lines"
+                raise ValueError(msg.format(filename, len(histories)))
+            return histories[lineno - 1]
+
+        rev_range = Project._rev_range(after, before)
+        key = (rev_range, filename)
+        cache = project._cache('commits_to_file')
+        if key in cache:
+            return project.commits_to_file(filename, None, after, before)
+
+        async def compute() -> List[git.Commit]:
+            disk_key = '{}:{}'.format(rev_range, filename)
+            shas = project._load('commits_to_file', disk_key)
+            if shas is None:
+                out = await self._git('log', '--format=commit %H', rev_range,
+                                      '--follow', '--', filename)
+                shas = Project._parse_hashes(out.decode())
+                project._store('commits_to_file', disk_key, shas)
+            commits = [project._commit(sha) for sha in shas]
+            cache[key] = commits
+            return commits
+
+        return await self._once(('commits_to_file',) + key, compute)
+
+    async def commits_to_lines(self,
+                               filename: str,
+                               after: Optional[git.Commit] = None,
+                               before: Optional[git.Commit] = None
+                               ) -> List[List[git.Commit]]:
+        """
+        Returns, for each line in a given file, the list of commits that have
+        touched that line. See Project.commits_to_lines.
+
+        Note: The walk over the history of the file launches many short-lived
+          git processes in turn, and so is performed by a worker thread, using
+          a separate handle on the repository, while it holds one of the
+          process slots of this object.
+        """
+        project = self.project
+        before = self._head(before)
+        rev_range = Project._rev_range(after, before)
+        commits = project._stored_commits_to_lines(filename, rev_range)
+        if commits is not None:
+            return commits
+
+        def walk() -> List[List[str]]:
+            repo = git.Repo(project.repo.git_dir)
+            if isinstance(project.repo.git, InstrumentedGit):
+                repo.git = InstrumentedGit(repo.working_dir)
+                repo.git.recorder = project.recorder
+            blobs = BlobReader(repo)
+            try:
+                return Project._line_histories(repo, blobs, filename,
+                                               rev_range, before)
+            finally:
+                blobs.close()
+                repo.close()
+
+        async def compute() -> List[List[git.Commit]]:
+            async with self._semaphore():
+                loop = asyncio.get_event_loop()
+                histories = await loop.run_in_executor(None, walk)
+            return project._remember_commits_to_lines(filename, rev_range,
+                                                      histories)
+
+        return await self._once(('commits_to_lines', rev_range, filename),
+                                compute)
+
+    async def last_commits_for_file(self,
+                                    filename: str,
+                                    before: git.Commit
+                                    ) -> List[git.Commit]:
+        """
+        Returns the last commit to touch each line of a given version of a
+        file. See Project.last_commits_for_file.
+        """
+        project = self.project
+        commits = project._stored_last_commits(filename, before)
+        if commits is not None:
+            return commits
+
+        async def compute() -> List[git.Commit]:
+            commits = None
+            derivation = None
+            if project.incremental_blame:
+                derivation = project._derivation_args(filename, before)
+            if derivation is not None:
+                previous, args = derivation
+                try:
+                    patch = await self._git(*args)
+                    commits = project._apply_derivation(filename, before,
+                                                        previous, patch)
+                except git.exc.GitCommandError:
+                    pass
+
+            if commits is None:
+                try:
+                    output = await self._git(
+                        *project._blame_args(filename, before))
+                    commits = project._blame(filename, before, output)
+                except git.exc.GitCommandError:
+                    if project._file_exists(filename, before):
+                        raise
+                    commits = []
+
+            project._remember_last_commits(filename, before, commits)
+            return commits
+
+        return await self._once(('last_commits_for_file', before.hexsha,
+                                 filename), compute)
+
+    async def last_commit_to_line(self,
+                                  filename: str,
+                                  lineno: int,
+                                  before: git.Commit
+                                  ) -> Optional[git.Commit]:
+        """
+        Returns the last commit to touch a given line of a version of a
+        file. See Project.last_commit_to_line.
+        """
+        commits = await self.last_commits_for_file(filename, before)
+        if not commits:
+            return None
+        return Project._line_of(commits, filename, lineno)
+
+    async def lines_modified_by_commit(self,
+                                       fix_commit: git.Commit
+                                       ) -> Tuple[LineSet, LineSet]:
+        """
+        Returns the sets of lines that were removed from the old version and
+        added to the new version of each file by a given commit. See
+        Project.lines_modified_by_commit.
+        """
+        project = self.project
+        parents = fix_commit.parents
+        if not parents:
+            return project.lines_modified_by_commit(fix_commit)
+        key = (parents[0].hexsha, fix_commit.hexsha)
+        cache = project._cache('diffs')
+        if key not in cache:
+            async def compute() -> DiffSummary:
+                out = await self._git('diff-tree', *DIFF_TREE_ARGS, *key)
+                diff = DiffSummary(parse_diff(out.splitlines(True)))
+                cache[key] = diff
+                return diff
+
+            diff = await self._once(('diffs',) + key, compute)
+        else:
+            diff = cache[key]
+        return (diff.old_lines, diff.new_lines)
+
+    async def prefetch(self,
+                       version: git.Commit,
+                       filename: str,
+                       columns: List[Column]
+                       ) -> None:
+        """
+        Concurrently computes and caches the results of the git queries
+        required to annotate a given version of a file with the given
+        columns. Columns that are not provided by this module are computed
+        without prefetching.
+        """
+        tasks = [self.last_commits_for_file(filename, version)]
+        if column_was_modified_by_commit in columns:
+            tasks.append(self.lines_modified_by_commit(version))
+        if column_num_project_commits_after_modified in columns or \
+                column_project_age_commits in columns:
+            tasks.append(self.commit_graph())
+        await asyncio.gather(*tasks)
+
+        if column_num_file_commits_after_modified in columns:
+            last = await self.last_commits_for_file(filename, version)
+            distinct = list({c.hexsha: c for c in last}.values())
+            await asyncio.gather(*[
+                self.commits_to_file(filename, after=c, before=version)
+                for c in distinct
+            ])
+
+    async def annotate(self,
+                       version: git.Commit,
+                       filename: str,
+                       columns: Optional[List[Column]] = None
+                       ) -> List[Tuple[Any, ...]]:
+        """
+        Annotates each line of a given version of a file. The git queries
+        required by the columns are first computed concurrently (see
+        prefetch), after which the table is built from the shared caches by
+        blameandshame.annotate.annotate.
+        """
+        if columns is None:
+            columns = []
+        await self.prefetch(version, filename, columns)
+        return annotate(self.project, version, filename, columns)
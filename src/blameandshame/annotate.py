@@ -1,9 +1,32 @@
 from blameandshame.project import Project
-from blameandshame.base import Commits
-from typing import Callable, Optional, List, Tuple, Any
+from blameandshame.base import Commits, Line
+from blameandshame.stats import instrumented
+from typing import Callable, Optional, List, Tuple, Any, Deque, Dict, \
+                   Iterator, NamedTuple, Union
+import collections
+import fnmatch
+import functools
+import multiprocessing
+import multiprocessing.pool
+import pickle
+import posixpath
 import git
+import numpy as np
 
 
+# A column that computes an annotation for a single line of a file.
+Column = Callable[[Project, git.Commit, str, int], str]
+
+# A column that computes a typed array of annotations for every line of a
+# file in a single call.
+FileColumn = Callable[[Project, git.Commit, str], np.ndarray]
+
+# The number of tasks per worker process that annotate_many submits ahead of
+# the results that have been consumed.
+TASKS_PER_JOB = 4
+
+
+@instrumented
 def annotate(project: Project,
              version: git.Commit,
              filename: str,
@@ -22,11 +45,21 @@ def annotate(project: Project,
     """
     if columns is None:
         columns = []
-    tbl = []
-    f = project.repo.git.show('{}:{}'.format(version.hexsha, filename))
+    lines = _read_lines(project, version, filename)
+    return _annotate_lines(project, version, filename, lines, columns)
 
-    for (num, line) in enumerate(f.splitlines(), 1):
-        line = line.rstrip()
+
+def _annotate_lines(project: Project,
+                    version: git.Commit,
+                    filename: str,
+                    lines: List[str],
+                    columns: List[Column]
+                    ) -> List[Tuple[Any, ...]]:
+    """
+    Annotates the given lines of a version of a file. See annotate.
+    """
+    tbl = []
+    for (num, line) in enumerate(lines, 1):
         row = [num, line]
 
         for col in columns:
@@ -37,6 +70,379 @@ def annotate(project: Project,
     return tbl
 
 
+def _read_lines(project: Project,
+                version: git.Commit,
+                filename: str
+                ) -> List[str]:
+    """
+    Returns the contents of each line of a given version of a file, with
+    trailing whitespace removed.
+
+    Raises:
+        ValueError: if the file does not exist at the given version.
+    """
+    data = project.blobs.read(version.hexsha, filename)
+    if data is None:
+        msg = "file {} does not exist at {}".format(filename, version.hexsha)
+        raise ValueError(msg)
+    return _decode_lines(data)
+
+
+def _decode_lines(data: bytes) -> List[str]:
+    """
+    Splits the contents of a file into lines, as counted by git, with
+    trailing whitespace removed.
+    """
+    if not data:
+        return []
+    if data.endswith(b'\n'):
+        data = data[:-1]
+    return [line.decode('utf-8', 'surrogateescape').rstrip()
+            for line in data.split(b'\n')]
+
+
+class AnnotationResult(NamedTuple):
+    """
+    The outcome of annotating a single version of a file as part of a batch.
+    Exactly one of `table` and `error` is provided. The table is either a
+    list of tuples (see annotate) or a structured array (see annotate_table).
+    """
+    version: str
+    filename: str
+    table: Optional[Union[List[Tuple[Any, ...]], np.ndarray]]
+    error: Optional[Exception]
+
+
+# The project used by each worker process within annotate_many.
+_worker_project: Optional[Project] = None
+
+
+def _init_worker(path: str,
+                 cache_path: Optional[str],
+                 incremental_blame: bool = False,
+                 cache_budget: Any = None,
+                 backend: str = 'subprocess',
+                 index_files: bool = False
+                 ) -> None:
+    """
+    Opens a separate handle on the repository for a worker process.
+    """
+    global _worker_project
+    _worker_project = Project.from_disk(path,
+                                        cache_path=cache_path,
+                                        offline=True,
+                                        incremental_blame=incremental_blame,
+                                        cache_budget=cache_budget,
+                                        backend=backend,
+                                        index_files=index_files)
+
+
+def _annotate_task(project: Project,
+                   task: Tuple[str, str],
+                   columns: List[Any],
+                   typed: bool = False
+                   ) -> AnnotationResult:
+    """
+    Annotates a single (version, filename) pair, capturing any error.
+    """
+    (rev, filename) = task
+    try:
+        sha = project.backend.rev_parse(rev)
+        if sha is None:
+            raise ValueError("unknown revision: {}".format(rev))
+        version = project.backend.commit(sha)
+        if typed:
+            table = annotate_table(project, version, filename, columns)
+        else:
+            table = annotate(project, version, filename, columns)
+        return AnnotationResult(rev, filename, table, None)
+    except Exception as err:
+        try:
+            pickle.dumps(err)
+        except Exception:
+            err = RuntimeError('{}: {}'.format(type(err).__name__, err))
+        return AnnotationResult(rev, filename, None, err)
+
+
+def _annotate_in_worker(task: Tuple[str, str],
+                        columns: List[Any],
+                        typed: bool = False
+                        ) -> AnnotationResult:
+    return _annotate_task(_worker_project, task, columns, typed)
+
+
+def annotate_many(project: Project,
+                  tasks: List[Tuple[Union[git.Commit, str], str]],
+                  columns: Optional[List[Any]] = None,
+                  jobs: Optional[int] = None,
+                  typed: bool = False
+                  ) -> Iterator[AnnotationResult]:
+    """
+    Annotates a number of (version, filename) pairs in parallel, using a pool
+    of worker processes that each hold their own handle on the repository
+    for a given project. Results are yielded in the same order as their
+    tasks, as soon as they become available. A task that fails does not
+    affect the others; its error is reported as part of its result.
+
+    At most TASKS_PER_JOB tasks per worker are submitted ahead of the
+    results that have been consumed, so the tasks may be given lazily, and
+    results that are consumed slowly do not accumulate in memory.
+
+    Params:
+      tasks: A list of (version, filename) pairs, where each version is given
+        either as a Commit or as the hash of a commit.
+      columns: A list of columns, as accepted by annotate. Since columns are
+        sent to the worker processes, each column must be defined at the top
+        level of a module (i.e., closures such as those produced by
+        use_different_commit are not supported when jobs > 1).
+      jobs: The number of worker processes that should be used. Defaults to
+        the number of available CPUs. If jobs is 1, all tasks are performed
+        within the current process, using the given project.
+      typed: If True, each version is annotated by annotate_table, rather
+        than by annotate, and the given columns must be file columns.
+    """
+    if columns is None:
+        columns = []
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    todo = ((v.hexsha if isinstance(v, git.Commit) else v, f)
+            for (v, f) in tasks)
+
+    if jobs == 1:
+        for task in todo:
+            yield _annotate_task(project, task, columns, typed)
+        return
+
+    cache_path = project.disk_cache.path if project.disk_cache else None
+    with multiprocessing.Pool(processes=jobs,
+                              initializer=_init_worker,
+                              initargs=(project.repo.working_dir,
+                                        cache_path,
+                                        project.incremental_blame,
+                                        project.cache_budget,
+                                        project.backend.name,
+                                        project.index_files)
+                              ) as pool:
+        work = functools.partial(_annotate_in_worker,
+                                 columns=columns,
+                                 typed=typed)
+        pending: Deque[multiprocessing.pool.AsyncResult] = \
+            collections.deque()
+        for task in todo:
+            if len(pending) >= TASKS_PER_JOB * jobs:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(work, (task,)))
+        while pending:
+            yield pending.popleft().get()
+
+
+@instrumented
+def annotate_table(project: Project,
+                   version: git.Commit,
+                   filename: str,
+                   columns: Optional[List[FileColumn]] = None
+                   ) -> np.ndarray:
+    """
+    Returns a structured array with one record per line of a given version of
+    a file. Each record contains the line number (`num`), the contents of the
+    line (`line`), and one field for each of the given file columns, named
+    after the function that computes it (minus its `file_column_` prefix).
+
+    Params:
+      columns: A list of functions, each used to generate a single column of
+        annotations. Each function takes as input a Project, a Commit and a
+        filename, and returns an array holding the value of that column for
+        every line of the file. See file_column_last_commit for an example,
+        and per_line for an adapter that accepts ordinary columns.
+    """
+    if columns is None:
+        columns = []
+    lines = _read_lines(project, version, filename)
+    return _annotate_table_lines(project, version, filename, lines, columns)
+
+
+def _annotate_table_lines(project: Project,
+                          version: git.Commit,
+                          filename: str,
+                          lines: List[str],
+                          columns: List[FileColumn]
+                          ) -> np.ndarray:
+    """
+    Builds the structured array for the given lines of a version of a file.
+    See annotate_table.
+    """
+    names = ['num', 'line']
+    arrays = [np.arange(1, len(lines) + 1), np.array(lines, dtype=object)]
+    for col in columns:
+        arr = np.asarray(col(project, version, filename))
+        if arr.shape != (len(lines),):
+            msg = "column {} returned {} values for a file with {} lines"
+            raise ValueError(msg.format(col.__name__, arr.size, len(lines)))
+        names.append(_column_name(col))
+        arrays.append(arr)
+
+    dtype = np.dtype([(n, a.dtype) for (n, a) in zip(names, arrays)])
+    tbl = np.empty(len(lines), dtype=dtype)
+    for (name, arr) in zip(names, arrays):
+        tbl[name] = arr
+    return tbl
+
+
+# Patterns matching the names of files that are typically generated, rather
+# than written by hand.
+GENERATED_PATTERNS = ('*.min.js', '*.min.css', '*.map', '*_pb2.py',
+                      '*_pb2_grpc.py', '*.pb.go', '*.pb.cc', '*.pb.h',
+                      'package-lock.json', 'yarn.lock', 'Cargo.lock',
+                      'poetry.lock', 'Gemfile.lock', 'composer.lock',
+                      'go.sum')
+
+# Markers that indicate that a file was generated when they appear near the
+# start of its contents (e.g., "Code generated by protoc. DO NOT EDIT.").
+GENERATED_MARKERS = (b'@generated', b'DO NOT EDIT')
+
+
+def is_binary(data: bytes) -> bool:
+    """
+    Determines whether the contents of a file are binary, using the same
+    heuristic as git: i.e., whether its first 8000 bytes contain a NUL byte.
+    """
+    return b'\0' in data[:8000]
+
+
+def is_generated(filename: str, data: bytes) -> bool:
+    """
+    Determines whether a file appears to have been generated, either because
+    its name matches one of GENERATED_PATTERNS, or because its first 1024
+    bytes contain one of GENERATED_MARKERS.
+    """
+    name = posixpath.basename(filename)
+    if any(fnmatch.fnmatchcase(name, p) for p in GENERATED_PATTERNS):
+        return True
+    head = data[:1024]
+    return any(marker in head for marker in GENERATED_MARKERS)
+
+
+def should_skip(filename: str, data: bytes) -> bool:
+    """
+    The default rule used by annotate_tree to skip files that are either
+    binary or generated.
+    """
+    return is_binary(data) or is_generated(filename, data)
+
+
+def annotate_tree(project: Project,
+                  version: git.Commit,
+                  columns: Optional[List[Any]] = None,
+                  paths: Optional[Union[str, List[str]]] = None,
+                  skip: Optional[Callable[[str, bytes], bool]] = should_skip,
+                  typed: bool = False,
+                  batch_size: int = 64
+                  ) -> Iterator[Tuple[str, Union[List[Tuple[Any, ...]],
+                                                 np.ndarray]]]:
+    """
+    Lazily annotates every file within a given version of a project, yielding
+    a (filename, table) pair for each file as soon as it has been annotated.
+
+    The tree of the version is listed once, and files are visited one
+    directory at a time, since files within the same directory tend to be
+    changed by the same commits, whose information is therefore reused from
+    the project's caches. The contents of the files are read in batches of
+    a bounded size, so that at most one batch is held in memory at a time,
+    while the project's cache budget (see Project.__init__) bounds the
+    memory used by the results of its git queries.
+
+    Params:
+      columns: A list of columns, as accepted by annotate (or, if typed is
+        True, by annotate_table).
+      paths: An optional glob pattern, or list of patterns, that restricts
+        the files to those whose paths match at least one pattern. Since
+        patterns are matched against the whole path, `*` also matches `/`.
+      skip: A function that is given the name and contents of each file and
+        decides whether it should be skipped. By default, binary and
+        generated files are skipped (see should_skip).
+      typed: If True, each table is a structured array produced by
+        annotate_table, rather than a list of tuples produced by annotate.
+      batch_size: The maximum number of files whose contents are read at
+        once.
+    """
+    assert batch_size > 0
+    if columns is None:
+        columns = []
+    if isinstance(paths, str):
+        paths = [paths]
+
+    filenames = project.files_in_version(version)
+    if paths is not None:
+        filenames = [f for f in filenames
+                     if any(fnmatch.fnmatchcase(f, p) for p in paths)]
+    filenames.sort(key=lambda f: (posixpath.dirname(f), f))
+
+    for start in range(0, len(filenames), batch_size):
+        batch = filenames[start:start + batch_size]
+        contents = project.blobs.read_many(
+            (version.hexsha, filename) for filename in batch)
+        for (i, filename) in enumerate(batch):
+            data, contents[i] = contents[i], None
+            if data is None or (skip is not None and skip(filename, data)):
+                continue
+            lines = _decode_lines(data)
+            if typed:
+                table = _annotate_table_lines(project, version, filename,
+                                              lines, columns)
+            else:
+                table = _annotate_lines(project, version, filename, lines,
+                                        columns)
+            yield (filename, table)
+
+
+def _column_name(col: FileColumn) -> str:
+    """
+    Determines the name of the field used to store a given file column.
+    """
+    name = col.__name__
+    for prefix in ('file_column_', 'column_'):
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+def per_line(column: Column, dtype: Any = object) -> FileColumn:
+    """
+    Returns a file column that computes its values by calling a given
+    per-line column once for each line in the file.
+
+    Params:
+      dtype: The type of the array that should be used to hold the values
+        returned by the column.
+    """
+    def file_column(p: Project, c: git.Commit, fname: str) -> np.ndarray:
+        num_lines = p._num_lines_in_file(fname, c)
+        values = [column(p, c, fname, num) for num in range(1, num_lines + 1)]
+        return np.array(values, dtype=dtype)
+
+    file_column.__name__ = column.__name__
+    return file_column
+
+
+def _per_commit(project: Project,
+                version: git.Commit,
+                filename: str,
+                f: Callable[[git.Commit], Any],
+                dtype: Any
+                ) -> np.ndarray:
+    """
+    Computes an array by applying a given function to the last commit that
+    touched each line of a file. The function is called once for each
+    distinct commit, rather than once for each line.
+    """
+    last_commits = project.last_commits_for_file(filename, version)
+    values: Dict[git.Commit, Any] = {}
+    for commit in last_commits:
+        if commit not in values:
+            values[commit] = f(commit)
+    return np.array([values[c] for c in last_commits], dtype=dtype)
+
+
 def use_different_commit(f: Callable[[Project, git.Commit, str, int], str],
                          different_commit: git.Commit
                          ) -> Callable[[Project, git.Commit, str, int], str]:
@@ -50,6 +456,7 @@ def use_different_commit(f: Callable[[Project, git.Commit, str, int], str],
     return modified_fun
 
 
+@instrumented
 def column_last_commit(project: Project,
                        commit: git.Commit,
                        filename: str,
@@ -63,6 +470,7 @@ def column_last_commit(project: Project,
     return last.hexsha[:7] if last else '-'
 
 
+@instrumented
 def column_num_file_commits_after_modified(project: Project,
                                            commit: git.Commit,
                                            filename: str,
@@ -78,6 +486,7 @@ def column_num_file_commits_after_modified(project: Project,
     return str(len(commits))
 
 
+@instrumented
 def column_num_project_commits_after_modified(project: Project,
                                               commit: git.Commit,
                                               filename: str,
@@ -88,11 +497,12 @@ def column_num_project_commits_after_modified(project: Project,
     since a line was modified.
     """
     line_modified_commit = project.last_commit_to_line(filename, line, commit)
-    commits = project.commits_to_repo(after=line_modified_commit,
-                                      before=commit)
-    return str(len(commits))
+    num_commits = project.count_commits_to_repo(after=line_modified_commit,
+                                                before=commit)
+    return str(num_commits)
 
 
+@instrumented
 def column_num_days_since_modified(project: Project,
                                    commit: git.Commit,
                                    filename: str,
@@ -105,6 +515,7 @@ def column_num_days_since_modified(project: Project,
     return str(project.age_of_line_td(commit, filename, line).days)
 
 
+@instrumented
 def column_was_modified_by_commit(project: Project,
                                   commit: git.Commit,
                                   filename: str,
@@ -114,13 +525,11 @@ def column_was_modified_by_commit(project: Project,
     Returns the string 'Y' if the line was modified by the commit, otherwise
     returns 'N'
     """
-    _, new_lines = Project.lines_modified_by_commit(commit)
-    for modified_line in new_lines:
-        if modified_line.filename == filename and modified_line.num == line:
-            return "true"
-    return "false"
+    _, new_lines = project.lines_modified_by_commit(commit)
+    return "true" if Line(filename, line) in new_lines else "false"
 
 
+@instrumented
 def column_project_name(project: Project,
                         commit: git.Commit,
                         filename: str,
@@ -132,6 +541,7 @@ def column_project_name(project: Project,
     return project.name
 
 
+@instrumented
 def column_project_age_commits(project: Project,
                                commit: git.Commit,
                                filename: str,
@@ -143,6 +553,7 @@ def column_project_age_commits(project: Project,
     return str(project.age_commits_project(before=commit))
 
 
+@instrumented
 def column_file_age_commits_to_project(project: Project,
                                        commit: git.Commit,
                                        filename: str,
@@ -155,6 +566,7 @@ def column_file_age_commits_to_project(project: Project,
                                         before=commit))
 
 
+@instrumented
 def column_file_age_commits_to_file(project: Project,
                                     commit: git.Commit,
                                     filename: str,
@@ -165,3 +577,95 @@ def column_file_age_commits_to_file(project: Project,
     """
     return str(project.age_commits_file(filename, Commits.TO_FILE,
                                         before=commit))
+
+
+@instrumented
+def file_column_last_commit(project: Project,
+                            version: git.Commit,
+                            filename: str
+                            ) -> np.ndarray:
+    """
+    Reports the abbreviated hash of the last commit that touched each line
+    in a given version of a file. See column_last_commit.
+    """
+    return _per_commit(project, version, filename,
+                       lambda c: c.hexsha[:7], 'U7')
+
+
+@instrumented
+def file_column_last_modified(project: Project,
+                              version: git.Commit,
+                              filename: str
+                              ) -> np.ndarray:
+    """
+    Reports the time at which each line in a given version of a file was
+    last changed, according to the authorship date of the change.
+    """
+    def last_modified(commit: git.Commit) -> np.datetime64:
+        return np.datetime64(commit.authored_date, 's')
+
+    return _per_commit(project, version, filename, last_modified,
+                       'datetime64[s]')
+
+
+@instrumented
+def file_column_num_file_commits_after_modified(project: Project,
+                                                version: git.Commit,
+                                                filename: str
+                                                ) -> np.ndarray:
+    """
+    Reports the number of commits that have been made to a given file since
+    each of its lines was modified.
+    """
+    def num_commits(commit: git.Commit) -> int:
+        return len(project.commits_to_file(filename, after=commit,
+                                           before=version))
+
+    return _per_commit(project, version, filename, num_commits, np.int64)
+
+
+@instrumented
+def file_column_num_project_commits_after_modified(project: Project,
+                                                   version: git.Commit,
+                                                   filename: str
+                                                   ) -> np.ndarray:
+    """
+    Reports the number of commits that have been made to a given project
+    since each line of a file was modified.
+    """
+    def num_commits(commit: git.Commit) -> int:
+        return project.count_commits_to_repo(after=commit, before=version)
+
+    return _per_commit(project, version, filename, num_commits, np.int64)
+
+
+@instrumented
+def file_column_num_days_since_modified(project: Project,
+                                        version: git.Commit,
+                                        filename: str
+                                        ) -> np.ndarray:
+    """
+    Reports the number of days that have passed, relative to a given commit,
+    since each line of a file was last changed.
+    """
+    def num_days(commit: git.Commit) -> int:
+        return Project.time_between_commits(commit, version).days
+
+    return _per_commit(project, version, filename, num_days, np.int64)
+
+
+@instrumented
+def file_column_was_modified_by_commit(project: Project,
+                                       version: git.Commit,
+                                       filename: str
+                                       ) -> np.ndarray:
+    """
+    Reports whether or not each line of a file was modified by a given
+    commit.
+    """
+    num_lines = project._num_lines_in_file(filename, version)
+    modified = np.zeros(num_lines, dtype=bool)
+    _, new_lines = project.lines_modified_by_commit(version)
+    nums = new_lines.lines_in(filename).astype(np.int64)
+    modified[nums[nums <= num_lines] - 1] = True
+    return modified
@@ -1,10 +1,16 @@
 from enum import Enum, auto
+from collections.abc import Set
+from typing import Any, Dict, Iterable, Iterator, List
+import sys
+import numpy as np
 
 
 class Line(object):
     """
     Represents a single line in a given file.
     """
+    __slots__ = ('__filename', '__num')
+
     def __init__(self, filename: str, num: int) -> None:
         assert num > 0
         self.__filename = filename
@@ -39,6 +45,127 @@ class Line(object):
         return hash((self.__filename, self.__num))
 
 
+class LineSet(Set):
+    """
+    An immutable set of lines, stored compactly as a sorted array of line
+    numbers for each file. Lines are grouped by their (interned) filename,
+    allowing set operations between LineSets to be performed one file at a
+    time using vectorized array operations. Iterating over a LineSet yields
+    Line objects, and LineSets compare equal to frozensets of the same Lines.
+    """
+    @staticmethod
+    def from_arrays(files: Dict[str, Any]) -> 'LineSet':
+        """
+        Constructs a set of lines from a dictionary that maps the name of each
+        file to an array-like collection of (one-indexed) line numbers.
+        """
+        lines = LineSet()
+        lines.__files = {}
+        for (filename, nums) in files.items():
+            nums = np.unique(np.asarray(nums, dtype=np.uint32))
+            if nums.size > 0:
+                lines.__files[sys.intern(filename)] = nums
+        return lines
+
+    def __init__(self, lines: Iterable[Line] = ()) -> None:
+        nums: Dict[str, List[int]] = {}
+        for line in lines:
+            nums.setdefault(line.filename, []).append(line.num)
+        self.__files: Dict[str, np.ndarray] = {
+            sys.intern(filename): np.unique(np.array(n, dtype=np.uint32))
+            for (filename, n) in nums.items()
+        }
+
+    @property
+    def filenames(self) -> List[str]:
+        """
+        The names of the files that contain at least one line in this set.
+        """
+        return list(self.__files.keys())
+
+    def lines_in(self, filename: str) -> np.ndarray:
+        """
+        Returns a sorted array of the numbers of the lines in this set that
+        belong to a given file.
+        """
+        return self.__files.get(filename, np.empty(0, dtype=np.uint32))
+
+    def restrict(self, filenames: Iterable[str]) -> 'LineSet':
+        """
+        Returns the subset of this set that contains only those lines that
+        belong to one of the given files.
+        """
+        files = {}
+        for filename in filenames:
+            nums = self.__files.get(filename)
+            if nums is not None:
+                files[filename] = nums
+        return LineSet.from_arrays(files)
+
+    def __contains__(self, line: Any) -> bool:
+        if not isinstance(line, Line):
+            return False
+        nums = self.__files.get(line.filename)
+        if nums is None:
+            return False
+        i = np.searchsorted(nums, line.num)
+        return bool(i < nums.size and nums[i] == line.num)
+
+    def __iter__(self) -> Iterator[Line]:
+        for (filename, nums) in self.__files.items():
+            for num in nums.tolist():
+                yield Line(filename, num)
+
+    def __len__(self) -> int:
+        return sum(nums.size for nums in self.__files.values())
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sys.getsizeof(self.__files) + \
+            sum(sys.getsizeof(nums) for nums in self.__files.values())
+
+    def __combine(self, other: 'LineSet', op, keep_left: bool) -> 'LineSet':
+        files = {}
+        for (filename, nums) in self.__files.items():
+            other_nums = other.__files.get(filename)
+            if other_nums is not None:
+                files[filename] = op(nums, other_nums)
+            elif keep_left:
+                files[filename] = nums
+        return LineSet.from_arrays(files)
+
+    def __and__(self, other):
+        if not isinstance(other, LineSet):
+            return super().__and__(other)
+        return self.__combine(other, np.intersect1d, False)
+
+    def __sub__(self, other):
+        if not isinstance(other, LineSet):
+            return super().__sub__(other)
+        return self.__combine(other, np.setdiff1d, True)
+
+    def __or__(self, other):
+        if not isinstance(other, LineSet):
+            return super().__or__(other)
+        files = dict(other.__files)
+        for (filename, nums) in self.__files.items():
+            other_nums = files.get(filename)
+            files[filename] = nums if other_nums is None \
+                else np.union1d(nums, other_nums)
+        return LineSet.from_arrays(files)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, LineSet):
+            return super().__eq__(other)
+        return self.__files.keys() == other.__files.keys() and \
+            all(np.array_equal(nums, other.__files[filename])
+                for (filename, nums) in self.__files.items())
+
+    __hash__ = Set._hash
+
+    def __repr__(self) -> str:
+        return "LineSet({})".format(sorted(str(line) for line in self))
+
+
 class Change(Enum):
     """
     Enum of the possible types of git changes. These values can be used as
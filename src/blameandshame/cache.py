@@ -0,0 +1,313 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import numpy as np
+
+
+class CacheBudget(NamedTuple):
+    """
+    Describes the limits on the size of an in-memory cache. A limit of None
+    indicates that the corresponding quantity is unbounded.
+
+    Attributes:
+      max_entries: The maximum number of results held by the cache.
+      max_bytes: The maximum approximate size of the results held by the
+        cache, in bytes.
+      policy: The policy used to select the result that should be evicted
+        when the cache exceeds its budget: either 'lru', which evicts the
+        least recently used result, or 'size', which evicts the largest.
+    """
+    max_entries: Optional[int] = None
+    max_bytes: Optional[int] = None
+    policy: str = 'lru'
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Estimates the number of bytes of memory used by a value, including the
+    contents of any (nested) lists, tuples, sets and dictionaries, and the
+    buffers of any numpy arrays. Other objects are measured by their own
+    size only, since they are typically shared between many results.
+    """
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None
+                                       else value.nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(v) for v in value)
+    elif isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v)
+                    for (k, v) in value.items())
+    return size
+
+
+class MemoryCache(object):
+    """
+    An in-memory table of memoized results that is bounded by a budget on
+    the number of results that it holds, on their approximate size, or on
+    both. When a new result would exceed the budget, existing results are
+    evicted according to the policy of the budget.
+
+    Lookups follow the protocol of a dictionary: indexing the cache with a
+    key that it does not hold raises a KeyError.
+    """
+    def __init__(self, budget: Optional[CacheBudget] = None) -> None:
+        if budget is None:
+            budget = CacheBudget()
+        if budget.policy not in ('lru', 'size'):
+            raise ValueError("unknown eviction policy: {}".format(
+                budget.policy))
+        self.__budget = budget
+        self.__entries: 'OrderedDict[Hashable, Tuple[Any, int]]' = \
+            OrderedDict()
+        # used to find the largest entry under the 'size' policy; entries
+        # that have since been replaced or removed are skipped lazily, and
+        # dropped once they outnumber the live entries (see __compact).
+        self.__by_size: List[Tuple[int, int, Hashable]] = []
+        self.__versions: Dict[Hashable, int] = {}
+        self.__counter = 0
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    @property
+    def budget(self) -> CacheBudget:
+        """
+        The limits on the size of this cache.
+        """
+        return self.__budget
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of lookups that were answered by this cache.
+        """
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of lookups that could not be answered by this cache.
+        """
+        return self.__misses
+
+    @property
+    def evictions(self) -> int:
+        """
+        The number of results that have been evicted from this cache.
+        """
+        return self.__evictions
+
+    @property
+    def bytes(self) -> int:
+        """
+        The approximate size of the results held by this cache, in bytes.
+        """
+        return self.__bytes
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a summary of the contents and usage of this cache.
+        """
+        return {'entries': len(self.__entries),
+                'bytes': self.__bytes,
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions}
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__entries
+
+    def __getitem__(self, key: Hashable) -> Any:
+        try:
+            value, _ = self.__entries[key]
+        except KeyError:
+            self.__misses += 1
+            raise
+        self.__entries.move_to_end(key)
+        self.__hits += 1
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the result stored under a given key, or a default value if
+        no such result is held by this cache.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.__discard(key)
+        size = approximate_size(value)
+        max_bytes = self.__budget.max_bytes
+        if max_bytes is not None and size > max_bytes:
+            self.__evictions += 1
+            self.__compact()
+            return
+
+        self.__entries[key] = (value, size)
+        self.__bytes += size
+        if self.__budget.policy == 'size':
+            self.__counter += 1
+            self.__versions[key] = self.__counter
+            heapq.heappush(self.__by_size, (-size, self.__counter, key))
+        self.__evict()
+        self.__compact()
+
+    def __discard(self, key: Hashable) -> None:
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[1]
+            self.__versions.pop(key, None)
+
+    def __over_budget(self) -> bool:
+        max_entries = self.__budget.max_entries
+        max_bytes = self.__budget.max_bytes
+        return (max_entries is not None and
+                len(self.__entries) > max_entries) or \
+            (max_bytes is not None and self.__bytes > max_bytes)
+
+    def __evict(self) -> None:
+        while self.__over_budget():
+            if self.__budget.policy == 'lru':
+                key = next(iter(self.__entries))
+            else:
+                _, version, key = heapq.heappop(self.__by_size)
+                if self.__versions.get(key) != version:
+                    continue
+            self.__discard(key)
+            self.__evictions += 1
+
+    def __compact(self) -> None:
+        """
+        Rebuilds the heap used by the 'size' policy once the stale entries
+        left behind by replaced or removed results outnumber the live ones,
+        so that the heap remains proportional to the size of the cache.
+        """
+        if len(self.__by_size) <= 2 * len(self.__versions):
+            return
+        self.__by_size = [(-size, self.__versions[key], key)
+                          for (key, (_, size)) in self.__entries.items()]
+        heapq.heapify(self.__by_size)
+
+    def clear(self) -> None:
+        """
+        Removes all results from this cache. Its usage statistics are kept.
+        """
+        self.__entries.clear()
+        self.__by_size.clear()
+        self.__versions.clear()
+        self.__bytes = 0
+
+
+class DiskCache(object):
+    """
+    A persistent, content-addressed store for the results of git queries.
+
+    Results are stored in an SQLite database, grouped into named tables and
+    indexed by a string key. Since every key is built from immutable commit
+    hashes, stored results never become stale. The database is opened in
+    write-ahead logging mode, allowing several processes to safely read and
+    write the same cache at once.
+    """
+    def __init__(self, path: str) -> None:
+        self.__path = path
+        self.__pid: Optional[int] = None
+        self.__connection: Optional[sqlite3.Connection] = None
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def path(self) -> str:
+        """
+        The location of the database file on disk.
+        """
+        return self.__path
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of lookups that were answered by this cache.
+        """
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of lookups that could not be answered by this cache.
+        """
+        return self.__misses
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a summary of the hits and misses recorded by this cache.
+        """
+        return {'hits': self.__hits, 'misses': self.__misses}
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns a connection to the underlying database, opening a new one if
+        this is the first use of the cache within the current process.
+        Connections are never shared across a fork.
+        """
+        if self.__connection is None or self.__pid != os.getpid():
+            conn = sqlite3.connect(self.__path,
+                                   timeout=60.0,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                         ' tbl TEXT NOT NULL,'
+                         ' key TEXT NOT NULL,'
+                         ' value TEXT NOT NULL,'
+                         ' PRIMARY KEY (tbl, key))')
+            self.__connection = conn
+            self.__pid = os.getpid()
+        return self.__connection
+
+    def get(self, table: str, key: str) -> Optional[Any]:
+        """
+        Retrieves the result stored under a given key within a named table.
+
+        Returns:
+            The stored result, or None if no result has been stored under
+            that key.
+        """
+        row = self._connect().execute(
+            'SELECT value FROM results WHERE tbl = ? AND key = ?',
+            (table, key)).fetchone()
+        if row is None:
+            self.__misses += 1
+            return None
+        self.__hits += 1
+        return json.loads(row[0])
+
+    def put(self, table: str, key: str, value: Any) -> None:
+        """
+        Stores a JSON-serializable result under a given key within a named
+        table.
+        """
+        self._connect().execute(
+            'INSERT OR REPLACE INTO results (tbl, key, value)'
+            ' VALUES (?, ?, ?)',
+            (table, key, json.dumps(value, separators=(',', ':'))))
+
+    def close(self) -> None:
+        """
+        Closes the connection to the underlying database, if one is open.
+        """
+        if self.__connection is not None and self.__pid == os.getpid():
+            self.__connection.close()
+        self.__connection = None
+        self.__pid = None
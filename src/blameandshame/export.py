@@ -0,0 +1,475 @@
+"""
+Provides exporters that stream annotation tables to disk as they are
+computed, so that annotating a large number of files requires memory for a
+single table at a time, rather than for every table at once.
+
+Each exporter writes the typed tables produced by annotate_table, prefixed by
+the hash of the annotated version (`version`) and the name of the annotated
+file (`filename`), to one of the following formats:
+
+- csv: a single CSV file, with a header row.
+- jsonl: a single file containing one JSON object per row.
+- parquet: a directory of Parquet files, in which the table for each file is
+  written as its own row group.
+- arrow: a directory of Arrow IPC files, in which the table for each file is
+  written as its own record batch.
+
+The columnar formats require pyarrow, which is an optional dependency. Each
+exporter for a columnar format writes a new part file to its directory,
+allowing further tables to be appended to an existing dataset without
+rewriting it.
+"""
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple, Type, \
+    Union
+import abc
+import csv
+import itertools
+import json
+import os
+import git
+import numpy as np
+from blameandshame.annotate import AnnotationResult, FileColumn, \
+    annotate_many
+from blameandshame.project import Project
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# The fields that identify the annotated version of a file within each row.
+KEY_FIELDS = ('version', 'filename')
+
+
+class Exporter(abc.ABC):
+    """
+    Writes the annotation tables for a number of versions of files to a
+    single dataset, one table at a time. Every table must have the same
+    fields.
+
+    Each format implements _open, which prepares the dataset for tables with
+    the given fields; _write, which writes a single (non-empty) table; and
+    _close, which completes the dataset. Formats may also override _abort,
+    which abandons the dataset after an error.
+
+    When used as a context manager, the dataset is completed when the block
+    exits normally, and abandoned when it raises an exception.
+    """
+    # The name used to select this format (see FORMATS).
+    name = ''
+    # The file extension used by this format.
+    extension = ''
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        """
+        Params:
+          path: The location of the dataset.
+          append: If True, tables are appended to the existing dataset at the
+            given location, if there is one. Otherwise, any existing dataset
+            is replaced.
+        """
+        self.__path = path
+        self.__append = append
+        self.__fields: Optional[List[str]] = None
+        self.__rows = 0
+
+    def __enter__(self) -> 'Exporter':
+        return self
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def path(self) -> str:
+        """
+        The location of the dataset written by this exporter.
+        """
+        return self.__path
+
+    @property
+    def append(self) -> bool:
+        """
+        Indicates whether this exporter appends to an existing dataset.
+        """
+        return self.__append
+
+    @property
+    def fields(self) -> Optional[List[str]]:
+        """
+        The names of the fields of each row, or None if no table has been
+        written.
+        """
+        return self.__fields
+
+    @property
+    def rows(self) -> int:
+        """
+        The number of rows that have been written by this exporter.
+        """
+        return self.__rows
+
+    def write(self, version: str, filename: str, table: np.ndarray) -> None:
+        """
+        Writes the annotation table for a given version of a file.
+
+        Params:
+          version: The hash of the annotated version.
+          table: The structured array produced by annotate_table.
+
+        Raises:
+            ValueError: if the fields of the table differ from those of the
+              tables that were previously written to the dataset.
+        """
+        fields = list(KEY_FIELDS) + list(table.dtype.names)
+        if self.__fields is None:
+            self._open(fields, table.dtype)
+            self.__fields = fields
+        elif fields != self.__fields:
+            msg = "table has fields {}, but dataset has fields {}"
+            raise ValueError(msg.format(fields, self.__fields))
+        if len(table) == 0:
+            return
+        self._write(version, filename, table)
+        self.__rows += len(table)
+
+    def close(self) -> None:
+        """
+        Completes the dataset. No further tables may be written.
+        """
+        if self.__fields is not None:
+            self._close()
+
+    def abort(self) -> None:
+        """
+        Abandons the dataset after an error. Formats that write to a new
+        part file discard it, so that no truncated part is published; other
+        formats keep the tables that were written before the error. No
+        further tables may be written.
+        """
+        if self.__fields is not None:
+            self._abort()
+
+    @abc.abstractmethod
+    def _open(self, fields: List[str], dtype: np.dtype) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _write(self, version: str, filename: str, table: np.ndarray) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _close(self) -> None:
+        ...
+
+    def _abort(self) -> None:
+        self._close()
+
+
+def _values(table: np.ndarray,
+            name: str,
+            convert: Callable[[Any], Any]
+            ) -> List[Any]:
+    """
+    Returns the values of a given field of a table as Python objects.
+    """
+    values = table[name]
+    if values.dtype.kind in 'Mb':
+        return [None if v is None else convert(v) for v in values.tolist()]
+    return values.tolist()
+
+
+class _TextExporter(Exporter):
+    """
+    Writes the dataset to a single text file.
+    """
+    def _open(self, fields: List[str], dtype: np.dtype) -> None:
+        exists = self.append and os.path.exists(self.path) and \
+            os.path.getsize(self.path) > 0
+        if exists:
+            self._check_header(fields)
+        self._file: IO[str] = \
+            open(self.path, 'a' if self.append else 'w', newline='')
+        if not exists:
+            self._write_header(fields)
+
+    def _check_header(self, fields: List[str]) -> None:
+        pass
+
+    def _write_header(self, fields: List[str]) -> None:
+        pass
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class CSVExporter(_TextExporter):
+    """
+    Writes the dataset to a CSV file, with a header row. Datetimes are
+    written in ISO 8601 format, and booleans as `true` or `false`.
+    """
+    name = 'csv'
+    extension = '.csv'
+
+    @staticmethod
+    def _convert(value: Any) -> str:
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return value.isoformat()
+
+    def _check_header(self, fields: List[str]) -> None:
+        with open(self.path, newline='') as fh:
+            header = next(csv.reader(fh), [])
+        if header != fields:
+            msg = "cannot append table with fields {} to {} with fields {}"
+            raise ValueError(msg.format(fields, self.path, header))
+
+    def _write_header(self, fields: List[str]) -> None:
+        csv.writer(self._file).writerow(fields)
+
+    def _write(self, version: str, filename: str, table: np.ndarray) -> None:
+        columns = [_values(table, name, self._convert)
+                   for name in table.dtype.names]
+        rows = zip(itertools.repeat(version), itertools.repeat(filename),
+                   *columns)
+        csv.writer(self._file).writerows(rows)
+
+
+class JSONLinesExporter(_TextExporter):
+    """
+    Writes the dataset to a file containing one JSON object per row, keyed
+    by field. Datetimes are written in ISO 8601 format.
+    """
+    name = 'jsonl'
+    extension = '.jsonl'
+
+    @staticmethod
+    def _convert(value: Any) -> Any:
+        if isinstance(value, bool):
+            return value
+        return value.isoformat()
+
+    def _write(self, version: str, filename: str, table: np.ndarray) -> None:
+        names = table.dtype.names
+        columns = [_values(table, name, self._convert) for name in names]
+        for values in zip(*columns):
+            row: Dict[str, Any] = {'version': version, 'filename': filename}
+            row.update(zip(names, values))
+            self._file.write(json.dumps(row))
+            self._file.write('\n')
+
+
+class _ColumnarExporter(Exporter):
+    """
+    Writes the dataset to a directory of part files, using pyarrow. Each
+    exporter writes a single part file, which is moved into place once it
+    is complete.
+    """
+    def __init__(self, path: str, append: bool = False) -> None:
+        if pyarrow is None:
+            msg = "the {} format requires pyarrow to be installed"
+            raise ImportError(msg.format(self.name))
+        super().__init__(path, append=append)
+
+    def _parts(self) -> List[str]:
+        """
+        Returns the names of the existing part files within the dataset.
+        """
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path)
+                      if name.startswith('part-') and
+                      name.endswith(self.extension))
+
+    def _type(self, dtype: np.dtype) -> 'pyarrow.DataType':
+        """
+        Returns the type used to store the values of a given field.
+        """
+        if dtype.kind in 'UOS':
+            return pyarrow.string()
+        return pyarrow.from_numpy_dtype(dtype)
+
+    def _schema(self, fields: List[str], dtype: np.dtype) -> 'pyarrow.Schema':
+        columns = [(name, pyarrow.string()) for name in KEY_FIELDS]
+        for name in dtype.names:
+            columns.append((name, self._type(dtype.fields[name][0])))
+        return pyarrow.schema(columns)
+
+    @abc.abstractmethod
+    def _read_schema(self, path: str) -> 'pyarrow.Schema':
+        """
+        Returns the schema of an existing part file.
+        """
+        ...
+
+    def _open(self, fields: List[str], dtype: np.dtype) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        parts = self._parts()
+        self._arrow_schema = self._schema(fields, dtype)
+        if self.append and parts:
+            existing = self._read_schema(os.path.join(self.path, parts[-1]))
+            if not existing.equals(self._arrow_schema):
+                msg = "cannot append table with schema {} to {} with schema {}"
+                raise ValueError(msg.format(self._arrow_schema, self.path,
+                                            existing))
+        elif parts:
+            for name in parts:
+                os.remove(os.path.join(self.path, name))
+            parts = []
+
+        number = int(parts[-1][5:-len(self.extension)]) + 1 if parts else 0
+        name = 'part-{:05d}{}'.format(number, self.extension)
+        self._part = os.path.join(self.path, name)
+        self._tmp = os.path.join(self.path, '.{}.tmp'.format(name))
+        self._writer = self._open_writer(self._tmp, self._arrow_schema)
+
+    @abc.abstractmethod
+    def _open_writer(self, path: str, schema: 'pyarrow.Schema') -> Any:
+        """
+        Returns a writer for a new part file with a given schema.
+        """
+        ...
+
+    def _batch(self,
+               version: str,
+               filename: str,
+               table: np.ndarray
+               ) -> 'pyarrow.RecordBatch':
+        """
+        Converts an annotation table to a record batch.
+        """
+        schema = self._arrow_schema
+        arrays = [pyarrow.array([version] * len(table), pyarrow.string()),
+                  pyarrow.array([filename] * len(table), pyarrow.string())]
+        for name in table.dtype.names:
+            values = table[name]
+            if values.dtype.kind in 'UOS':
+                values = values.tolist()
+            arrays.append(pyarrow.array(values, schema.field(name).type))
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def _close(self) -> None:
+        self._writer.close()
+        os.rename(self._tmp, self._part)
+
+    def _abort(self) -> None:
+        self._writer.close()
+        os.remove(self._tmp)
+
+
+class ParquetExporter(_ColumnarExporter):
+    """
+    Writes the dataset to a directory of Parquet files, in which the table
+    for each file is written as a separate row group.
+    """
+    name = 'parquet'
+    extension = '.parquet'
+
+    def _type(self, dtype: np.dtype) -> 'pyarrow.DataType':
+        # Parquet cannot store timestamps with a resolution of seconds
+        if dtype.kind == 'M' and np.datetime_data(dtype)[0] == 's':
+            return pyarrow.timestamp('ms')
+        return super()._type(dtype)
+
+    def _read_schema(self, path: str) -> 'pyarrow.Schema':
+        return pyarrow.parquet.read_schema(path)
+
+    def _open_writer(self, path: str, schema: 'pyarrow.Schema') -> Any:
+        return pyarrow.parquet.ParquetWriter(path, schema)
+
+    def _write(self, version: str, filename: str, table: np.ndarray) -> None:
+        batch = self._batch(version, filename, table)
+        self._writer.write_table(pyarrow.Table.from_batches([batch]),
+                                 row_group_size=len(table))
+
+
+class ArrowExporter(_ColumnarExporter):
+    """
+    Writes the dataset to a directory of Arrow IPC files, in which the table
+    for each file is written as a separate record batch.
+    """
+    name = 'arrow'
+    extension = '.arrow'
+
+    def _read_schema(self, path: str) -> 'pyarrow.Schema':
+        with pyarrow.ipc.open_file(path) as reader:
+            return reader.schema
+
+    def _open_writer(self, path: str, schema: 'pyarrow.Schema') -> Any:
+        return pyarrow.ipc.new_file(path, schema)
+
+    def _write(self, version: str, filename: str, table: np.ndarray) -> None:
+        self._writer.write_batch(self._batch(version, filename, table))
+
+
+# The available exporters, indexed by the name of their format.
+FORMATS: Dict[str, Type[Exporter]] = {
+    CSVExporter.name: CSVExporter,
+    JSONLinesExporter.name: JSONLinesExporter,
+    ParquetExporter.name: ParquetExporter,
+    ArrowExporter.name: ArrowExporter
+}
+
+
+def open_exporter(path: str,
+                  format: Optional[str] = None,
+                  append: bool = False
+                  ) -> Exporter:
+    """
+    Returns an exporter that writes to the dataset at a given location.
+
+    Params:
+      format: The name of the format of the dataset (see FORMATS). If
+        omitted, the format is determined by the extension of the path.
+
+    Raises:
+        ValueError: if the format is unknown, or cannot be determined.
+        ImportError: if the format requires pyarrow, but it is not
+          installed.
+    """
+    if format is None:
+        extension = os.path.splitext(path.rstrip(os.sep))[1]
+        for exporter in FORMATS.values():
+            if exporter.extension == extension:
+                format = exporter.name
+                break
+        else:
+            msg = "cannot determine the format of {}"
+            raise ValueError(msg.format(path))
+    try:
+        cls = FORMATS[format]
+    except KeyError:
+        raise ValueError("unknown format: {}".format(format))
+    return cls(path, append=append)
+
+
+def export(project: Project,
+           tasks: List[Tuple[Union[git.Commit, str], str]],
+           path: str,
+           columns: Optional[List[FileColumn]] = None,
+           format: Optional[str] = None,
+           append: bool = False,
+           jobs: int = 1
+           ) -> List[AnnotationResult]:
+    """
+    Annotates a number of (version, filename) pairs, using annotate_table,
+    and writes each table to a dataset as soon as it has been computed. See
+    annotate_many and open_exporter.
+
+    Returns:
+        The results of the tasks that could not be annotated, each of which
+        describes its error.
+    """
+    failures: List[AnnotationResult] = []
+    with open_exporter(path, format=format, append=append) as exporter:
+        for result in annotate_many(project, tasks, columns,
+                                    jobs=jobs, typed=True):
+            if result.error is not None:
+                failures.append(result)
+            else:
+                exporter.write(result.version, result.filename, result.table)
+    return failures
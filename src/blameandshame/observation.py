@@ -1,7 +1,16 @@
 import git
-from typing import FrozenSet
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, \
+    Tuple
+import multiprocessing
 from blameandshame.project import Project
-from blameandshame.base import Line
+from blameandshame.project.diff import DiffSummary, iter_diff
+from blameandshame.base import Change, LineSet
+
+
+# Describes an observation by the URL of its repository, followed by the
+# revisions of the project immediately before and after the bug fix.
+ObservationSpec = Tuple[str, str, str]
 
 
 class Observation(object):
@@ -13,17 +22,79 @@ class Observation(object):
               before_sha: str,
               after_sha: str) -> 'Observation':
         project = Project.from_url(repo_url)
-        before = project.repo.commit(before_sha)
-        after = project.repo.commit(after_sha)
+        before = project.backend.commit(before_sha)
+        after = project.backend.commit(after_sha)
         return Observation(project, before, after)
 
+    @staticmethod
+    def load_many(specs: Iterable[ObservationSpec],
+                  jobs: Optional[int] = None,
+                  open_project: Callable[[str], Project] = Project.from_url,
+                  prefetch: bool = False
+                  ) -> List['Observation']:
+        """
+        Builds a number of observations at once. Observations are grouped by
+        repository, so that each repository is opened (and, if necessary,
+        cloned or updated) once, and its project is shared by all of its
+        observations. Repositories are loaded concurrently by a pool of
+        threads; the observations for a single repository are loaded by the
+        same thread, since a project may not be used by several threads at
+        once.
+
+        Params:
+          specs: A list of (repo_url, before_sha, after_sha) triples, as
+            accepted by build.
+          jobs: The number of repositories that may be loaded at once.
+            Defaults to the number of available CPUs.
+          open_project: The function used to open the project for a given
+            URL (e.g., to select a clone strategy).
+          prefetch: If True, the modified files and lines of each observation
+            are also computed by the pool.
+
+        Returns:
+            The observations, in the same order as their specs.
+        """
+        specs = list(specs)
+        if jobs is None:
+            jobs = multiprocessing.cpu_count()
+        groups: Dict[str, List[int]] = {}
+        for (i, (url, _, _)) in enumerate(specs):
+            groups.setdefault(url, []).append(i)
+
+        observations: List[Optional['Observation']] = [None] * len(specs)
+
+        def load(url: str) -> None:
+            project = open_project(url)
+            for i in groups[url]:
+                (_, before_sha, after_sha) = specs[i]
+                obs = Observation(project,
+                                  project.backend.commit(before_sha),
+                                  project.backend.commit(after_sha))
+                if prefetch:
+                    obs._compute()
+                observations[i] = obs
+
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            for future in [pool.submit(load, url) for url in groups]:
+                future.result()
+        return observations
+
     def __init__(self,
                  project: Project,
                  before: git.Commit,
-                 after: git.Commit) -> None:
+                 after: git.Commit,
+                 paths: Optional[List[str]] = None) -> None:
+        """
+        Params:
+          paths: An optional list of paths (or pathspecs) to which the
+            changes made by the bug fix should be limited.
+        """
         self.__project = project
         self.__before = before
         self.__after = after
+        self.__paths = paths
+        self.__modified_files: Optional[FrozenSet[str]] = None
+        self.__modified_lines: Optional[LineSet] = None
 
     @property
     def project(self) -> Project:
@@ -46,6 +117,37 @@ class Observation(object):
         """
         return self.__after
 
+    @property
+    def paths(self) -> Optional[List[str]]:
+        """
+        The paths to which the changes made by the bug fix are limited, or
+        None if every file is considered.
+        """
+        return self.__paths
+
+    def _diff(self) -> DiffSummary:
+        """
+        Computes the changes made by the bug fix. Unlimited diffs are shared
+        with (and cached by) the project; diffs that are limited to a set of
+        paths are computed by passing those paths to git.
+        """
+        if self.__paths is None:
+            return self.project._diff(self.before, self.after)
+        return DiffSummary(iter_diff(self.project.repo,
+                                     self.before.hexsha,
+                                     self.after.hexsha,
+                                     self.__paths))
+
+    def _compute(self) -> None:
+        """
+        Computes and caches the modified files and lines of this bug fix from
+        a single diff.
+        """
+        diff = self._diff()
+        files = diff.files({Change.MODIFIED})
+        self.__modified_lines = diff.old_lines.restrict(list(files))
+        self.__modified_files = files
+
     @property
     def modified_files(self) -> FrozenSet[str]:
         """
@@ -60,17 +162,17 @@ class Observation(object):
         refactoring rather than bug-fixing, and so we should avoid those to
         prevent skewing the model.
         """
-        diff = self.before.diff(self.after)
-        return frozenset(d.a_path for d in diff.iter_change_type('M'))
+        if self.__modified_files is None:
+            self._compute()
+        return self.__modified_files
 
     @property
-    def modified_lines(self) -> FrozenSet[Line]:
+    def modified_lines(self) -> LineSet:
         """
         The set of lines in the buggy version of the project that were modified
         as part of the bug fix. Note that lines belonging to files that were
         deleted by the bug fix are not considered to have been modified.
         """
-        files = list(self.modified_files)
-        return Project.lines_modified_between_commits(before=self.before,
-                                                      after=self.after,
-                                                      in_files=files)
+        if self.__modified_lines is None:
+            self._compute()
+        return self.__modified_lines
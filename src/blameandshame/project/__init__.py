@@ -1 +1,4 @@
 from blameandshame.project.base import Project
+from blameandshame.project.clone import CloneStrategy
+from blameandshame.project.ownership import OwnershipMatrix
+from blameandshame.project.functions import Function, funcname_pattern
@@ -0,0 +1,277 @@
+"""
+Provides the backends used by a Project to run its git operations.
+
+The subprocess backend performs every operation using the git binary:
+history queries (log, blame, diff and rev-list) run as separate processes,
+while objects (commits, trees and blobs) are read through GitPython's
+persistent `git cat-file` processes.
+
+The in-process backend instead reads objects directly from the loose object
+files and packfiles of the repository, using gitdb, a pure-Python object
+database, so that resolving revisions, loading commit metadata and reading
+trees and blobs never waits on another process. Objects are read through a
+separate handle on the repository, so the project's own handle is left
+untouched. Since gitdb cannot compute blame or diffs, history queries are
+still answered by the git binary.
+Objects that are absent from the local object database (e.g., the blobs of
+a blobless clone) are read through git, which fetches them on demand.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+import os
+import git
+import gitdb.exc
+from blameandshame.cache import MemoryCache
+from blameandshame.project.blobs import FULL_SHA, BlobReader
+
+# The mode of a symbolic link within a tree.
+SYMLINK_MODE = 0o120000
+
+
+class GitBackend(object):
+    """
+    Runs the git operations required by a Project using the git binary.
+    """
+    # The name used to select this backend (see BACKENDS).
+    name = 'subprocess'
+
+    def __init__(self,
+                 repo: git.Repo,
+                 index: Optional[MemoryCache] = None,
+                 commits: Optional[MemoryCache] = None
+                 ) -> None:
+        """
+        Params:
+          index: The cache used to hold the line offsets of each blob (see
+            BlobReader).
+          commits: The cache used to hold the commits that have been looked
+            up by their full hash. If unspecified, an unbounded cache is used.
+        """
+        self.__repo = repo
+        self.__commits = commits if commits is not None else MemoryCache()
+        self.__blobs = self._blob_reader(repo, index)
+
+    def _blob_reader(self,
+                     repo: git.Repo,
+                     index: Optional[MemoryCache]
+                     ) -> BlobReader:
+        return BlobReader(repo, index=index)
+
+    @property
+    def repo(self) -> git.Repo:
+        """
+        The repository whose operations are performed by this backend.
+        """
+        return self.__repo
+
+    @property
+    def objects(self) -> git.Repo:
+        """
+        The handle on the repository through which commits and trees are
+        read, and to which the commits returned by this backend belong.
+        """
+        return self.__repo
+
+    @property
+    def blobs(self) -> BlobReader:
+        """
+        The reader used to fetch the contents of files.
+        """
+        return self.__blobs
+
+    def refresh(self) -> None:
+        """
+        Informs the backend that new objects may have been added to the
+        repository (e.g., by a fetch).
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Terminates any processes held by this backend.
+        """
+        self.__blobs.close()
+
+    def rev_parse(self, rev: str) -> Optional[str]:
+        """
+        Returns the full hash of the commit named by a given revision, or
+        None if no such commit exists.
+        """
+        try:
+            return self.objects.commit(rev).hexsha
+        except (git.exc.GitError, gitdb.exc.ODBError, ValueError):
+            return None
+
+    def commit(self, rev: str, verify: bool = True) -> git.Commit:
+        """
+        Returns the commit named by a given revision, whose attributes are
+        loaded from the object database on demand. Commits named by their
+        full hash are memoized, so that repeated lookups of the same commit
+        return the same (already loaded) object.
+
+        Params:
+          verify: If False, and the revision is a full hash, the existence of
+            the commit is not checked until its attributes are first used.
+        """
+        if not FULL_SHA.match(rev):
+            return self.objects.commit(rev)
+        try:
+            return self.__commits[rev]
+        except KeyError:
+            pass
+        if verify:
+            commit = self.objects.commit(rev)
+        else:
+            commit = git.Commit(self.objects, bytes.fromhex(rev))
+        self.__commits[rev] = commit
+        return commit
+
+    def files(self, rev: str) -> List[str]:
+        """
+        Returns the paths of the regular files (i.e., excluding symbolic
+        links and submodules) within the tree of a given revision, in the
+        order in which they appear in the tree.
+        """
+        out = self.repo.git.ls_tree('-r', '-z', '--full-tree', rev)
+        files = []
+        for entry in out.split('\0'):
+            info, _, filename = entry.partition('\t')
+            if not filename:
+                continue
+            mode, kind = info.split(' ')[:2]
+            if kind == 'blob' and int(mode, 8) != SYMLINK_MODE:
+                files.append(filename)
+        return files
+
+    def log(self, *args, **kwargs) -> str:
+        return self.repo.git.log(*args, **kwargs)
+
+    def blame(self, *args) -> bytes:
+        return self.repo.git.blame(*args, stdout_as_string=False)
+
+    def diff(self, *args) -> bytes:
+        return self.repo.git.diff(*args, stdout_as_string=False)
+
+
+class InProcessBlobReader(BlobReader):
+    """
+    Reads the contents of files directly from the object database of a
+    repository, using gitdb. Files that cannot be found locally are read
+    through a `git cat-file` process instead.
+    """
+    def __init__(self,
+                 repo: git.Repo,
+                 objects: git.Repo,
+                 commit: Callable[[str], git.Commit],
+                 index: Optional[MemoryCache] = None
+                 ) -> None:
+        """
+        Params:
+          objects: A handle on the repository whose object database is read
+            by gitdb.
+          commit: A function that returns the commit for a given revision.
+        """
+        super().__init__(repo, index=index)
+        self.__objects = objects
+        self.__commit = commit
+
+    def _resolve(self, rev: str, path: Optional[str]) -> Optional[bytes]:
+        """
+        Returns the binary hash of the blob at a given path within a given
+        revision, or of a given blob, or None if it cannot be found locally.
+        """
+        try:
+            if path is None:
+                obj = self.__objects.rev_parse(rev)
+            else:
+                obj = self.__commit(rev).tree / path if path else None
+            if obj is None or obj.type != 'blob':
+                return None
+        except (KeyError, IndexError, ValueError,
+                git.exc.GitError, gitdb.exc.ODBError):
+            return None
+        return obj.binsha
+
+    def read_many(self,
+                  objects: Iterable[Tuple[str, Optional[str]]]
+                  ) -> List[Optional[bytes]]:
+        objects = list(objects)
+        results: List[Optional[bytes]] = []
+        remote: Dict[int, Tuple[str, Optional[str]]] = {}
+        for (i, (rev, path)) in enumerate(objects):
+            binsha = self._resolve(rev, path)
+            data = None
+            if binsha is not None:
+                try:
+                    data = self.__objects.odb.stream(binsha).read()
+                except gitdb.exc.BadObject:
+                    remote[i] = (rev, path)
+                else:
+                    self._remember(rev, path, binsha.hex(), data)
+            else:
+                # the object may be missing from a partial clone, or may not
+                # exist at all: either way, git has the final say
+                remote[i] = (rev, path)
+            results.append(data)
+
+        if remote:
+            fetched = super().read_many(remote.values())
+            for (i, data) in zip(remote, fetched):
+                results[i] = data
+        return results
+
+
+class InProcessBackend(GitBackend):
+    """
+    Reads commits, trees and blobs directly from the object database of a
+    repository, without launching git processes. History queries are still
+    performed by the git binary.
+    """
+    name = 'in-process'
+
+    def __init__(self,
+                 repo: git.Repo,
+                 index: Optional[MemoryCache] = None,
+                 commits: Optional[MemoryCache] = None
+                 ) -> None:
+        objects = git.Repo(repo.working_dir)
+        objects.odb = git.GitDB(os.path.join(objects.common_dir, 'objects'))
+        self.__objects = objects
+        super().__init__(repo, index, commits)
+
+    def _blob_reader(self,
+                     repo: git.Repo,
+                     index: Optional[MemoryCache]
+                     ) -> BlobReader:
+        return InProcessBlobReader(repo, self.__objects, self.commit,
+                                   index=index)
+
+    @property
+    def objects(self) -> git.Repo:
+        return self.__objects
+
+    def refresh(self) -> None:
+        self.__objects.odb.update_cache(force=True)
+
+    def close(self) -> None:
+        super().close()
+        self.__objects.close()
+
+    def files(self, rev: str) -> List[str]:
+        files: List[str] = []
+
+        def visit(tree: git.Tree) -> None:
+            for entry in tree:
+                if entry.type == 'tree':
+                    visit(entry)
+                elif entry.type == 'blob' and entry.mode != SYMLINK_MODE:
+                    files.append(entry.path)
+
+        visit(self.commit(rev).tree)
+        return files
+
+
+# The available backends, indexed by name.
+BACKENDS: Dict[str, Type[GitBackend]] = {
+    GitBackend.name: GitBackend,
+    InProcessBackend.name: InProcessBackend
+}
@@ -1,18 +1,81 @@
-from blameandshame.base import Change, Line, Commits
-from typing import Dict, FrozenSet, List, Tuple, Optional, Set
+from blameandshame.base import Change, LineSet, Commits
+from blameandshame.cache import CacheBudget, DiskCache, MemoryCache
+from blameandshame.project.graph import CommitGraph
+from blameandshame.stats import CallStats, InstrumentedGit, Recorder, \
+    instrumented
+from blameandshame.project.blame import build_commits, parse_incremental
+from blameandshame.project.backend import BACKENDS, GitBackend
+from blameandshame.project.blobs import BlobReader
+from blameandshame.project.clone import CloneStrategy, clone, mirror_path, \
+    repo_lock
+from blameandshame.project.diff import DiffSummary, iter_diff
+from blameandshame.project.files import FileHistoryIndex
+from blameandshame.project.functions import Function, find_function, \
+    function_spans
+from blameandshame.project.history import LineHistory, parse_hunks
+from blameandshame.project.ownership import OwnershipMatrix
+from typing import Any, Callable, Dict, FrozenSet, List, Tuple, Optional, \
+    Set, Union
+import configparser
+import functools
+import json
 import git
 import os
-import shutil
+import time
 import urllib.parse
 from datetime import timedelta
 import warnings
 
 
+class _StaticCompatible(object):
+    """
+    Wraps a method of Project that used to be a static method, so that it
+    may still be called on the class itself with the arguments of the static
+    method (i.e., without a project), at the cost of a DeprecationWarning.
+    Such calls are answered by a new project for the repository of the
+    commit given by the first argument.
+    """
+    def __init__(self, method: Callable) -> None:
+        self.__method = method
+        functools.update_wrapper(self, method)
+
+    def __get__(self, project: Any, owner: type) -> Callable:
+        method = self.__method
+        if project is not None:
+            return method.__get__(project, owner)
+
+        @functools.wraps(method)
+        def compatible(*args, **kwargs):
+            if args and isinstance(args[0], owner):
+                return method(*args, **kwargs)
+            msg = ("Project.{} is no longer a static method; call it on a "
+                   "Project instead").format(method.__name__)
+            warnings.warn(msg, DeprecationWarning, stacklevel=2)
+            commit = (list(args) + list(kwargs.values()))[0]
+            return method(owner(commit.repo, offline=True), *args, **kwargs)
+
+        return compatible
+
+
 class Project(object):
 
     # Path to the directory used to hold downloaded Git repositories.
     REPOS_DIR = os.path.join(os.getcwd(), '.repos')
 
+    # The names of the in-memory tables used to memoize query results.
+    CACHE_TABLES = ('last_commits_for_file', 'commits_to_file',
+                    'commits_to_repo', 'commits_to_lines', 'diffs',
+                    'blob_lines', 'function_histories', 'commits',
+                    'ancestors', 'orders')
+
+    # The section and option of the repository's git config used to record
+    # the time at which it was last fetched from its remote.
+    UPDATE_CONFIG = ('blameandshame', 'lastfetch')
+
+    # If this environment variable is set to a non-empty value, projects
+    # are never updated from their remotes (e.g., on air-gapped machines).
+    OFFLINE_ENV = 'BLAMEANDSHAME_OFFLINE'
+
     @staticmethod
     def _url_to_path(url: str) -> str:
         """
@@ -27,48 +90,497 @@ class Project(object):
         return os.path.join(Project.REPOS_DIR, name)
 
     @staticmethod
-    def from_url(url: str) -> 'Project':
+    def from_url(url: str,
+                 persistent_cache: bool = False,
+                 offline: bool = False,
+                 update_ttl: Optional[timedelta] = None,
+                 strategy: CloneStrategy = CloneStrategy.FULL,
+                 mirror_dir: Optional[str] = None
+                 ) -> 'Project':
         """
-        Retrieves a project by the URL of its Git repository.
+        Retrieves a project by the URL of its Git repository, cloning it to
+        disk if necessary.
 
-        Internally, this function uses GitPython to clone the entire history
-        for Git repositories to disk. Each repository is cloned to its own
-        subdirectory within `${PWD}/.repos`.
+        By default, the entire history of the repository is cloned, together
+        with a working tree, to its own subdirectory within `${PWD}/.repos`.
 
         Warning: This can potentially consume quite a bit of disk space.
+        Bare (CloneStrategy.MIRROR) and blobless (CloneStrategy.BLOBLESS)
+        mirrors avoid the working tree, and blobless mirrors only download
+        the contents of the files that are actually inspected. Mirrors are
+        stored in a shared directory, so each repository is only cloned once
+        per machine, regardless of the working directory. Clones and updates
+        are protected by per-repository locks, allowing parallel workers to
+        retrieve the same project safely.
+
+        Params:
+          persistent_cache: If True, the results of git queries for this
+            project are stored in `<repository>.cache`, next to the copy of
+            the repository, and reused across runs.
+          offline: If True, an existing copy of the repository is not
+            updated from its remote.
+          update_ttl: The minimum amount of time that must pass before an
+            existing copy of the repository is updated again (see
+            Project.__init__).
+          strategy: The strategy used to clone the repository.
+          mirror_dir: The directory used to store shared mirrors. Defaults
+            to the value of the BLAMEANDSHAME_MIRROR_DIR environment
+            variable, or `~/.cache/blameandshame/mirrors`.
         """
         # Determine the (intended) location of the given repo on disk
-        path = Project._url_to_path(url)
+        if strategy == CloneStrategy.FULL:
+            path = Project._url_to_path(url)
+        else:
+            path = mirror_path(url, mirror_dir)
+        cache_path = '{}.cache'.format(path) if persistent_cache else None
 
         # Don't clone the repo if it already exists.
-        if not os.path.exists(path):
-            try:
-                # ensure that the `${PWD}/.repos` directory exists
-                if not os.path.exists(Project.REPOS_DIR):
-                    os.mkdir(Project.REPOS_DIR)
+        if clone(url, path, strategy):
+            project = Project(git.Repo(path),
+                              cache_path=cache_path,
+                              offline=True)
+            project._record_update()
+            return project
+
+        return Project.from_disk(path,
+                                 cache_path=cache_path,
+                                 offline=offline,
+                                 update_ttl=update_ttl)
 
-                repo = git.Repo.clone_from(url, path)
-                return Project(repo)
+    @staticmethod
+    def from_disk(path: str,
+                  cache_path: Optional[str] = None,
+                  offline: bool = False,
+                  incremental_blame: bool = False,
+                  cache_budget: Optional[Union[CacheBudget,
+                                               Dict[str, CacheBudget]]] = None,
+                  update_ttl: Optional[timedelta] = None,
+                  backend: str = GitBackend.name,
+                  index_files: bool = False
+                  ) -> 'Project':
+        """
+        Retrieves a project whose repository is stored at a given local path.
 
-            # ensure that we don't end up with corrupted clones
-            except git.exc.GitCommandError:
-                shutil.rmtree(path, ignore_errors=True)
-                raise
+        Params:
+          cache_path: An optional path to a file that should be used to store
+            the results of git queries across runs.
+          offline: If True, the repository is not updated from its remote.
+          incremental_blame: If True, the blame for a version of a file is
+            derived from the blame for its parent, where possible.
+          cache_budget: The limits on the size of the in-memory caches used
+            by the project (see Project.__init__).
+          update_ttl: The minimum amount of time that must pass before the
+            repository is updated again (see Project.__init__).
+          backend: The name of the backend used to perform git operations
+            (see Project.__init__).
+          index_files: If True, the histories of files are answered from an
+            index of the history of the repository (see Project.__init__).
+        """
+        return Project(git.Repo(path),
+                       cache_path=cache_path,
+                       offline=offline,
+                       incremental_blame=incremental_blame,
+                       cache_budget=cache_budget,
+                       update_ttl=update_ttl,
+                       backend=backend,
+                       index_files=index_files)
+
+    def __init__(self,
+                 repo: git.Repo,
+                 cache_path: Optional[str] = None,
+                 offline: bool = False,
+                 incremental_blame: bool = False,
+                 cache_budget: Optional[Union[CacheBudget,
+                                              Dict[str, CacheBudget]]] = None,
+                 update_ttl: Optional[timedelta] = None,
+                 backend: str = GitBackend.name,
+                 index_files: bool = False
+                 ) -> None:
+        """
+        Params:
+          offline: If True, the repository is never updated from its remote.
+            Projects are also offline if the environment variable given by
+            OFFLINE_ENV is set.
+          update_ttl: The minimum amount of time that must pass between
+            successive updates of the repository, or None if the repository
+            should be updated whenever a project is created. The time of the
+            last update is recorded in the repository's git config, and so
+            is shared by every project that uses the same repository.
+          cache_budget: The limits on the size of the in-memory tables used
+            to memoize the results of queries, given either as a single
+            budget that applies to each table, or as a dictionary of budgets
+            indexed by the name of the table (see CACHE_TABLES). Tables
+            without a budget are unbounded.
+          backend: The name of the backend used to perform git operations,
+            given by one of the keys of BACKENDS: either 'subprocess', which
+            uses the git binary for everything, or 'in-process', which reads
+            commits, trees and blobs directly from the object database.
+          index_files: If True, the commits made to each file are found
+            using an index of the paths touched by every commit, built from
+            a single walk over the history of the repository, rather than
+            by running `git log --follow` for each file (see file_index).
+        """
+        self.__repo: git.Repo = repo
+        self.__incremental_blame = incremental_blame
+        self.__cache_budget = cache_budget
+        self.__recorder: Optional[Recorder] = None
+        self.__commit_graph: Optional[CommitGraph] = None
+        self.__index_files = index_files
+        self.__file_index: Optional[FileHistoryIndex] = None
+        self.__disk_cache: Optional[DiskCache] = \
+            DiskCache(cache_path) if cache_path else None
+
+        def budget(table: str) -> Optional[CacheBudget]:
+            if isinstance(cache_budget, dict):
+                return cache_budget.get(table)
+            return cache_budget
+
+        self.__caches: Dict[str, MemoryCache] = {
+            table: MemoryCache(budget(table))
+            for table in Project.CACHE_TABLES
+        }
+        self.__backend: GitBackend = \
+            BACKENDS[backend](repo,
+                              index=self.__caches['blob_lines'],
+                              commits=self.__caches['commits'])
+        self.__blobs = self.__backend.blobs
+        self.__last_commits_dict = self.__caches['last_commits_for_file']
+        self.__commits_to_file_dict = self.__caches['commits_to_file']
+        self.__commits_to_repo_dict = self.__caches['commits_to_repo']
+        self.__commits_to_lines_dict = self.__caches['commits_to_lines']
+        self.__function_histories_dict = self.__caches['function_histories']
+        self.__diffs_dict = self.__caches['diffs']
+
+        if not offline and not os.environ.get(Project.OFFLINE_ENV) \
+           and self.needs_update(update_ttl):
+            # only one of several concurrent projects needs to update
+            lock = os.path.join(repo.git_dir, 'blameandshame-update')
+            with repo_lock(lock):
+                if self.needs_update(update_ttl):
+                    self.update()
+
+    def update(self) -> None:
+        """
+        Updates the references of the Git repository associated with this
+        project by fetching them from its remote, if it has one. The working
+        tree (and HEAD) are left untouched.
+        """
+        if 'origin' in self.repo.remotes:
+            self.repo.remotes.origin.fetch()
+            self.__backend.refresh()
+        self._record_update()
+        self.__commit_graph = None
+        self.__file_index = None
+
+    def _record_update(self) -> None:
+        """
+        Records the current time as the time of the last update within the
+        repository's git config. The config is written by git itself, which
+        replaces the file atomically, so that concurrent readers never see a
+        partially written config. Failures (e.g., because another process is
+        writing to the config) are ignored, at the cost of a later update.
+        """
+        try:
+            self.repo.git.config('.'.join(Project.UPDATE_CONFIG),
+                                 str(int(time.time())))
+        except git.exc.GitCommandError:
+            pass
 
-        return Project.from_disk(path)
+    def last_updated(self) -> Optional[float]:
+        """
+        The time at which the repository was last updated from its remote,
+        given in seconds since the epoch, or None if that time is unknown.
+        """
+        section, option = Project.UPDATE_CONFIG
+        reader = self.repo.config_reader('repository')
+        try:
+            return float(reader.get_value(section, option))
+        except (configparser.Error, ValueError):
+            return None
 
-    @staticmethod
-    def from_disk(path: str) -> 'Project':
+    def needs_update(self, ttl: Optional[timedelta] = None) -> bool:
         """
-        Retrieves a project whose repository is stored at a given local path.
+        Determines whether the repository should be updated from its remote,
+        given the minimum amount of time that should pass between updates.
+        If no such time is given, an update is always needed.
+        """
+        if ttl is None:
+            return True
+        last = self.last_updated()
+        return last is None or time.time() - last >= ttl.total_seconds()
+
+    @property
+    def repo(self) -> git.Repo:
+        """
+        The Git repository associated with this project.
+        """
+        return self.__repo
+
+    @property
+    def commit_graph(self) -> CommitGraph:
+        """
+        An index of the commit graph of this project's repository, built on
+        first use and rebuilt after each update.
+        """
+        if self.__commit_graph is None:
+            self.__commit_graph = \
+                CommitGraph.build(self.repo, **self._commit_graph_tables())
+        return self.__commit_graph
+
+    @property
+    def index_files(self) -> bool:
+        """
+        Indicates whether the commits made to each file are found using the
+        file history index of this project. See file_index.
+        """
+        return self.__index_files
+
+    @property
+    def file_index(self) -> FileHistoryIndex:
+        """
+        An index of the commits that touched each path within this project's
+        repository, built on first use and rebuilt after each update. The
+        index reproduces the semantics of `git log --follow`, except for a
+        few documented corner cases (see blameandshame.project.files).
         """
-        return Project(git.Repo(path))
+        if self.__file_index is None:
+            self.__file_index = \
+                FileHistoryIndex.build(self.repo, self.commit_graph)
+        return self.__file_index
+
+    def _commit_graph_tables(self) -> Dict[str, MemoryCache]:
+        """
+        Empties the in-memory tables used by the index of the commit graph,
+        which are specific to a single build of that index, and returns them
+        as keyword arguments for CommitGraph.build and CommitGraph.parse.
+        """
+        tables = {'ancestors': self.__caches['ancestors'],
+                  'orders': self.__caches['orders']}
+        for table in tables.values():
+            table.clear()
+        return tables
+
+    def _built_commit_graph(self) -> Optional[CommitGraph]:
+        """
+        Returns the index of the commit graph, if it has already been built.
+        """
+        return self.__commit_graph
+
+    def _install_commit_graph(self, graph: CommitGraph) -> None:
+        """
+        Installs an index of the commit graph that was built elsewhere (e.g.,
+        by an AsyncProject).
+        """
+        self.__commit_graph = graph
+        self.__file_index = None
+
+    @property
+    def incremental_blame(self) -> bool:
+        """
+        Indicates whether the blame for a version of a file is derived from
+        the (previously computed) blame for its parent, rather than by
+        running `git blame` for every version. See last_commits_for_file.
+        """
+        return self.__incremental_blame
+
+    @property
+    def backend(self) -> GitBackend:
+        """
+        The backend used to perform the git operations of this project.
+        """
+        return self.__backend
+
+    @property
+    def blobs(self) -> BlobReader:
+        """
+        The reader used to fetch the contents of files within this project.
+        """
+        return self.__blobs
+
+    @property
+    def cache_budget(self) -> Optional[Union[CacheBudget,
+                                             Dict[str, CacheBudget]]]:
+        """
+        The limits on the size of the in-memory caches used by this project.
+        """
+        return self.__cache_budget
+
+    def clear_caches(self) -> None:
+        """
+        Discards all query results held in memory by this project. Results
+        stored in the on-disk cache, if any, are retained.
+        """
+        for cache in self.__caches.values():
+            cache.clear()
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Reports the number of entries, approximate size in bytes, hits,
+        misses and evictions of each of the in-memory tables used by this
+        project, indexed by the name of the table. If an on-disk cache is in
+        use, its hits and misses are reported under the name 'disk'.
+        """
+        stats = {table: cache.stats()
+                 for (table, cache) in self.__caches.items()}
+        if self.__disk_cache is not None:
+            stats['disk'] = self.__disk_cache.stats()
+        return stats
+
+    @property
+    def recorder(self) -> Optional[Recorder]:
+        """
+        The recorder used to measure the calls made to this project, or None
+        if instrumentation is disabled.
+        """
+        return self.__recorder
+
+    def _cache_counters(self) -> Tuple[int, int]:
+        """
+        Returns the total number of hits and misses incurred by all of the
+        caches used by this project.
+        """
+        caches: List[Any] = list(self.__caches.values())
+        if self.__disk_cache is not None:
+            caches.append(self.__disk_cache)
+        return (sum(c.hits for c in caches), sum(c.misses for c in caches))
+
+    def enable_stats(self,
+                     hook: Optional[Callable[[CallStats], None]] = None
+                     ) -> None:
+        """
+        Starts measuring the calls made to the public methods of this project
+        and to annotation columns, together with the git processes that they
+        launch and the cache hits and misses that they incur.
+
+        Params:
+          hook: An optional function that is called with the measurements of
+            each completed call.
+        """
+        if not isinstance(self.repo.git, InstrumentedGit):
+            self.repo.git = InstrumentedGit(self.repo.working_dir)
+        self.__recorder = Recorder(self._cache_counters, hook)
+        self.repo.git.recorder = self.__recorder
+
+    def disable_stats(self) -> None:
+        """
+        Stops measuring the calls made to this project.
+        """
+        self.__recorder = None
+        if isinstance(self.repo.git, InstrumentedGit):
+            self.repo.git.recorder = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports the measurements recorded since instrumentation was enabled.
+        Under 'calls', the number of calls, total wall time, number and total
+        duration of git processes, and number of cache hits and misses are
+        given for each instrumented function. Under 'git', the number and
+        total duration of the processes launched for each git subcommand are
+        given. Under 'caches', the current state of each cache is given (see
+        cache_stats).
+        """
+        if self.__recorder is None:
+            stats: Dict[str, Any] = {'calls': {}, 'git': {}}
+        else:
+            stats = self.__recorder.summary()
+        stats['caches'] = self.cache_stats()
+        return stats
+
+    @property
+    def disk_cache(self) -> Optional[DiskCache]:
+        """
+        The on-disk store used to persist the results of git queries for
+        this project across runs, if any.
+        """
+        return self.__disk_cache
+
+    def _commit(self, sha: str) -> git.Commit:
+        """
+        Returns a lazily-loaded Commit object for a given full commit hash.
+        """
+        return self.backend.commit(sha, verify=False)
+
+    def _head(self) -> git.Commit:
+        """
+        Returns the commit at the HEAD of the repository, loaded through the
+        backend.
+        """
+        return self._commit(self.repo.head.reference.commit.hexsha)
 
     @staticmethod
-    def lines_modified_between_commits(before: git.Commit,
+    def _rev_range(after: Optional[git.Commit], before: git.Commit) -> str:
+        """
+        Returns the revision range that contains the commits made since
+        `after`, exclusive, up to and including `before`.
+        """
+        return '{}..{}'.format(after, before) if after else before.hexsha
+
+    def _cache(self, table: str) -> MemoryCache:
+        """
+        Returns the in-memory table with a given name (see CACHE_TABLES).
+        """
+        return self.__caches[table]
+
+    def _load(self, table: str, key: str) -> Optional[Any]:
+        """
+        Loads a stored query result from the on-disk cache, if one is in use.
+        """
+        if self.__disk_cache is None:
+            return None
+        return self.__disk_cache.get(table, key)
+
+    def _store(self, table: str, key: str, value: Any) -> None:
+        """
+        Writes a query result to the on-disk cache, if one is in use.
+        """
+        if self.__disk_cache is not None:
+            self.__disk_cache.put(table, key, value)
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the project, as the basename for the working directory
+        (or, for bare repositories, the git directory, without its `.git`
+        suffix).
+        """
+        name = os.path.basename(self.repo.working_dir.rstrip(os.sep))
+        if self.repo.bare and name.endswith('.git'):
+            name = name[:-4]
+        return name
+
+    def _diff(self, before: git.Commit, after: git.Commit) -> DiffSummary:
+        """
+        Returns the parsed differences between two versions of the project.
+        Diffs are memoized by the hashes of their commits, allowing them to be
+        shared between the various queries that are answered from them. The
+        lines of each diff are indexed before it is memoized, so that its
+        size is fully accounted for by the cache.
+        """
+        key = (before.hexsha, after.hexsha)
+        try:
+            return self.__diffs_dict[key]
+        except KeyError:
+            pass
+        diff = DiffSummary(iter_diff(self.repo, before.hexsha, after.hexsha))
+        diff.index()
+        self.__diffs_dict[key] = diff
+        return diff
+
+    def _diff_of_commit(self, commit: git.Commit) -> DiffSummary:
+        """
+        Returns the parsed differences between a given commit and its first
+        parent.
+        """
+        parent = self.backend.commit("{}~1".format(commit.hexsha))
+        return self._diff(parent, commit)
+
+    @_StaticCompatible
+    @instrumented
+    def lines_modified_between_commits(self,
+                                       before: git.Commit,
                                        after: git.Commit,
                                        in_files: Optional[List[str]] = None,
-                                       ) -> FrozenSet[Line]:
+                                       ) -> LineSet:
         """
         Returns the set of lines in the `before` version of the project that
         were modified by all commits up to and including an `after` version
@@ -84,36 +596,16 @@ class Project(object):
                 at changes to all files within the `before` version of the
                 project, including those that no longer exist.
         """
-        modified = set()
-        for file_diff in before.diff(after, create_patch=True, unified=0):
-            fn = file_diff.a_path
-            if fn not in in_files:
-                continue
-
-            line_num = None
-            for line in file_diff.diff.decode('utf8').split('\n'):
-
-                # If the line starts with @@, there's line numbers
-                # format: @@ -start,lines +start,lines @@
-                if line.startswith('@@ '):          # start of hunk
-                    _, old, __, *_ = line.split()
-                    line_num_s, *_ = old.split(',')
-                    line_num = int(line_num_s[1:])
-                elif line.startswith('- '):         # removed line
-                    modified.add(Line(fn, line_num))
-                    line_num += 1
-                elif line.startswith('+ '):         # added line
-                    pass
-                elif line.startswith('Binary files'):  # Binary diff
-                    break
-                else:                               # context line
-                    line_num += 1
-
-        return frozenset(modified)
-
-    @staticmethod
-    def lines_modified_by_commit(fix_commit: git.Commit
-                                 ) -> Tuple[FrozenSet[Line], FrozenSet[Line]]:
+        modified = self._diff(before, after).old_lines
+        if in_files is None:
+            return modified
+        return modified.restrict(in_files)
+
+    @_StaticCompatible
+    @instrumented
+    def lines_modified_by_commit(self,
+                                 fix_commit: git.Commit
+                                 ) -> Tuple[LineSet, LineSet]:
         """
         Returns the set of lines that were modified by a given commit. Each
         line is represented by a tuple of the form: (file name, line number).
@@ -122,72 +614,22 @@ class Project(object):
         file. These are returned in a tuple of the form (old version, new
         version).
         """
-        old_lines = set()
-        new_lines = set()
-
-        prev_sha = "{}~1".format(fix_commit.hexsha)
-        prev_commit = fix_commit.repo.commit(prev_sha)
-
-        # unified=0 shows zero lines of context
-        diff = prev_commit.diff(fix_commit, create_patch=True, unified=0)
-        for d in diff:
-            old_file = d.a_path
-            new_file = d.b_path
-
-            for line in d.diff.decode('utf8').split('\n'):
-                line_tokens = line.split()
-                # If the line starts with @@, there's line numbers
-                # format: @@ -start,lines +start,lines @@
-                first_char = line_tokens[0][0] if len(line_tokens) > 0 else ''
-                if (first_char == '@'):
-                    _, old_line_num, new_line_num, *_ = line_tokens
-                    old_line_num = int(old_line_num[1:].split(',')[0])
-                    new_line_num = int(new_line_num[1:].split(',')[0])
-                elif (first_char == '-'):
-                    old_lines.add(Line(old_file, old_line_num))
-                    old_line_num += 1
-                elif (first_char == '+'):
-                    new_lines.add(Line(new_file, new_line_num))
-                    new_line_num += 1
-                else:
-                    old_line_num += 1
-                    new_line_num += 1
-
-        return (frozenset(old_lines), frozenset(new_lines))
-
-    def __init__(self, repo: git.Repo) -> None:
-        self.__repo: git.Repo = repo
-        self.update()
-        self.__blame_info_dict: Dict[Tuple[str, str],
-                                     List[git.BlameEntry]] = dict()
-        self.__commits_to_file_dict: Dict[Tuple[str, str],
-                                          List[git.Commit]] = dict()
-        self.__commits_to_repo_dict: Dict[str, List[git.Commit]] = dict()
-        self.__age_of_all_lines_dict_sec: Dict[Tuple[git.Commit, str],
-                                               List[float]] = dict()
-        self.__age_of_all_lines_dict_com: Dict[Tuple[git.Commit, str],
-                                               List[float]] = dict()
+        diff = self._diff_of_commit(fix_commit)
+        return (diff.old_lines, diff.new_lines)
 
-    def update(self):
-        """
-        Updates the state of the Git repository associated with this project.
-        """
-        self.repo.remotes.origin.pull()
-
-    @property
-    def repo(self) -> git.Repo:
-        """
-        The Git repository associated with this project.
-        """
-        return self.__repo
-
-    @property
-    def name(self) -> str:
+    @instrumented
+    def files_modified_between_commits(self,
+                                       before: git.Commit,
+                                       after: git.Commit,
+                                       filter_by: Set[Change] = set(Change)
+                                       ) -> FrozenSet[str]:
         """
-        The name of the project, as the basename for the working directory.
+        Returns the set of files, given by name, that differ between two
+        versions of the project.
         """
-        return os.path.basename(self.repo.working_dir)
+        return self._diff(before, after).files(filter_by)
 
+    @instrumented
     def files_in_commit(self,
                         fix_commit: git.Commit,
                         filter_by: Set[Change] = {f for f in Change}
@@ -196,16 +638,42 @@ class Project(object):
         Returns the set of files, given by name, that were modified by a
         specified commit.
         """
-        prev_sha = "{}~1".format(fix_commit.hexsha)
-        prev_commit = fix_commit.repo.commit(prev_sha)
-        diff = prev_commit.diff(fix_commit)
+        return self._diff_of_commit(fix_commit).files(filter_by)
 
-        files: Set[str] = set()
-        for f in filter_by:
-            files.update(d.a_path for d in diff.iter_change_type(f.value))
+    @instrumented
+    def files_in_version(self,
+                         version: Optional[git.Commit] = None
+                         ) -> List[str]:
+        """
+        Returns the names of the regular files (i.e., excluding symbolic links
+        and submodules) within a given version of the project, in the order in
+        which they appear in its tree, as listed by the project's backend.
 
-        return frozenset(files)
+        Params:
+          version: The version of the project. Defaults to the HEAD of the
+            repository.
+        """
+        rev = version.hexsha if version is not None else 'HEAD'
+        return self.backend.files(rev)
 
+    def _log_hashes(self, *args, **kwargs) -> List[str]:
+        """
+        Runs `git log` with the given arguments and returns the full hashes
+        of the commits that it reports, in order.
+        """
+        log = self.backend.log(*args, format='commit %H', **kwargs)
+        return Project._parse_hashes(log)
+
+    @staticmethod
+    def _parse_hashes(log: str) -> List[str]:
+        """
+        Extracts the full hashes of the commits reported by `git log
+        --format='commit %H'`, in order.
+        """
+        return [line[7:] for line in log.splitlines()
+                if line.startswith('commit ')]
+
+    @instrumented
     def commits_to_repo(self,
                         after: Optional[git.Commit] = None,
                         before: Optional[git.Commit] = None,
@@ -222,21 +690,73 @@ class Project(object):
             commits that have occurred up to and including a given commit.
         """
         if not before:
-            before = self.repo.head.reference.commit
+            before = self._head()
 
-        rev_range = '{}..{}'.format(after, before) if after else before.hexsha
+        rev_range = Project._rev_range(after, before)
 
         try:
             commits = self.__commits_to_repo_dict[rev_range]
         except KeyError:
-            log = self.repo.git.log(rev_range)
-            commit_hashes = [l.strip() for l in log.splitlines()
-                             if l.startswith('commit ')]
-            commits = [self.repo.commit(l[7:]) for l in commit_hashes]
+            graph = self.commit_graph
+            after_sha = after.hexsha if after else None
+            if before.hexsha in graph and (not after or after_sha in graph):
+                shas = graph.between(after_sha, before.hexsha)
+            else:
+                shas = self._load('commits_to_repo', rev_range)
+                if shas is None:
+                    shas = self._log_hashes(rev_range)
+                    self._store('commits_to_repo', rev_range, shas)
+            commits = [self._commit(sha) for sha in shas]
             self.__commits_to_repo_dict[rev_range] = commits
 
         return commits
 
+    @instrumented
+    def count_commits_to_repo(self,
+                              after: Optional[git.Commit] = None,
+                              before: Optional[git.Commit] = None,
+                              ) -> int:
+        """
+        Returns the number of commits that have been made to the repo. This
+        is equivalent to, but much cheaper than, computing the length of
+        the list returned by `commits_to_repo` for the same parameters, since
+        the count is computed using the commit graph index, without
+        constructing any Commit objects.
+        """
+        if not before:
+            before = self._head()
+
+        graph = self.commit_graph
+        after_sha = after.hexsha if after else None
+        if before.hexsha in graph and (not after or after_sha in graph):
+            return graph.count(after_sha, before.hexsha)
+        return len(self.commits_to_repo(after, before))
+
+    def _indexed_commits_to_file(self,
+                                 filename: str,
+                                 after: Optional[git.Commit],
+                                 before: git.Commit
+                                 ) -> Optional[List[str]]:
+        """
+        Finds the commits made to a given file using the file history index,
+        if it is enabled and covers the given file and commits.
+
+        Returns:
+            The full hashes of the commits, or None if the index cannot be
+            used.
+        """
+        if not self.__index_files:
+            return None
+        index = self.file_index
+        graph = index.graph
+        if filename not in index or before.hexsha not in graph or \
+           (after and after.hexsha not in graph):
+            return None
+        return index.commits(filename,
+                             after.hexsha if after else None,
+                             before.hexsha)
+
+    @instrumented
     def commits_to_file(self,
                         filename: str,
                         lineno: Optional[int] = None,
@@ -248,8 +768,9 @@ class Project(object):
         specified by its name.
 
         Note: after == before returns [], matching the behavior of git log
-        Note 2: This function is memoized when called without a line number,
-          but not when a line number is provided. This is a possible slowdown.
+        Note 2: When a line number is provided, the result is computed from
+          the histories of every line in the file, which are obtained from a
+          single walk over the history of the file. See `commits_to_lines`.
 
         Params:
           after: An optional parameter used to restrict the search to all
@@ -261,49 +782,261 @@ class Project(object):
 
         # construct the range of revisions that should be searched
         if not before:
-            before = self.repo.head.reference.commit
+            before = self._head()
 
-        rev_range = '{}..{}'.format(after, before) if after else before.hexsha
+        rev_range = Project._rev_range(after, before)
 
         # construct the range of lines that should be searched
         if lineno is None:
+            key = (rev_range, filename)
             try:
-                commits = self.__commits_to_file_dict[(rev_range, filename)]
+                commits = self.__commits_to_file_dict[key]
             except KeyError:
-                log = self.repo.git.log(rev_range, '--follow', '--', filename)
-                # read the commit hashes from the log
-                commit_hashes = [l.strip() for l in log.splitlines()
-                                 if l.startswith('commit ')]
-                commits = [self.repo.commit(l[7:]) for l in commit_hashes]
-                self.__commits_to_file_dict[(rev_range, filename)] = commits
+                shas = self._indexed_commits_to_file(filename, after,
+                                                     before)
+                if shas is None:
+                    disk_key = '{}:{}'.format(rev_range, filename)
+                    shas = self._load('commits_to_file', disk_key)
+                if shas is None:
+                    shas = self._log_hashes(rev_range, '--follow',
+                                            '--', filename)
+                    self._store('commits_to_file', disk_key, shas)
+                commits = [self._commit(sha) for sha in shas]
+                self.__commits_to_file_dict[key] = commits
 
         else:
-            line_range = '{},{}:{}'.format(lineno, lineno, filename)
-            log = self.repo.git.log(rev_range, L=line_range)
-            commit_hashes = [l.strip() for l in log.splitlines()
-                             if l.startswith('commit ')]
-            commits = [self.repo.commit(l[7:]) for l in commit_hashes]
+            histories = self.commits_to_lines(filename, after, before)
+            if lineno > len(histories):
+                msg = "file {} has only {} lines"
+                raise ValueError(msg.format(filename, len(histories)))
+            commits = histories[lineno - 1]
         return commits
 
+    @instrumented
+    def commits_to_lines(self,
+                         filename: str,
+                         after: Optional[git.Commit] = None,
+                         before: Optional[git.Commit] = None
+                         ) -> List[List[git.Commit]]:
+        """
+        Returns, for each line in a given file, the list of commits that have
+        touched that line, according to the semantics of `git log -L`. The
+        histories of all lines are computed using a single walk over the
+        history of the file and are memoized.
+
+        Params:
+          after: An optional parameter used to restrict the search to all
+            commits that have occurred since a given commit, exclusive.
+          before: An optional parameter used to restrict the search to all
+            commits that have occurred up to and including a given commit.
+
+        Returns:
+            A list, indexed by zero-indexed line number within the `before`
+            version of the file, containing the commits that touched each
+            line, ordered from most to least recent.
+
+        Raises:
+            ValueError: if the file does not exist in the `before` version.
+        """
+        if not before:
+            before = self._head()
+
+        rev_range = Project._rev_range(after, before)
+        commits = self._stored_commits_to_lines(filename, rev_range)
+        if commits is None:
+            histories = Project._line_histories(self.repo, self.blobs,
+                                                filename, rev_range, before)
+            commits = self._remember_commits_to_lines(filename, rev_range,
+                                                      histories)
+        return commits
+
+    def _stored_commits_to_lines(self,
+                                 filename: str,
+                                 rev_range: str
+                                 ) -> Optional[List[List[git.Commit]]]:
+        """
+        Returns the previously computed result of commits_to_lines for a
+        given file and range of revisions, if there is one, without walking
+        the history of the file.
+        """
+        key = (rev_range, filename)
+        try:
+            return self.__commits_to_lines_dict[key]
+        except KeyError:
+            pass
+
+        disk_key = '{}:{}'.format(rev_range, filename)
+        stored = self._load('commits_to_lines', disk_key)
+        if stored is None:
+            return None
+        commits = [[self._commit(sha) for sha in shas] for shas in stored]
+        self.__commits_to_lines_dict[key] = commits
+        return commits
+
+    @staticmethod
+    def _line_histories(repo: git.Repo,
+                        blobs: BlobReader,
+                        filename: str,
+                        rev_range: str,
+                        before: git.Commit
+                        ) -> List[List[str]]:
+        """
+        Walks the history of a file, using a given repository handle and
+        blob reader, to find the full hashes of the commits that touched
+        each of its lines. See commits_to_lines.
+
+        Raises:
+            ValueError: if the file does not exist in the `before` version.
+        """
+        history = LineHistory(repo, blobs)
+        num_lines = history.num_lines(before.hexsha, filename)
+        if num_lines is None:
+            msg = "file {} does not exist in commit {}"
+            raise ValueError(msg.format(filename, before.hexsha))
+        ranges = [[(i, i + 1)] for i in range(num_lines)]
+        return history.walk(filename, ranges, rev_range)
+
+    def _remember_commits_to_lines(self,
+                                   filename: str,
+                                   rev_range: str,
+                                   histories: List[List[str]]
+                                   ) -> List[List[git.Commit]]:
+        """
+        Memoizes the histories of the lines of a file, given by the full
+        hashes of their commits, writes them to the on-disk cache, if one is
+        in use, and returns them as lists of commits.
+        """
+        disk_key = '{}:{}'.format(rev_range, filename)
+        self._store('commits_to_lines', disk_key, histories)
+        commits = [[self._commit(sha) for sha in shas] for shas in histories]
+        self.__commits_to_lines_dict[(rev_range, filename)] = commits
+        return commits
+
+    def _function_lines(self,
+                        filename: str,
+                        version: git.Commit
+                        ) -> List[str]:
+        """
+        Returns the lines of a given version of a file, without their line
+        endings, as they are seen by git's funcname patterns.
+
+        Raises:
+            ValueError: if the file does not exist in the given version.
+        """
+        lines = self.blobs.lines(version.hexsha, filename)
+        if lines is None:
+            msg = "file {} does not exist in commit {}"
+            raise ValueError(msg.format(filename, version.hexsha))
+        return [line.decode('utf-8', 'surrogateescape').rstrip('\r')
+                for line in lines]
+
+    @instrumented
+    def function_histories(self,
+                           filename: str,
+                           after: Optional[git.Commit] = None,
+                           before: Optional[git.Commit] = None,
+                           funcname: Optional[str] = None
+                           ) -> List[Tuple[Function, List[git.Commit]]]:
+        """
+        Returns the history of every function within a given file, according
+        to the semantics of `git log -L :<funcname>:<file>`. The functions
+        are found by a single pass over the `before` version of the file
+        (see blameandshame.project.functions), and their histories are
+        computed by a single walk over the history of the file. The result
+        is memoized for each range of revisions and file.
+
+        Params:
+          after: An optional parameter used to restrict the search to all
+            commits that have occurred since a given commit, exclusive.
+          before: An optional parameter used to restrict the search to all
+            commits that have occurred up to and including a given commit.
+          funcname: The funcname pattern used to find the start of each
+            function, in the format used by git's `diff.*.xfuncname` option.
+            If None, git's default rule is used. See `funcname_pattern` for
+            the builtin patterns of several languages.
+
+        Returns:
+            A list of (function, commits) pairs, ordered by the location of
+            each function within the file, where commits gives the commits
+            that touched the function, ordered from most to least recent.
+
+        Raises:
+            ValueError: if the file does not exist in the `before` version.
+        """
+        if not before:
+            before = self._head()
+
+        rev_range = Project._rev_range(after, before)
+        key = (rev_range, filename, funcname)
+        try:
+            return self.__function_histories_dict[key]
+        except KeyError:
+            pass
+
+        # funcname patterns may contain any character, including ':'
+        disk_key = json.dumps([rev_range, funcname, filename])
+        stored = self._load('function_histories', disk_key)
+        if stored is not None:
+            functions = [Function(*f) for f in stored[0]]
+            histories = stored[1]
+        else:
+            lines = self._function_lines(filename, before)
+            functions = function_spans(lines, funcname)
+            history = LineHistory(self.repo, self.blobs)
+            ranges = [[(f.first - 1, f.last)] for f in functions]
+            histories = history.walk(filename, ranges, rev_range)
+            self._store('function_histories', disk_key,
+                        ([list(f) for f in functions], histories))
+
+        result = [(f, [self._commit(sha) for sha in shas])
+                  for (f, shas) in zip(functions, histories)]
+        self.__function_histories_dict[key] = result
+        return result
+
+    @instrumented
     def commits_to_function(self,
                             filename: str,
                             regex: str,
                             after: Optional[git.Commit] = None,
                             before: Optional[git.Commit] = None,
+                            funcname: Optional[str] = None
                             ) -> List[git.Commit]:
         """
-        Returns a list of all commits that have been made to the repo.
+        Returns the list of all commits that have touched a given function,
+        according to the semantics of `git log -L :<regex>:<file>`. Since
+        the result is obtained from the histories of every function within
+        the file (see `function_histories`), which are computed at once,
+        querying many functions within the same file requires a single walk
+        over its history.
 
         Params:
           filename: The file containing the function.
           regex: A string corresponding to the regex matching the function.
+            The first function whose starting line matches the regex is used.
           after: An optional parameter used to restrict the search to all
-            commits that have occurred since a given commit, inclusive.
+            commits that have occurred since a given commit, exclusive.
           before: An optional parameter used to restrict the search to all
             commits that have occurred up to and including a given commit.
-        """
-        raise NotImplementedError
+          funcname: The funcname pattern used to find the start of each
+            function. See `function_histories`.
 
+        Raises:
+            ValueError: if the file does not exist in the `before` version,
+              or if no function within the file matches the regex.
+        """
+        if not before:
+            before = self._head()
+
+        lines = self._function_lines(filename, before)
+        function = find_function(lines, regex, funcname)
+        if function is None:
+            msg = "no function matching {} in file {}"
+            raise ValueError(msg.format(regex, filename))
+        histories = self.function_histories(filename, after, before, funcname)
+        return next(commits for (f, commits) in histories
+                    if f.first == function.first)
+
+    @instrumented
     def commits_to_line(self,
                         filename: str,
                         lineno: int,
@@ -323,6 +1056,7 @@ class Project(object):
                                     after=after,
                                     before=before)
 
+    @instrumented
     def authors_of_file(self,
                         filename: str,
                         after: Optional[git.Commit] = None,
@@ -342,6 +1076,232 @@ class Project(object):
         commits = self.commits_to_file(filename, after=after, before=before)
         return frozenset(c.author for c in commits)
 
+    @instrumented
+    def ownership(self,
+                  version: Optional[git.Commit] = None,
+                  blame: bool = True
+                  ) -> OwnershipMatrix:
+        """
+        Returns the ownership of every file within a given version of the
+        project by each of its authors, computed from a single walk over the
+        history of the project (see OwnershipMatrix). Unlike repeated calls
+        to `authors_of_file`, the result can be extended to later versions
+        of the project using `OwnershipMatrix.extend`.
+
+        Params:
+          version: The version of the project whose files should be
+            described. Defaults to the HEAD of the repository.
+          blame: If False, the lines owned by each author are not computed.
+        """
+        return OwnershipMatrix.build(self, version, blame=blame)
+
+    def _stored_last_commits(self,
+                             filename: str,
+                             version: git.Commit
+                             ) -> Optional[List[git.Commit]]:
+        """
+        Returns the previously computed result of last_commits_for_file for
+        a given version of a file, if there is one, without running blame.
+        """
+        key = (version.hexsha, filename)
+        try:
+            return self.__last_commits_dict[key]
+        except KeyError:
+            pass
+
+        # the on-disk cache stores each distinct commit once, together with
+        # the index of the commit for each line.
+        disk_key = '{}:{}'.format(version.hexsha, filename)
+        stored = self._load('last_commits_for_file', disk_key)
+        if stored is None:
+            return None
+        shas, index = stored
+        distinct = [self._commit(sha) for sha in shas]
+        commits = [distinct[i] for i in index]
+        self.__last_commits_dict[key] = commits
+        return commits
+
+    def _blame_args(self,
+                    filename: str,
+                    version: git.Commit
+                    ) -> List[str]:
+        """
+        Returns the arguments to `git` used to blame a version of a file.
+        """
+        return ['blame', '--incremental', version.hexsha, '--', filename]
+
+    def _file_exists(self, filename: str, version: git.Commit) -> bool:
+        """
+        Determines whether a given file exists within a given version of the
+        project, by looking it up in the tree of that version. Unlike blame,
+        this never needs to read (or fetch) the contents of the file.
+        """
+        try:
+            return (version.tree / filename).type == 'blob'
+        except KeyError:
+            return False
+
+    def _blame(self,
+               filename: str,
+               version: git.Commit,
+               output: bytes
+               ) -> List[git.Commit]:
+        """
+        Constructs the last commit to touch each line of a file from the
+        output of `git blame --incremental`.
+        """
+        shas, info = parse_incremental(output.splitlines())
+        return build_commits(self.repo, shas, info)
+
+    def _derivation_args(self,
+                         filename: str,
+                         version: git.Commit
+                         ) -> Optional[Tuple[List[git.Commit], List[str]]]:
+        """
+        Determines whether the blame for a version of a file can be derived
+        from the blame for its parent (see _derive_last_commits).
+
+        Returns:
+            A tuple containing the last commit for each line of the parent
+            version and the arguments to `git` used to compute the diff
+            between the two versions, or None if the blame cannot be derived.
+        """
+        if len(version.parents) != 1:
+            return None
+        parent = version.parents[0]
+        previous = self._stored_last_commits(filename, parent)
+        if not previous:
+            return None
+
+        # use the same diff algorithm as blame, which includes the indent
+        # heuristic unless it has been disabled by the user's configuration
+        args = ['diff',
+                '{}:{}'.format(parent.hexsha, filename),
+                '{}:{}'.format(version.hexsha, filename),
+                '-U0', '--text', '--no-color', '--no-ext-diff',
+                '--diff-algorithm=myers']
+        return (previous, args)
+
+    def _apply_derivation(self,
+                          filename: str,
+                          version: git.Commit,
+                          previous: List[git.Commit],
+                          patch: bytes
+                          ) -> Optional[List[git.Commit]]:
+        """
+        Applies the diff between the parent and a given version of a file to
+        the last commit for each line of the parent version.
+        """
+        old_ranges, new_ranges = parse_hunks(patch.split(b'\n'))
+
+        commits: List[git.Commit] = []
+        position = 0
+        for ((old_start, old_end), (new_start, new_end)) in \
+                zip(old_ranges, new_ranges):
+            commits.extend(previous[position:old_start])
+            commits.extend([version] * (new_end - new_start))
+            position = old_end
+        commits.extend(previous[position:])
+
+        if len(commits) != self.blobs.num_lines(version.hexsha, filename):
+            return None
+        return commits
+
+    def _derive_last_commits(self,
+                             filename: str,
+                             version: git.Commit
+                             ) -> Optional[List[git.Commit]]:
+        """
+        Attempts to derive the last commit to touch each line of a file from
+        the blame for the same file in the parent of the given version. The
+        lines that are left untouched by the diff between the parent and the
+        version keep their previous commits, and the lines that were added
+        are attributed to the version itself.
+
+        Returns:
+            The last commit for each line, or None if the result cannot be
+            derived safely (e.g., the version is a merge, the file did not
+            exist under the same name in its parent, or the parent has not
+            yet been blamed), in which case a full blame is required.
+        """
+        derivation = self._derivation_args(filename, version)
+        if derivation is None:
+            return None
+        previous, (_, *args) = derivation
+        try:
+            patch = self.backend.diff(*args)
+        except git.exc.GitCommandError:
+            return None
+        return self._apply_derivation(filename, version, previous, patch)
+
+    def _remember_last_commits(self,
+                               filename: str,
+                               version: git.Commit,
+                               commits: List[git.Commit]
+                               ) -> None:
+        """
+        Memoizes the last commit to touch each line of a version of a file,
+        and writes it to the on-disk cache, if one is in use.
+        """
+        shas = list({c.hexsha: None for c in commits})
+        position = {sha: i for (i, sha) in enumerate(shas)}
+        disk_key = '{}:{}'.format(version.hexsha, filename)
+        self._store('last_commits_for_file', disk_key,
+                    [shas, [position[c.hexsha] for c in commits]])
+        self.__last_commits_dict[(version.hexsha, filename)] = commits
+
+    @instrumented
+    def last_commits_for_file(self,
+                              filename: str,
+                              before: git.Commit
+                              ) -> List[git.Commit]:
+        """
+        Returns a list of Commit objects, indexed by zero-indexed line number,
+        corresponding to the last commit that touched each line in a given
+        version of a file. The result is computed from a single blame and is
+        memoized for each (version, file) pair, allowing individual lines to
+        be looked up in constant time.
+
+        If incremental blame is enabled for this project, and the parent of
+        the given version has already been blamed, the result is instead
+        derived from the blame for the parent and the diff between the two
+        versions. Visiting the versions of a file from oldest to newest
+        therefore requires a single blame, followed by one diff per version.
+
+        Returns:
+            A list containing the last commit to touch each line of the file,
+            or an empty list if the file does not exist at the given version.
+
+        Raises:
+            git.exc.GitCommandError: if the file exists, but could not be
+              blamed.
+        """
+        warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+        commits = self._stored_last_commits(filename, before)
+        if commits is not None:
+            return commits
+
+        if self.__incremental_blame:
+            commits = self._derive_last_commits(filename, before)
+
+        if commits is None:
+            _, *args = self._blame_args(filename, before)
+            try:
+                output = self.backend.blame(*args)
+                commits = self._blame(filename, before, output)
+            except git.exc.GitCommandError:
+                # only a file that does not exist may be remembered as
+                # empty: other failures (e.g., a blob that could not be
+                # fetched) may be transient
+                if self._file_exists(filename, before):
+                    raise
+                commits = []
+
+        self._remember_last_commits(filename, before, commits)
+        return commits
+
+    @instrumented
     def last_commit_to_line(self,
                             filename: str,
                             lineno: int,
@@ -350,24 +1310,38 @@ class Project(object):
         """
         Returns a Commit object corresponding to the last commit where lineno
         was touched before (and including) the Commit object passed in before.
-        """
-        warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-        try:
-            blame_info = self.__blame_info_dict[(before.hexsha, filename)]
-        except KeyError:
-            try:
-                blame_info = list(self.repo.blame_incremental(before,
-                                                              filename))
-            except git.exc.GitCommandError:
-                blame_info = None
-            self.__blame_info_dict[(before.hexsha, filename)] = blame_info
+        Returns:
+            The commit, or None if the file does not exist in the `before`
+            version.
 
-        if blame_info:
-            return next(b.commit for b in blame_info if lineno in b.linenos)
-        else:
+        Raises:
+            ValueError: if the file exists, but has no line with the given
+              (one-indexed) line number.
+        """
+        commits = self.last_commits_for_file(filename, before)
+        if not commits:
             return None
+        return Project._line_of(commits, filename, lineno)
+
+    @staticmethod
+    def _line_of(commits: List[git.Commit],
+                 filename: str,
+                 lineno: int
+                 ) -> git.Commit:
+        """
+        Returns the entry for a given (one-indexed) line number within the
+        last commit to touch each line of a file.
 
+        Raises:
+            ValueError: if the file has no such line.
+        """
+        if not 1 <= lineno <= len(commits):
+            msg = "file {} has no line {} (it has {} lines)"
+            raise ValueError(msg.format(filename, lineno, len(commits)))
+        return commits[lineno - 1]
+
+    @instrumented
     def authors_of_line(self,
                         filename: str,
                         lineno: int,
@@ -400,6 +1374,7 @@ class Project(object):
         time = abs(time_x - time_y)
         return time
 
+    @instrumented
     def age_of_line_td(self,
                        commit: git.Commit,
                        filename: str,
@@ -434,9 +1409,14 @@ class Project(object):
         Returns:
             A count of the number of the lines in the file.
         """
-        f = self.repo.git.show('{}:{}'.format(version.hexsha, filename))
-        return len(f.splitlines())
-
+        rev = version.hexsha if version is not None else 'HEAD'
+        num_lines = self.blobs.num_lines(rev, filename)
+        if num_lines is None:
+            msg = "file {} does not exist at {}".format(filename, rev)
+            raise ValueError(msg)
+        return num_lines
+
+    @instrumented
     def age_commits_project(self,
                             before: Optional[git.Commit] = None,
                             after: Optional[git.Commit] = None
@@ -444,8 +1424,9 @@ class Project(object):
         """
         Returns the age of the project in commits.
         """
-        return len(self.commits_to_repo(after, before))
+        return self.count_commits_to_repo(after, before)
 
+    @instrumented
     def age_commits_file(self,
                          filename: str,
                          relative_to: Commits,
@@ -465,9 +1446,10 @@ class Project(object):
             commits_to_file = self.commits_to_file(filename,
                                                    after=after, before=before)
             earliest = commits_to_file[-1]
-            return len(self.commits_to_repo(earliest, before))
+            return self.count_commits_to_repo(earliest, before)
         raise ValueError
 
+    @instrumented
     def age_commits_line(self,
                          filename: str,
                          lineno: int,
@@ -499,6 +1481,6 @@ class Project(object):
                                                    after=after,
                                                    before=before)
             earliest = commits_to_line[-1]
-            return len(self.commits_to_repo(earliest, before))
+            return self.count_commits_to_repo(earliest, before)
 
         raise ValueError
@@ -0,0 +1,71 @@
+"""
+Provides a parser for the output of `git blame --incremental`, shared by the
+synchronous and asynchronous project APIs.
+"""
+from typing import Dict, Iterable, List, Tuple
+import git
+
+# The headers describing each commit, indexed by its full hash.
+CommitInfo = Dict[str, Dict[bytes, bytes]]
+
+
+def parse_incremental(lines: Iterable[bytes]) -> Tuple[List[str], CommitInfo]:
+    """
+    Parses the output of `git blame --incremental`.
+
+    Returns:
+        A tuple of the form (shas, info), where shas gives the full hash of
+        the last commit to touch each line of the file, indexed by
+        zero-indexed line number, and info gives the headers reported for
+        each of those commits (e.g., b'author', b'author-time').
+    """
+    shas: List[str] = []
+    info: CommitInfo = {}
+    it = iter(lines)
+    for line in it:
+        line = line.rstrip(b'\n')
+        if not line:
+            continue
+        sha, _, final, num = line.split(b' ')[:4]
+        sha = sha.decode()
+        start = int(final) - 1
+        end = start + int(num)
+        if len(shas) < end:
+            shas.extend([''] * (end - len(shas)))
+        shas[start:end] = [sha] * (end - start)
+
+        headers = info.setdefault(sha, {})
+        for header in it:
+            key, _, value = header.rstrip(b'\n').partition(b' ')
+            if key == b'filename':
+                break
+            headers[key] = value
+    return (shas, info)
+
+
+def _actor(headers: Dict[bytes, bytes], role: bytes) -> git.Actor:
+    email = headers.get(role + b'-mail', b'').lstrip(b'<').rstrip(b'>')
+    return git.Actor(headers.get(role, b'').decode('utf-8', 'replace'),
+                     email.decode('utf-8', 'replace'))
+
+
+def build_commits(repo: git.Repo,
+                  shas: List[str],
+                  info: CommitInfo
+                  ) -> List[git.Commit]:
+    """
+    Constructs the list of commits for each line of a blamed file. As in
+    GitPython, each distinct commit is constructed once, using the author
+    and committer information reported by blame, with its remaining
+    attributes loaded on demand.
+    """
+    commits: Dict[str, git.Commit] = {}
+    for (sha, headers) in info.items():
+        commits[sha] = git.Commit(
+            repo,
+            bytes.fromhex(sha),
+            author=_actor(headers, b'author'),
+            authored_date=int(headers.get(b'author-time', b'0')),
+            committer=_actor(headers, b'committer'),
+            committed_date=int(headers.get(b'committer-time', b'0')))
+    return [commits[sha] for sha in shas]
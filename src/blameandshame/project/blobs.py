@@ -0,0 +1,294 @@
+"""
+Provides a reader that fetches the contents of files from the object
+database of a repository through a single, long-lived `git cat-file --batch`
+process, rather than launching a new git process for every file.
+"""
+from typing import Iterable, List, Optional, Tuple
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+import git
+import numpy as np
+from blameandshame.cache import MemoryCache
+from blameandshame.stats import InstrumentedGit, Recorder
+
+# Matches the full hash of an object, which always names the same contents.
+FULL_SHA = re.compile(r'^[0-9a-f]{40}$')
+
+
+def line_offsets(data: bytes) -> np.ndarray:
+    """
+    Computes the offset of the start of each line within the contents of a
+    file, followed by the length of the contents. The lines of the file are
+    therefore given by `data[offsets[i]:offsets[i + 1]]`, and the number of
+    lines in the file, as counted by git, is one less than the length of the
+    array.
+    """
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+    starts = newlines + 1
+    if data and data[-1:] != b'\n':
+        starts = np.append(starts, len(data))
+    return np.concatenate(([0], starts)).astype(np.int64)
+
+
+class BlobReader(object):
+    """
+    Reads the contents of files at given versions of a project using a
+    persistent `git cat-file --batch` process. Requests for many files may
+    be pipelined through the process at once, and the offsets of the lines
+    within each blob may optionally be retained, so that the number of lines
+    in a file, or a given range of its lines, can be found without splitting
+    its contents again.
+
+    The process is started on first use, and restarted if the reader is used
+    by a forked process. If the repository is instrumented (see
+    InstrumentedGit), each batch of requests is reported to its recorder as
+    a single call to `cat-file`, whose duration includes the time taken to
+    start the process, if it was started by that batch.
+    """
+    def __init__(self,
+                 repo: git.Repo,
+                 index_lines: bool = True,
+                 index: Optional[MemoryCache] = None
+                 ) -> None:
+        """
+        Params:
+          index_lines: If True, the line offsets of each blob are retained.
+          index: The cache that should be used to hold the line offsets of
+            each blob, and the blob found at each (revision, path) pair. If
+            unspecified, an unbounded cache is used.
+        """
+        self.__repo = repo
+        self.__index_lines = index_lines
+        self.__proc: Optional[subprocess.Popen] = None
+        self.__pid: Optional[int] = None
+        self.__lock = threading.Lock()
+        self.__index = index if index is not None else MemoryCache()
+
+    @property
+    def repo(self) -> git.Repo:
+        """
+        The repository from which blobs are read.
+        """
+        return self.__repo
+
+    @property
+    def recorder(self) -> Optional[Recorder]:
+        """
+        The recorder to which the requests made by this reader are reported,
+        if its repository is instrumented.
+        """
+        runner = self.__repo.git
+        if isinstance(runner, InstrumentedGit):
+            return runner.recorder
+        return None
+
+    def _process(self) -> subprocess.Popen:
+        if self.__proc is None or self.__pid != os.getpid() \
+           or self.__proc.poll() is not None:
+            self.__proc = subprocess.Popen(
+                [self.__repo.git.GIT_PYTHON_GIT_EXECUTABLE,
+                 'cat-file', '--batch'],
+                cwd=self.__repo.git_dir,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL)
+            self.__pid = os.getpid()
+        return self.__proc
+
+    def close(self) -> None:
+        """
+        Terminates the underlying git process, if it is running. The process
+        is restarted if the reader is used again.
+        """
+        proc = self.__proc
+        self.__proc = None
+        if proc is not None and self.__pid == os.getpid():
+            proc.stdin.close()
+            proc.wait()
+            proc.stdout.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _object_name(rev: str, path: Optional[str]) -> str:
+        return rev if path is None else '{}:{}'.format(rev, path)
+
+    def _read_response(self, proc: subprocess.Popen
+                       ) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        Reads the response to a single request from the git process.
+
+        Returns:
+            A tuple of the form (sha, contents) for the requested blob, or
+            (None, None) if the object does not exist or is not a blob.
+        """
+        header = proc.stdout.readline()
+        if not header:
+            raise ValueError("git cat-file exited unexpectedly")
+        if header.endswith((b' missing\n', b' ambiguous\n')):
+            return (None, None)
+        sha, kind, size = header.split()
+        data = proc.stdout.read(int(size) + 1)[:-1]
+        if kind != b'blob':
+            return (None, None)
+        return (sha.decode(), data)
+
+    def _remember(self,
+                  rev: str,
+                  path: Optional[str],
+                  sha: Optional[str],
+                  data: Optional[bytes]
+                  ) -> None:
+        if path is not None and FULL_SHA.match(rev):
+            self.__index[(rev, path)] = sha
+        if self.__index_lines and sha is not None \
+           and sha not in self.__index:
+            self.__index[sha] = line_offsets(data)
+
+    def read(self, rev: str, path: Optional[str] = None) -> Optional[bytes]:
+        """
+        Returns the contents of a file at a given version of the project.
+
+        Params:
+          rev: The revision at which the file should be read, or, if no path
+            is given, the name of the blob itself.
+          path: The path to the file, relative to the root of the repository.
+
+        Returns:
+            The raw contents of the file, or None if no such file exists.
+        """
+        return self.read_many([(rev, path)])[0]
+
+    def read_many(self,
+                  objects: Iterable[Tuple[str, Optional[str]]]
+                  ) -> List[Optional[bytes]]:
+        """
+        Returns the contents of each of a number of files, given as a list of
+        (revision, path) pairs. All of the requests are written to the git
+        process before any of the responses are read, so the cost of reading
+        many small files is not dominated by round trips.
+        """
+        objects = list(objects)
+        if not objects:
+            return []
+        request = ''.join('{}\n'.format(BlobReader._object_name(rev, path))
+                          for (rev, path) in objects).encode()
+
+        recorder = self.recorder
+        start = time.perf_counter()
+        with self.__lock:
+            proc = self._process()
+
+            # small requests fit within the pipe's buffer; larger ones are
+            # written from a separate thread so that git never blocks on a
+            # full output pipe while we are still writing requests
+            def write() -> None:
+                try:
+                    proc.stdin.write(request)
+                    proc.stdin.flush()
+                except (BrokenPipeError, ValueError):
+                    pass
+
+            writer: Optional[threading.Thread] = None
+            if len(request) <= select.PIPE_BUF:
+                write()
+            else:
+                writer = threading.Thread(target=write, daemon=True)
+                writer.start()
+            try:
+                results: List[Optional[bytes]] = []
+                for (rev, path) in objects:
+                    sha, data = self._read_response(proc)
+                    self._remember(rev, path, sha, data)
+                    results.append(data)
+            except Exception:
+                proc.kill()
+                self.__proc = None
+                raise
+            finally:
+                if writer is not None:
+                    writer.join()
+                if recorder is not None:
+                    recorder.record_git('cat-file',
+                                        time.perf_counter() - start)
+        return results
+
+    def _offsets(self,
+                 rev: str,
+                 path: Optional[str],
+                 data: Optional[bytes] = None
+                 ) -> Optional[np.ndarray]:
+        """
+        Returns the offsets of the lines of a file from the index, if they
+        are known, or else computes them from its contents.
+        """
+        sha = rev if path is None else self.__index.get((rev, path))
+        if sha is not None:
+            try:
+                return self.__index[sha]
+            except KeyError:
+                pass
+        if data is None:
+            data = self.read(rev, path)
+            if data is None:
+                return None
+            return self._offsets(rev, path, data)
+        return line_offsets(data)
+
+    def line_offsets(self,
+                     rev: str,
+                     path: Optional[str] = None
+                     ) -> Optional[np.ndarray]:
+        """
+        Returns the offsets of the lines of a file at a given version (see
+        line_offsets), or None if no such file exists. If line indexing is
+        enabled, the offsets for each blob are computed only once.
+        """
+        return self._offsets(rev, path)
+
+    def num_lines(self, rev: str, path: Optional[str] = None) -> Optional[int]:
+        """
+        Returns the number of lines in a file at a given version, as counted
+        by git, or None if no such file exists.
+        """
+        offsets = self.line_offsets(rev, path)
+        return len(offsets) - 1 if offsets is not None else None
+
+    def lines(self,
+              rev: str,
+              path: Optional[str] = None,
+              start: int = 1,
+              stop: Optional[int] = None
+              ) -> Optional[List[bytes]]:
+        """
+        Returns the lines of a file at a given version, without their line
+        endings, or None if no such file exists.
+
+        Params:
+          start: The number of the first line that should be returned.
+          stop: The number of the line after the last line that should be
+            returned. If unspecified, all lines up to the end of the file
+            are returned.
+        """
+        data = self.read(rev, path)
+        if data is None:
+            return None
+        offsets = self._offsets(rev, path, data)
+        num_lines = len(offsets) - 1
+        first = min(max(start, 1), num_lines + 1) - 1
+        last = num_lines if stop is None else min(max(stop - 1, first),
+                                                  num_lines)
+        if first >= last:
+            return []
+        chunk = data[offsets[first]:offsets[last]]
+        if chunk.endswith(b'\n'):
+            chunk = chunk[:-1]
+        return chunk.split(b'\n')
@@ -0,0 +1,114 @@
+"""
+Provides the strategies used to obtain local copies of remote repositories,
+together with the per-repository locks that allow parallel workers to share
+those copies safely.
+
+Full clones (with a working tree) are stored under Project.REPOS_DIR, as
+before. Bare mirrors, and blobless mirrors that download the contents of
+files on demand, are stored in a single shared directory that is named by
+the remote URL, so that every working directory (and every worker) on a
+machine uses the same copy of each repository.
+"""
+from enum import Enum
+from typing import Iterator, Optional
+import contextlib
+import fcntl
+import os
+import shutil
+import urllib.parse
+import git
+
+# The environment variable used to override the shared mirror directory.
+MIRROR_DIR_ENV = 'BLAMEANDSHAME_MIRROR_DIR'
+
+
+class CloneStrategy(Enum):
+    """
+    Enum of the ways in which a remote repository may be copied to disk.
+    """
+    # a regular clone, including a checked-out working tree.
+    FULL = 'full'
+    # a bare mirror of every reference in the remote, without a working tree.
+    MIRROR = 'mirror'
+    # a bare mirror that omits the contents of every file, which are
+    # instead fetched from the remote when they are first needed.
+    BLOBLESS = 'blobless'
+
+
+def default_mirror_dir() -> str:
+    """
+    Returns the directory used to store shared mirrors, given by the
+    environment variable named by MIRROR_DIR_ENV, if set, and otherwise by
+    `blameandshame/mirrors` within the user's cache directory.
+    """
+    path = os.environ.get(MIRROR_DIR_ENV)
+    if path:
+        return path
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'blameandshame', 'mirrors')
+
+
+def mirror_path(url: str, mirror_dir: Optional[str] = None) -> str:
+    """
+    Computes the location of the shared mirror of a given repository. Mirrors
+    are named by the host and path of their URL (e.g.,
+    `github.com/google/protobuf.git`), so that repositories with the same
+    name but different owners do not collide.
+    """
+    if mirror_dir is None:
+        mirror_dir = default_mirror_dir()
+    parsed = urllib.parse.urlparse(url)
+    host = parsed.netloc.rpartition('@')[2].replace(':', '_') or 'local'
+    path = parsed.path.strip('/')
+    if path.endswith('.git'):
+        path = path[:-4]
+    return os.path.join(mirror_dir, host, '{}.git'.format(path))
+
+
+@contextlib.contextmanager
+def repo_lock(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on the repository at a given location (which
+    need not exist yet) for the duration of a block. The lock is an advisory
+    `flock` on a sibling file named `<path>.lock`, and so is shared by every
+    process on the machine.
+    """
+    lock_path = '{}.lock'.format(path.rstrip(os.sep))
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def clone(url: str, path: str, strategy: CloneStrategy) -> bool:
+    """
+    Ensures that a copy of a given repository exists at a given location,
+    cloning it using a given strategy if necessary. The clone is made in a
+    temporary location and moved into place once it is complete, while
+    holding the lock for the repository, so that an incomplete clone is
+    never observed.
+
+    Returns:
+        True if the repository was cloned, or False if it already existed.
+    """
+    with repo_lock(path):
+        if os.path.exists(path):
+            return False
+        tmp = '{}.tmp'.format(path.rstrip(os.sep))
+        shutil.rmtree(tmp, ignore_errors=True)
+        options = []
+        if strategy != CloneStrategy.FULL:
+            options.append('--mirror')
+        if strategy == CloneStrategy.BLOBLESS:
+            options.append('--filter=blob:none')
+        try:
+            git.Repo.clone_from(url, tmp, multi_options=options)
+            os.rename(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return True
@@ -0,0 +1,362 @@
+"""
+Provides a streaming parser for the output of `git diff-tree --raw -p -U0`.
+
+The parser reads the output of git incrementally from its pipe and yields
+one FileDiff for each file that differs between two versions of a project.
+Only the status, paths and hunk ranges of each file are retained: the
+contents of added and removed lines are skipped without being decoded, so
+the memory required to parse a diff does not depend on its size.
+"""
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, \
+    Optional, Set
+import re
+import sys
+import git
+import numpy as np
+from blameandshame.base import Change, LineSet
+
+HUNK_HEADER = re.compile(rb'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# The escape sequences that git uses within quoted paths.
+ESCAPES = {
+    ord('a'): 7, ord('b'): 8, ord('t'): 9, ord('n'): 10, ord('v'): 11,
+    ord('f'): 12, ord('r'): 13, ord('"'): 34, ord('\\'): 92
+}
+
+
+class Hunk(NamedTuple):
+    """
+    Describes the lines that were removed from, and added to, a file by a
+    single hunk. Line numbers are one-indexed; as in a unified diff header,
+    if a hunk does not remove (or add) any lines, its start is given by the
+    number of the line that precedes the change.
+    """
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+
+    @property
+    def old_lines(self) -> range:
+        """
+        The numbers of the lines that were removed from the old file.
+        """
+        return range(self.old_start, self.old_start + self.old_count)
+
+    @property
+    def new_lines(self) -> range:
+        """
+        The numbers of the lines that were added to the new file.
+        """
+        return range(self.new_start, self.new_start + self.new_count)
+
+
+def parse_hunk_header(line: bytes) -> Optional[Hunk]:
+    """
+    Parses a hunk header of the form `@@ -start,count +start,count @@`.
+
+    Returns:
+        The hunk described by the header, or None if the given line is not
+        a hunk header.
+    """
+    m = HUNK_HEADER.match(line)
+    if not m:
+        return None
+    old_count = int(m.group(2)) if m.group(2) is not None else 1
+    new_count = int(m.group(4)) if m.group(4) is not None else 1
+    return Hunk(int(m.group(1)), old_count, int(m.group(3)), new_count)
+
+
+def unquote_path(path: bytes) -> str:
+    """
+    Decodes a path reported by git, removing the C-style quoting that git
+    applies to paths containing unusual characters. Bytes that are not valid
+    UTF-8 are preserved as surrogate escapes.
+    """
+    if path[:1] == b'"' and path[-1:] == b'"':
+        out = bytearray()
+        i = 1
+        while i < len(path) - 1:
+            c = path[i]
+            if c == ord('\\'):
+                i += 1
+                c = path[i]
+                if ord('0') <= c <= ord('7'):
+                    out.append(int(path[i:i + 3], 8))
+                    i += 3
+                    continue
+                out.append(ESCAPES.get(c, c))
+            else:
+                out.append(c)
+            i += 1
+        path = bytes(out)
+    return path.decode('utf-8', 'surrogateescape')
+
+
+class FileDiff(object):
+    """
+    Describes the changes made to a single file between two versions of a
+    project.
+    """
+    def __init__(self,
+                 status: str,
+                 a_path: Optional[str],
+                 b_path: Optional[str],
+                 a_blob: Optional[str],
+                 b_blob: Optional[str]
+                 ) -> None:
+        self.__status = status
+        self.__a_path = a_path
+        self.__b_path = b_path
+        self.__a_blob = a_blob
+        self.__b_blob = b_blob
+        self.binary = False
+        self.hunks: List[Hunk] = []
+
+    @property
+    def status(self) -> str:
+        """
+        The single-letter status of the change (e.g., 'A', 'D', 'M', 'R'),
+        as reported by `git diff --raw`.
+        """
+        return self.__status
+
+    @property
+    def a_path(self) -> Optional[str]:
+        """
+        The name of the file in the old version, or None if it was added.
+        """
+        return self.__a_path
+
+    @property
+    def b_path(self) -> Optional[str]:
+        """
+        The name of the file in the new version, or None if it was deleted.
+        """
+        return self.__b_path
+
+    @property
+    def a_blob(self) -> Optional[str]:
+        """
+        The hash of the old contents of the file, or None if it was added.
+        """
+        return self.__a_blob
+
+    @property
+    def b_blob(self) -> Optional[str]:
+        """
+        The hash of the new contents of the file, or None if it was deleted.
+        """
+        return self.__b_blob
+
+    @property
+    def old_lines(self) -> Iterator[int]:
+        """
+        The numbers of the lines that were removed from the old file.
+        """
+        for hunk in self.hunks:
+            yield from hunk.old_lines
+
+    @property
+    def new_lines(self) -> Iterator[int]:
+        """
+        The numbers of the lines that were added to the new file.
+        """
+        for hunk in self.hunks:
+            yield from hunk.new_lines
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + \
+            sys.getsizeof(self.hunks) + \
+            sum(sys.getsizeof(h) for h in self.hunks) + \
+            sum(sys.getsizeof(x) for x in (self.__a_path, self.__b_path,
+                                           self.__a_blob, self.__b_blob)
+                if x is not None)
+
+    def __repr__(self) -> str:
+        return "FileDiff({}, {}, {})".format(self.__status,
+                                             self.__a_path,
+                                             self.__b_path)
+
+
+def _parse_raw(line: bytes) -> FileDiff:
+    """
+    Parses a single line of `--raw` output, of the form
+    `:<mode> <mode> <blob> <blob> <status>\t<path>[\t<path>]`.
+    """
+    meta, *paths = line.rstrip(b'\n').split(b'\t')
+    _, _, a_blob, b_blob, status = meta.split(b' ')
+    status = status.decode()[:1]
+    a_path = unquote_path(paths[0])
+    b_path = unquote_path(paths[-1])
+    null = b'0' * len(a_blob)
+    return FileDiff(status,
+                    a_path if status != 'A' else None,
+                    b_path if status != 'D' else None,
+                    a_blob.decode() if a_blob != null else None,
+                    b_blob.decode() if b_blob != null else None)
+
+
+# The arguments passed to `git diff-tree` to compute the differences between
+# two versions of a project.
+DIFF_TREE_ARGS = ['-r', '--raw', '-p', '-U0', '-M', '--full-index',
+                  '--abbrev=40', '--no-color', '--no-ext-diff']
+
+
+def parse_diff(lines: Iterable[bytes]) -> Iterator[FileDiff]:
+    """
+    Parses the output of `git diff-tree` (see DIFF_TREE_ARGS), yielding a
+    description of the changes to each file as soon as they have been read.
+    """
+    pending: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    headers = 0
+    for line in lines:
+        if line.startswith(b'@@'):
+            hunk = parse_hunk_header(line)
+            if current is not None and hunk is not None:
+                current.hunks.append(hunk)
+        elif line.startswith(b'diff --git '):
+            # type changes are reported as a deletion and an addition
+            if current is not None and current.status == 'T' \
+               and headers == 1:
+                headers = 2
+                continue
+            if current is not None:
+                yield current
+            current = pending.pop(0)
+            headers = 1
+        elif line.startswith(b':') and current is None:
+            pending.append(_parse_raw(line))
+        elif line.startswith(b'Binary files ') and current is not None:
+            current.binary = True
+
+    if current is not None:
+        yield current
+    yield from pending
+
+
+def iter_diff(repo: git.Repo,
+              old: str,
+              new: str,
+              paths: Optional[List[str]] = None
+              ) -> Iterator[FileDiff]:
+    """
+    Computes the differences between two versions of a project, with zero
+    lines of context and rename detection, and yields a description of the
+    changes to each file as soon as they have been read from git.
+
+    Params:
+      old: The revision of the old version of the project.
+      new: The revision of the new version of the project.
+      paths: An optional list of paths to which the diff should be limited.
+    """
+    args = DIFF_TREE_ARGS + [old, new]
+    if paths is not None:
+        args += ['--'] + list(paths)
+    proc = repo.git.diff_tree(*args, as_process=True)
+
+    completed = False
+    try:
+        yield from parse_diff(proc.stdout)
+        completed = True
+    finally:
+        if completed:
+            proc.wait()
+        else:
+            proc.proc.kill()
+            proc.proc.wait()
+
+
+class DiffSummary(object):
+    """
+    Retains the parsed changes between two versions of a project so that
+    they may be queried repeatedly without re-running the diff. The lines
+    removed from, and added to, each file are computed on first use and
+    indexed by filename.
+    """
+    def __init__(self, file_diffs: Iterable[FileDiff]) -> None:
+        self.__file_diffs = list(file_diffs)
+        self.__old_lines: Optional[LineSet] = None
+        self.__new_lines: Optional[LineSet] = None
+
+    def __sizeof__(self) -> int:
+        size = object.__sizeof__(self) + sys.getsizeof(self.__file_diffs) + \
+            sum(sys.getsizeof(d) for d in self.__file_diffs)
+        for lines in (self.__old_lines, self.__new_lines):
+            if lines is not None:
+                size += sys.getsizeof(lines)
+        return size
+
+    @property
+    def file_diffs(self) -> List[FileDiff]:
+        """
+        The changes made to each file that differs between the two versions.
+        """
+        return self.__file_diffs
+
+    @staticmethod
+    def _line_set(ranges: Dict[str, List[range]]) -> LineSet:
+        """
+        Constructs a set of lines from the ranges of line numbers within each
+        file.
+        """
+        return LineSet.from_arrays({
+            fn: np.concatenate([np.arange(r.start, r.stop) for r in rs])
+            for (fn, rs) in ranges.items() if any(rs)
+        })
+
+    def index(self) -> None:
+        """
+        Computes the lines that were removed from, and added to, each file
+        ahead of their first use.
+        """
+        self.old_lines
+        self.new_lines
+
+    @property
+    def old_lines(self) -> LineSet:
+        """
+        The lines that were removed from (or changed within) the old version
+        of each file, given by the names of the files in the old version.
+        """
+        if self.__old_lines is None:
+            ranges: Dict[str, List[range]] = {}
+            for d in self.__file_diffs:
+                if d.a_path is not None:
+                    ranges.setdefault(d.a_path, []).extend(h.old_lines
+                                                           for h in d.hunks)
+            self.__old_lines = DiffSummary._line_set(ranges)
+        return self.__old_lines
+
+    @property
+    def new_lines(self) -> LineSet:
+        """
+        The lines that were added to (or changed within) the new version of
+        each file, given by the names of the files in the new version.
+        """
+        if self.__new_lines is None:
+            ranges: Dict[str, List[range]] = {}
+            for d in self.__file_diffs:
+                if d.b_path is not None:
+                    ranges.setdefault(d.b_path, []).extend(h.new_lines
+                                                           for h in d.hunks)
+            self.__new_lines = DiffSummary._line_set(ranges)
+        return self.__new_lines
+
+    def files(self, filter_by: Set[Change]) -> FrozenSet[str]:
+        """
+        Returns the names of the files whose changes are of one of the given
+        types. As in GitPython, a file is considered to be modified if both
+        of its versions exist and their contents differ, and files are named
+        by their path in the old version unless they were added.
+        """
+        kinds = {f.value for f in filter_by}
+        files: Set[str] = set()
+        for d in self.__file_diffs:
+            modified = d.status == 'M' or \
+                (d.a_blob is not None and d.b_blob is not None and
+                 d.a_blob != d.b_blob)
+            if d.status in kinds or ('M' in kinds and modified):
+                files.add(d.a_path if d.a_path is not None else d.b_path)
+        return frozenset(files)
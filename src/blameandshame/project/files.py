@@ -0,0 +1,209 @@
+"""
+Provides an index of the commits that touched each path in a repository,
+built from a single walk over the entire history of the repository, which
+allows the history of any file to be found without running `git log`.
+
+The index reproduces the semantics of `git log --follow <range> -- <file>`.
+Since `--follow` disables history simplification, every commit in the range
+is visited, in the same order as `git log` (see CommitGraph.between), and a
+commit is reported whenever its diff against its parent touches the path
+that is currently being followed. Merge commits, which have no diff by
+default, are never reported. When a reported commit creates the followed
+path by renaming (or copying) another file, the old name is followed by
+every commit visited from that point onwards, regardless of the branch on
+which it lies.
+
+Renames and copies are detected by the walk over the whole repository using
+the same options as `--follow` (i.e., `-M -C --find-copies-harder`, with the
+default similarity threshold). Git limits the number of candidates that it
+considers when detecting renames (see diff.renameLimit). Since the walk
+detects renames for every file that a commit creates at once, rather than
+for a single file, a commit that creates a very large number of files may
+exceed that limit, in which case only exact renames are followed.
+"""
+from typing import Dict, IO, Iterator, List, Optional, Set, Tuple
+import git
+import numpy as np
+from blameandshame.project.graph import CommitGraph
+
+# The arguments passed to `git log` to walk the history of the repository.
+LOG_ARGS = ('--all', '--name-status', '-M', '-C', '--find-copies-harder',
+            '-z', '--format=commit %H')
+
+
+def _tokens(stream: IO[bytes], size: int = 1 << 16) -> Iterator[bytes]:
+    """
+    Yields the NUL-terminated tokens read from a stream, as soon as they
+    have been read.
+    """
+    rest = b''
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        tokens = (rest + chunk).split(b'\0')
+        rest = tokens.pop()
+        yield from tokens
+    if rest:
+        yield rest
+
+
+class FileHistoryIndex(object):
+    """
+    An index of the commits that touched each path within a repository,
+    given by their ordinals within the commit graph.
+    """
+    @staticmethod
+    def build(repo: git.Repo, graph: CommitGraph) -> 'FileHistoryIndex':
+        """
+        Constructs an index of every commit that is reachable from any
+        reference within a given repository, using a single call to
+        `git log`, whose output is parsed as it is produced.
+        """
+        proc = repo.git.log(*LOG_ARGS, as_process=True)
+        completed = False
+        try:
+            index = FileHistoryIndex.parse(_tokens(proc.stdout), graph)
+            completed = True
+        finally:
+            if completed:
+                proc.wait()
+            else:
+                proc.proc.kill()
+                proc.proc.wait()
+        return index
+
+    @staticmethod
+    def parse(tokens: Iterator[bytes],
+              graph: CommitGraph
+              ) -> 'FileHistoryIndex':
+        """
+        Constructs an index from the NUL-separated tokens produced by
+        `git log` with the arguments given by LOG_ARGS.
+        """
+        touched: Dict[str, List[int]] = {}
+        renames: Dict[int, Dict[str, str]] = {}
+        sources: Dict[int, Set[str]] = {}
+        commit = -1
+        tokens = iter(tokens)
+        for token in tokens:
+            token = token.lstrip(b'\n')
+            if token.startswith(b'commit '):
+                commit = graph.ordinal(token[7:].decode())
+                continue
+            if not token:
+                continue
+            status = token[:1]
+            old = next(tokens).decode('utf-8', 'surrogateescape')
+            paths = [old]
+            if status in (b'R', b'C'):
+                new = next(tokens).decode('utf-8', 'surrogateescape')
+                paths.append(new)
+                renames.setdefault(commit, {})[new] = old
+                if status == b'R':
+                    sources.setdefault(commit, set()).add(old)
+                else:
+                    # copies leave their source untouched
+                    paths = [new]
+            elif status == b'D':
+                sources.setdefault(commit, set()).add(old)
+            for path in paths:
+                commits = touched.setdefault(path, [])
+                if not commits or commits[-1] != commit:
+                    commits.append(commit)
+
+        arrays = {path: np.array(commits, dtype=np.int64)
+                  for (path, commits) in touched.items()}
+        return FileHistoryIndex(graph, arrays, renames, sources)
+
+    def __init__(self,
+                 graph: CommitGraph,
+                 touched: Dict[str, np.ndarray],
+                 renames: Dict[int, Dict[str, str]],
+                 sources: Dict[int, Set[str]]
+                 ) -> None:
+        """
+        Params:
+          graph: The commit graph whose ordinals are used by the index.
+          touched: The ordinals of the (non-merge) commits that touched each
+            path, either by changing it or by renaming it.
+          renames: The old name of each path that was created by renaming or
+            copying another file, indexed by the ordinal of the commit.
+          sources: The paths that were deleted (or renamed away) by each
+            commit, indexed by the ordinal of the commit.
+        """
+        self.__graph = graph
+        self.__touched = touched
+        self.__renames = renames
+        self.__sources = sources
+
+    @property
+    def graph(self) -> CommitGraph:
+        """
+        The commit graph whose ordinals are used by this index.
+        """
+        return self.__graph
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.__touched
+
+    def __len__(self) -> int:
+        return len(self.__touched)
+
+    @property
+    def paths(self) -> List[str]:
+        """
+        The paths of every file that has existed within the repository.
+        """
+        return list(self.__touched.keys())
+
+    def _followed_from(self, commit: int, path: str) -> Optional[str]:
+        """
+        Returns the path that `--follow` moves to after visiting a commit
+        that touched a given path, or None if the path is not renamed.
+        """
+        old = self.__renames.get(commit, {}).get(path)
+        if old is None or path in self.__sources.get(commit, ()):
+            return None
+        return old
+
+    def commits(self,
+                path: str,
+                after: Optional[str],
+                before: str
+                ) -> List[str]:
+        """
+        Returns the full hashes of the commits that `git log --follow` would
+        report for a given path within the range `after..before`, in order.
+        """
+        graph = self.__graph
+        order = graph.order(before)
+        excluded = graph.ancestors(after) if after is not None else None
+
+        ordinals: List[int] = []
+        position = -1
+        while True:
+            candidates = self.__touched.get(path)
+            if candidates is None:
+                break
+            positions = order[candidates]
+            keep = positions > position
+            if excluded is not None:
+                keep &= ~excluded[candidates]
+            candidates = candidates[keep]
+            candidates = candidates[np.argsort(positions[keep],
+                                               kind='stable')]
+
+            renamed: Optional[Tuple[int, str]] = None
+            for commit in candidates.tolist():
+                ordinals.append(commit)
+                old = self._followed_from(commit, path)
+                if old is not None:
+                    renamed = (commit, old)
+                    break
+            if renamed is None:
+                break
+            commit, path = renamed
+            position = int(order[commit])
+
+        return [graph.sha(commit) for commit in ordinals]
@@ -0,0 +1,134 @@
+"""
+Locates the functions within a file in the same way as `git log -L
+:<funcname>:<file>`, so that the histories of every function within a file
+can be computed by a single walk over its history (see LineHistory).
+
+Git finds the start of each function using the funcname pattern of the diff
+driver for the file, or, if it has none, using its default rule, under which
+any line that begins with a letter, an underscore or a dollar sign starts a
+function. Each function extends up to (but not including) the line that
+starts the next function, or to the end of the file. Since the default rule
+only recognises unindented definitions, the builtin patterns that git uses
+for several languages are provided by FUNCNAME_PATTERNS, and can be used
+instead (see funcname_pattern), which is equivalent to assigning the
+corresponding diff driver to the file in `.gitattributes`.
+
+Funcname patterns are given in the same format as the `diff.*.xfuncname`
+option of git: one regular expression per line, where a line that is
+prefixed with `!` rejects, rather than accepts, the lines that it matches.
+Patterns are interpreted as Python regular expressions, which agree with
+POSIX extended regular expressions in all but a few corner cases.
+"""
+from typing import List, NamedTuple, Optional, Pattern, Tuple
+import posixpath
+import re
+
+# The funcname patterns that git provides for a selection of languages (see
+# git's userdiff.c), indexed by file extension.
+FUNCNAME_PATTERNS = {
+    '.py': r'^[ \t]*((class|(async[ \t]+)?def)[ \t].*)$',
+    '.rb': r'^[ \t]*((class|module|def)[ \t].*)$',
+    '.go': '\n'.join([r'^[ \t]*(func[ \t]*.*(\{[ \t]*)?)',
+                      r'^[ \t]*(type[ \t].*(struct|interface)[ \t]*'
+                      r'(\{[ \t]*)?)']),
+    '.java': '\n'.join([r'!^[ \t]*(catch|do|for|if|instanceof|new|return|'
+                        r'switch|throw|while)',
+                        r'^[ \t]*(([A-Za-z_<>&][][?&<>.,A-Za-z_0-9]*[ \t]+)+'
+                        r'[A-Za-z_][A-Za-z_0-9]*[ \t]*\([^;]*)$'])
+}
+
+
+class Function(NamedTuple):
+    """
+    Describes the location of a function within a version of a file.
+    """
+    # the line that starts the function, with trailing whitespace removed.
+    header: str
+    # the one-indexed number of the first line of the function.
+    first: int
+    # the one-indexed number of the last line of the function.
+    last: int
+
+
+def funcname_pattern(filename: str) -> Optional[str]:
+    """
+    Returns the builtin funcname pattern for a given file, according to its
+    extension, or None if there is no such pattern.
+    """
+    return FUNCNAME_PATTERNS.get(posixpath.splitext(filename)[1])
+
+
+def _compile(funcname: Optional[str]) -> List[Tuple[bool, Pattern[str]]]:
+    """
+    Compiles a funcname pattern into a list of (negated, regex) pairs.
+    """
+    if funcname is None:
+        return []
+    patterns = []
+    for pattern in funcname.split('\n'):
+        negated = pattern.startswith('!')
+        if negated:
+            pattern = pattern[1:]
+        patterns.append((negated, re.compile(pattern)))
+    return patterns
+
+
+def _is_funcname(line: str, patterns: List[Tuple[bool, Pattern[str]]]
+                 ) -> bool:
+    """
+    Determines whether a given line starts a function. The first pattern to
+    match the line decides the outcome. If no patterns are given, git's
+    default rule is used.
+    """
+    if not patterns:
+        return line[:1].isalpha() or line[:1] in ('_', '$')
+    for (negated, pattern) in patterns:
+        if pattern.search(line):
+            return not negated
+    return False
+
+
+def function_spans(lines: List[str],
+                   funcname: Optional[str] = None
+                   ) -> List[Function]:
+    """
+    Finds every function within a given version of a file.
+
+    Params:
+      lines: The lines of the file, without their line endings.
+      funcname: The funcname pattern used to find the start of each function.
+        If None, git's default rule is used.
+
+    Returns:
+        The functions within the file, in order. Lines that precede the first
+        function do not belong to any function.
+    """
+    patterns = _compile(funcname)
+    starts = [i for (i, line) in enumerate(lines)
+              if _is_funcname(line, patterns)]
+    ends = starts[1:] + [len(lines)]
+    return [Function(lines[start].rstrip(), start + 1, end)
+            for (start, end) in zip(starts, ends)]
+
+
+def find_function(lines: List[str],
+                  regex: str,
+                  funcname: Optional[str] = None
+                  ) -> Optional[Function]:
+    """
+    Finds the function that `git log -L :<regex>:<file>` would track: i.e.,
+    the first function whose starting line matches a given regular
+    expression.
+
+    Returns:
+        The function, or None if no function matches the expression.
+    """
+    pattern = re.compile(regex)
+    patterns = _compile(funcname)
+    for (i, line) in enumerate(lines):
+        if pattern.search(line) and _is_funcname(line, patterns):
+            end = i + 1
+            while end < len(lines) and not _is_funcname(lines[end], patterns):
+                end += 1
+            return Function(line.rstrip(), i + 1, end)
+    return None
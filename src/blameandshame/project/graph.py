@@ -0,0 +1,227 @@
+from typing import Dict, List, Optional, Tuple
+import heapq
+import git
+import numpy as np
+from blameandshame.cache import MemoryCache
+
+# The number of set bits in each possible byte.
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class CommitGraph(object):
+    """
+    An in-memory index of the commit graph of a repository, used to count and
+    enumerate ranges of commits without launching a git process.
+
+    Each commit reachable from a reference is assigned an ordinal according
+    to a topological ordering of the graph, in which every commit appears
+    before its parents. The graph stores the parents and commit timestamp of
+    each ordinal, and lazily computes the set of ancestors of each commit
+    that it is asked about, represented as a bitset indexed by ordinal and
+    packed into one bit per commit. These bitsets, and the orders computed
+    by `order`, are memoized in (optionally budgeted) in-memory tables.
+    """
+    # The arguments passed to `git rev-list` to enumerate the commit graph.
+    ARGS = ('--all', '--topo-order', '--parents', '--timestamp')
+
+    @staticmethod
+    def build(repo: git.Repo,
+              ancestors: Optional[MemoryCache] = None,
+              orders: Optional[MemoryCache] = None
+              ) -> 'CommitGraph':
+        """
+        Constructs an index of all commits that are reachable from any
+        reference within a given repository, using a single call to
+        `git rev-list`. See the constructor for the meaning of the optional
+        parameters.
+        """
+        return CommitGraph.parse(repo.git.rev_list(*CommitGraph.ARGS),
+                                 ancestors=ancestors,
+                                 orders=orders)
+
+    @staticmethod
+    def parse(out: str,
+              ancestors: Optional[MemoryCache] = None,
+              orders: Optional[MemoryCache] = None
+              ) -> 'CommitGraph':
+        """
+        Constructs an index of the commit graph from the output of
+        `git rev-list` with the arguments given by ARGS. See the constructor
+        for the meaning of the optional parameters.
+        """
+        shas: List[str] = []
+        timestamps: List[int] = []
+        parent_shas: List[List[str]] = []
+        for line in out.splitlines():
+            timestamp, sha, *parents = line.split()
+            shas.append(sha)
+            timestamps.append(int(timestamp))
+            parent_shas.append(parents)
+
+        ordinal = {sha: i for (i, sha) in enumerate(shas)}
+        parents = [tuple(ordinal[p] for p in ps) for ps in parent_shas]
+        return CommitGraph(shas, parents, timestamps,
+                           ancestors=ancestors,
+                           orders=orders)
+
+    def __init__(self,
+                 shas: List[str],
+                 parents: List[Tuple[int, ...]],
+                 timestamps: List[int],
+                 ancestors: Optional[MemoryCache] = None,
+                 orders: Optional[MemoryCache] = None
+                 ) -> None:
+        """
+        Constructs an index of a commit graph.
+
+        Params:
+          shas: The full hash of each commit, indexed by ordinal.
+          parents: The ordinals of the parents of each commit.
+          timestamps: The commit timestamp of each commit.
+          ancestors: The table used to memoize the packed set of ancestors
+            of each commit, indexed by ordinal. The table should be empty,
+            since ordinals are specific to this graph. If None, an unbounded
+            table is used.
+          orders: The table used to memoize the result of `order` for each
+            commit, indexed by ordinal. As above.
+        """
+        self.__shas = shas
+        self.__ordinal: Dict[str, int] = \
+            {sha: i for (i, sha) in enumerate(shas)}
+        self.__parents = parents
+        self.__timestamps = timestamps
+        self.__ancestors = ancestors if ancestors is not None \
+            else MemoryCache()
+        self.__orders = orders if orders is not None else MemoryCache()
+
+    def __len__(self) -> int:
+        return len(self.__shas)
+
+    def __contains__(self, sha: str) -> bool:
+        return sha in self.__ordinal
+
+    def ordinal(self, sha: str) -> int:
+        """
+        Returns the ordinal of a commit, given by its full hash.
+
+        Raises:
+            KeyError: if the commit is not contained in this graph.
+        """
+        return self.__ordinal[sha]
+
+    def sha(self, ordinal: int) -> str:
+        """
+        Returns the full hash of the commit with a given ordinal.
+        """
+        return self.__shas[ordinal]
+
+    def parents(self, ordinal: int) -> Tuple[int, ...]:
+        """
+        Returns the ordinals of the parents of a given commit.
+        """
+        return self.__parents[ordinal]
+
+    def ancestors(self, sha: str) -> np.ndarray:
+        """
+        Returns a boolean array, indexed by ordinal, that marks each of the
+        ancestors of a given commit, including the commit itself.
+        """
+        packed = self._packed_ancestors(self.__ordinal[sha])
+        return np.unpackbits(packed, count=len(self.__shas)).view(bool)
+
+    def _packed_ancestors(self, start: int) -> np.ndarray:
+        """
+        Returns the ancestors of the commit with a given ordinal (including
+        the commit itself), as a bitset packed by `np.packbits`.
+
+        The ancestors are found by a depth-first search that stops at each
+        commit whose ancestors are already memoized, and merges its bitset
+        instead, so that queries about nearby commits share most of the
+        work.
+        """
+        memo = self.__ancestors
+        try:
+            return memo[start]
+        except KeyError:
+            pass
+
+        seen = bytearray(len(self.__shas))
+        marked = np.frombuffer(seen, dtype=bool)
+        seen[start] = 1
+        stack = [start]
+        parents = self.__parents
+        while stack:
+            for p in parents[stack.pop()]:
+                if seen[p]:
+                    continue
+                if p in memo:
+                    marked |= np.unpackbits(memo[p],
+                                            count=len(seen)).view(bool)
+                else:
+                    seen[p] = 1
+                    stack.append(p)
+
+        ancestors = np.packbits(marked)
+        memo[start] = ancestors
+        return ancestors
+
+    def count(self, after: Optional[str], before: str) -> int:
+        """
+        Returns the number of commits in the range `after..before`, i.e., the
+        number of ancestors of `before` (inclusive) that are not ancestors of
+        `after` (inclusive). If `after` is None, all ancestors of `before`
+        are counted.
+        """
+        included = self._packed_ancestors(self.__ordinal[before])
+        if after is not None:
+            excluded = self._packed_ancestors(self.__ordinal[after])
+            included = included & ~excluded
+        return int(_POPCOUNT[included].sum())
+
+    def order(self, before: str) -> np.ndarray:
+        """
+        Returns an array, indexed by ordinal, that gives the position of each
+        ancestor of a given commit in the order in which `git log` reports
+        them (see between), or -1 for commits that are not ancestors. Since
+        excluding the ancestors of another commit does not change the
+        relative order of the remaining commits, the order of the commits in
+        any range `after..before` is also given by this array.
+        """
+        start = self.__ordinal[before]
+        try:
+            return self.__orders[start]
+        except KeyError:
+            pass
+        order = np.full(len(self.__shas), -1, dtype=np.int32)
+        walk = self.between(None, before)
+        order[[self.__ordinal[sha] for sha in walk]] = np.arange(len(walk))
+        self.__orders[start] = order
+        return order
+
+    def between(self, after: Optional[str], before: str) -> List[str]:
+        """
+        Returns the full hashes of the commits in the range `after..before`,
+        in the order in which they are reported by `git log`: commits are
+        visited in decreasing order of commit time, starting from `before`,
+        with ties broken in favour of the commit that was reached first.
+        """
+        excluded = self.ancestors(after) if after is not None else None
+        timestamps = self.__timestamps
+        parents = self.__parents
+
+        start = self.__ordinal[before]
+        queued = {start}
+        counter = 0
+        queue = [(-timestamps[start], counter, start)]
+        shas: List[str] = []
+        while queue:
+            _, _, commit = heapq.heappop(queue)
+            if excluded is not None and excluded[commit]:
+                continue
+            shas.append(self.__shas[commit])
+            for p in parents[commit]:
+                if p not in queued:
+                    queued.add(p)
+                    counter += 1
+                    heapq.heappush(queue, (-timestamps[p], counter, p))
+        return shas
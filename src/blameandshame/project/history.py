@@ -0,0 +1,329 @@
+"""
+Computes the history of many line ranges within a file using a single walk
+over the history of the project.
+
+The walk reproduces the semantics of `git log -L`: each tracked range is
+carried backwards from commit to commit, and a commit is reported for a range
+whenever the diff between that commit and one of its parents touches the
+range. Ranges are represented in the same way as git represents them
+internally: as sorted lists of zero-indexed, half-open (start, end) pairs.
+The range operations below mirror those in git's `line-log.c`, including its
+treatment of empty ranges, so that the results are identical to those
+produced by running `git log -L` separately for each range.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import git
+from blameandshame.project.blobs import BlobReader
+from blameandshame.project.diff import parse_hunk_header
+
+Range = Tuple[int, int]
+RangeSet = List[Range]
+
+# Describes the lines removed from a parent (first) and added to a target
+# (second) by each hunk of a diff.
+Hunks = Tuple[RangeSet, RangeSet]
+
+
+def _overlaps(a: Range, b: Range) -> bool:
+    return not (a[1] <= b[0] or b[1] <= a[0])
+
+
+def _union(a: RangeSet, b: RangeSet) -> RangeSet:
+    """
+    Computes the union of two range sets, dropping empty ranges and merging
+    adjacent ones.
+    """
+    out: RangeSet = []
+    for (start, end) in sorted(a + b):
+        if start == end:
+            continue
+        if not out or out[-1][1] < start:
+            out.append((start, end))
+        elif out[-1][1] < end:
+            out[-1] = (out[-1][0], end)
+    return out
+
+
+def _difference(a: RangeSet, b: RangeSet) -> RangeSet:
+    """
+    Computes the ranges in `a` that are not covered by the ranges in `b`.
+    """
+    out: RangeSet = []
+    j = 0
+    for (start, end) in a:
+        while start < end:
+            while j < len(b) and start >= b[j][1]:
+                j += 1
+            if j >= len(b) or end <= b[j][0]:
+                out.append((start, end))
+                break
+            if start >= b[j][0]:
+                start = b[j][1]
+            else:
+                out.append((start, b[j][0]))
+                start = b[j][1]
+    return out
+
+
+def _touched(hunks: Hunks, ranges: RangeSet) -> Hunks:
+    """
+    Returns the subset of hunks in a diff whose target overlaps a given set
+    of ranges.
+    """
+    parent, target = hunks
+    touched: Hunks = ([], [])
+    j = 0
+    for i in range(len(target)):
+        while target[i][0] > ranges[j][1]:
+            j += 1
+            if j == len(ranges):
+                return touched
+        if _overlaps(target[i], ranges[j]):
+            touched[0].append(parent[i])
+            touched[1].append(target[i])
+    return touched
+
+
+def _shift(ranges: RangeSet, hunks: Hunks) -> RangeSet:
+    """
+    Maps a set of ranges that are untouched by a diff into the line numbers
+    used by the parent of that diff.
+    """
+    parent, target = hunks
+    out: RangeSet = []
+    offset = 0
+    j = 0
+    for (start, end) in ranges:
+        while j < len(target) and start >= target[j][0]:
+            offset += (parent[j][1] - parent[j][0]) \
+                - (target[j][1] - target[j][0])
+            j += 1
+        out.append((start + offset, end + offset))
+    return out
+
+
+def map_across_diff(ranges: RangeSet,
+                    hunks: Hunks
+                    ) -> Tuple[bool, RangeSet]:
+    """
+    Maps a set of ranges in a target version of a file to the corresponding
+    ranges in its parent version.
+
+    Returns:
+        A tuple of the form (touched, ranges), where touched indicates
+        whether any hunk in the diff overlaps the given ranges, and ranges
+        gives the ranges that should be tracked in the parent. Touched
+        ranges are replaced by the parent side of the hunks that touch them.
+    """
+    touched = _touched(hunks, ranges)
+    untouched = _difference(ranges, touched[1])
+    mapped = _union(_shift(untouched, hunks), touched[0])
+    return (len(touched[0]) > 0, mapped)
+
+
+def parse_hunks(patch: Iterable[bytes]) -> Hunks:
+    """
+    Reads the ranges of each hunk from the lines of a patch generated with
+    zero lines of context.
+    """
+    hunks: Hunks = ([], [])
+    for line in patch:
+        hunk = parse_hunk_header(line)
+        if hunk is None:
+            continue
+        old_start = hunk.old_start - (1 if hunk.old_count else 0)
+        new_start = hunk.new_start - (1 if hunk.new_count else 0)
+        hunks[0].append((old_start, old_start + hunk.old_count))
+        hunks[1].append((new_start, new_start + hunk.new_count))
+    return hunks
+
+
+class LineHistory(object):
+    """
+    Walks the history of a single file once to determine the commits that
+    touched each of a number of line ranges.
+    """
+    def __init__(self,
+                 repo: git.Repo,
+                 blobs: Optional[BlobReader] = None
+                 ) -> None:
+        self.__repo = repo
+        self.__blob_reader = blobs if blobs is not None else BlobReader(repo)
+        self.__blobs: Dict[Tuple[str, str], Optional[str]] = {}
+        self.__diffs: Dict[Tuple[str, str], Hunks] = {}
+
+    def _blob(self, sha: str, path: str) -> Optional[str]:
+        """
+        Returns the hash of the blob at a given path in a commit, or None if
+        no such path exists.
+        """
+        key = (sha, path)
+        try:
+            return self.__blobs[key]
+        except KeyError:
+            pass
+        try:
+            blob, kind, _ = \
+                self.__repo.git.get_object_header('{}:{}'.format(sha, path))
+            blob = blob.decode() if kind == b'blob' else None
+        except ValueError:
+            blob = None
+        self.__blobs[key] = blob
+        return blob
+
+    def _diff(self, old: Optional[str], new: str) -> Hunks:
+        """
+        Computes the hunks of the diff between two blobs, using the same
+        diff options that `git log -L` uses internally.
+        """
+        if old is None:
+            num_lines = self._num_lines(new)
+            return ([(0, 0)], [(0, num_lines)]) if num_lines else ([], [])
+        key = (old, new)
+        try:
+            return self.__diffs[key]
+        except KeyError:
+            pass
+        patch = self.__repo.git.diff(old, new,
+                                     '-U0',
+                                     '--text',
+                                     '--no-color',
+                                     '--no-ext-diff',
+                                     '--no-indent-heuristic',
+                                     '--diff-algorithm=myers',
+                                     stdout_as_string=False)
+        hunks = parse_hunks(patch.split(b'\n'))
+        self.__diffs[key] = hunks
+        return hunks
+
+    def _num_lines(self, blob: str) -> int:
+        return self.__blob_reader.num_lines(blob) or 0
+
+    def num_lines(self, sha: str, path: str) -> Optional[int]:
+        """
+        Returns the number of lines in a file at a given commit, as counted
+        by git, or None if the file does not exist at that commit.
+        """
+        blob = self._blob(sha, path)
+        return self._num_lines(blob) if blob is not None else None
+
+    def _rename_source(self, parent: str, commit: str, path: str
+                       ) -> Optional[str]:
+        """
+        Determines the path from which a given file was renamed between a
+        parent and a commit, or None if the file was not renamed.
+        """
+        out = self.__repo.git.diff_tree('-r', '-M', '-z', '--name-status',
+                                        '--no-commit-id', parent, commit)
+        fields = out.split('\0')
+        i = 0
+        while i < len(fields) - 1:
+            status = fields[i]
+            if status[:1] in ('R', 'C'):
+                if status[0] == 'R' and fields[i + 2] == path:
+                    return fields[i + 1]
+                i += 3
+            else:
+                i += 2
+        return None
+
+    def walk(self,
+             path: str,
+             ranges: List[RangeSet],
+             rev_range: str
+             ) -> List[List[str]]:
+        """
+        Computes the history of each of a list of ranges within a file.
+
+        Params:
+          path: The name of the file at the most recent commit in the range.
+          ranges: A list of range sets, one for each history that should be
+            computed, given with respect to the most recent version of the
+            file.
+          rev_range: The range of revisions that should be searched, in a
+            form accepted by `git rev-list`.
+
+        Returns:
+            A list containing, for each range set, the full hashes of the
+            commits that touched it, in the order reported by `git log -L`.
+        """
+        out = self.__repo.git.rev_list('--topo-order', '--parents', rev_range)
+        walk = [line.split() for line in out.splitlines()]
+        histories: List[List[str]] = [[] for _ in ranges]
+        if not walk:
+            return histories
+
+        # maps each commit to the ranges that should be tracked within it,
+        # grouped by file and indexed by the position of the range set.
+        State = Dict[str, Dict[int, RangeSet]]
+        pending: Dict[str, State] = {
+            walk[0][0]: {path: {i: r for (i, r) in enumerate(ranges) if r}}
+        }
+
+        def add(commit: str, path: str, tracked: Dict[int, RangeSet]):
+            if not tracked:
+                return
+            state = pending.setdefault(commit, {})
+            existing = state.get(path)
+            if existing is None:
+                state[path] = tracked
+                return
+            merged = dict(existing)
+            for (i, r) in tracked.items():
+                merged[i] = _union(merged[i], r) if i in merged else r
+            state[path] = merged
+
+        for (commit, *parents) in walk:
+            state = pending.pop(commit, None)
+            if state is None:
+                continue
+
+            for (path, tracked) in state.items():
+                blob = self._blob(commit, path)
+
+                # determine the location and diff of the file in each parent
+                sources: List[Tuple[str, Hunks]] = []
+                for parent in parents:
+                    source = path
+                    parent_blob = self._blob(parent, path)
+                    if parent_blob is None:
+                        source = self._rename_source(parent, commit, path)
+                        if source is not None:
+                            parent_blob = self._blob(parent, source)
+                    if parent_blob == blob:
+                        sources.append((source, ([], [])))
+                    else:
+                        sources.append((source,
+                                        self._diff(parent_blob, blob)))
+
+                if not parents:
+                    for i in tracked:
+                        histories[i].append(commit)
+                    continue
+
+                mapped: List[Dict[int, RangeSet]] = [{} for _ in parents]
+                for (i, r) in tracked.items():
+                    results = []
+                    for (k, (_, hunks)) in enumerate(sources):
+                        touched, parent_ranges = map_across_diff(r, hunks)
+                        if not touched and len(parents) > 1:
+                            # this parent takes the blame for the whole range
+                            mapped[k][i] = parent_ranges
+                            break
+                        results.append((touched, parent_ranges))
+                    else:
+                        if any(touched for (touched, _) in results):
+                            histories[i].append(commit)
+                        for (k, (_, parent_ranges)) in enumerate(results):
+                            if parent_ranges:
+                                mapped[k][i] = parent_ranges
+
+                for (k, parent) in enumerate(parents):
+                    source = sources[k][0]
+                    if source is not None:
+                        add(parent, source, mapped[k])
+
+            if not pending:
+                break
+
+        return histories
@@ -0,0 +1,314 @@
+"""
+Provides a files-by-authors ownership matrix for a snapshot of a repository,
+built from a single walk over its history, rather than from one `git log`
+per file (as is the case for Project.authors_of_file).
+
+Authors are identified by their name and email address, normalized through
+the `.mailmap` of the repository (see git-check-mailmap), so that each person
+is represented by a single column.
+
+The walk follows renames (and copies) forwards in time: a file that is
+renamed keeps the history of its old name. Unlike `git log --follow`, this
+attributes the history of a file across every branch on which it was
+renamed, and does not follow renames that git fails to detect.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple, \
+    TYPE_CHECKING
+import git
+import numpy as np
+import scipy.sparse
+from blameandshame.project.files import _tokens
+
+if TYPE_CHECKING:
+    from blameandshame.project.base import Project
+
+# The name and (normalized) email address of an author.
+Identity = Tuple[str, str]
+
+# The arguments passed to `git log` to walk the history of the repository.
+LOG_ARGS = ('--reverse', '--no-merges', '--name-status', '-M', '-C', '-z',
+            '--format=commit %H%x00%aN%x00%aE%x00%at')
+
+
+class OwnershipMatrix(object):
+    """
+    Describes the ownership of each file within a given version of a project
+    by each of its authors, using three sparse matrices, whose rows are given
+    by `files` and whose columns are given by `authors`:
+
+    - commits: the number of (non-merge) commits by each author that touched
+      each file;
+    - lines: the number of lines of each file that were last modified by each
+      author, according to blame;
+    - last_touched: the time (given as a Unix timestamp) of the last commit by
+      each author that touched each file.
+
+    The matrix can be extended to a later version of the project, in which
+    case only the new commits are walked, and only the files that were
+    changed by those commits are blamed again.
+    """
+    @staticmethod
+    def build(project: 'Project',
+              version: Optional[git.Commit] = None,
+              blame: bool = True
+              ) -> 'OwnershipMatrix':
+        """
+        Constructs the ownership matrix for a given version of a project.
+
+        Params:
+          version: The version of the project whose files should be
+            described. Defaults to the HEAD of the repository.
+          blame: If False, the files are not blamed and the `lines` matrix is
+            left empty.
+        """
+        matrix = OwnershipMatrix(project, blame=blame)
+        matrix.extend(version)
+        return matrix
+
+    def __init__(self, project: 'Project', blame: bool = True) -> None:
+        """
+        Constructs an empty ownership matrix, which describes the project
+        before its first commit. See `build`.
+        """
+        self.__project = project
+        self.__blame = blame
+        self.__version: Optional[git.Commit] = None
+        self.__files: List[str] = []
+        self.__authors: List[Identity] = []
+        self.__author_index: Dict[Identity, int] = {}
+        self.__mailmap: Dict[Identity, Identity] = {}
+        self.__commits: Dict[str, Dict[int, int]] = {}
+        self.__touched: Dict[str, Dict[int, int]] = {}
+        self.__lines: Dict[str, Dict[int, int]] = {}
+        self.__matrices: Dict[str, scipy.sparse.csr_matrix] = {}
+
+    @property
+    def project(self) -> 'Project':
+        """
+        The project whose files are described by this matrix.
+        """
+        return self.__project
+
+    @property
+    def version(self) -> Optional[git.Commit]:
+        """
+        The version of the project whose files are described by this matrix,
+        or None if the matrix is empty.
+        """
+        return self.__version
+
+    @property
+    def files(self) -> List[str]:
+        """
+        The names of the files within the described version of the project,
+        in the order of the rows of each matrix.
+        """
+        return list(self.__files)
+
+    @property
+    def authors(self) -> List[git.Actor]:
+        """
+        The authors of the project, in the order of the columns of each
+        matrix. Authors that have not touched any file within the described
+        version are included, but own nothing.
+        """
+        return [git.Actor(name, email) for (name, email) in self.__authors]
+
+    @property
+    def commits(self) -> scipy.sparse.csr_matrix:
+        """
+        The number of commits by each author that touched each file.
+        """
+        return self._matrix('commits', self.__commits)
+
+    @property
+    def lines(self) -> scipy.sparse.csr_matrix:
+        """
+        The number of lines within each file that were last modified by each
+        author.
+        """
+        return self._matrix('lines', self.__lines)
+
+    @property
+    def last_touched(self) -> scipy.sparse.csr_matrix:
+        """
+        The author time of the last commit by each author that touched each
+        file, given as a Unix timestamp.
+        """
+        return self._matrix('last_touched', self.__touched)
+
+    def _matrix(self,
+                name: str,
+                entries: Dict[str, Dict[int, int]]
+                ) -> scipy.sparse.csr_matrix:
+        """
+        Builds (and memoizes) a sparse matrix from the entries for each file
+        and author.
+        """
+        try:
+            return self.__matrices[name]
+        except KeyError:
+            pass
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[int] = []
+        for (row, filename) in enumerate(self.__files):
+            for (col, value) in entries.get(filename, {}).items():
+                rows.append(row)
+                cols.append(col)
+                values.append(value)
+        shape = (len(self.__files), len(self.__authors))
+        matrix = scipy.sparse.csr_matrix(
+            (np.array(values, dtype=np.int64), (rows, cols)), shape=shape)
+        self.__matrices[name] = matrix
+        return matrix
+
+    def _author(self, identity: Identity) -> int:
+        """
+        Returns the column of a given (normalized) author, adding a column
+        for that author if necessary.
+        """
+        try:
+            return self.__author_index[identity]
+        except KeyError:
+            col = len(self.__authors)
+            self.__authors.append(identity)
+            self.__author_index[identity] = col
+            return col
+
+    def _normalize(self, identities: Iterable[Identity]) -> None:
+        """
+        Normalizes the given identities through the mailmap of the
+        repository, using as few calls to `git check-mailmap` as possible.
+        """
+        pending = [i for i in set(identities) if i not in self.__mailmap]
+        repo = self.__project.repo
+        for start in range(0, len(pending), 256):
+            chunk = pending[start:start + 256]
+            contacts = ['{} <{}>'.format(*i) for i in chunk]
+            try:
+                out = repo.git.check_mailmap(*contacts).splitlines()
+            except git.exc.GitCommandError:
+                out = contacts
+            for (identity, contact) in zip(chunk, out):
+                name, _, email = contact.rpartition(' <')
+                self.__mailmap[identity] = (name, email.rstrip('>'))
+
+    def _walk(self, rev_range: str) -> Set[str]:
+        """
+        Records the commits within a given range of revisions, from oldest to
+        newest, using a single call to `git log`.
+
+        Returns:
+            The names of the files that were created or modified within the
+            range, according to the newest commit to touch them.
+        """
+        changed: Set[str] = set()
+        repo = self.__project.repo
+        proc = repo.git.log(*LOG_ARGS, rev_range, as_process=True)
+        completed = False
+        try:
+            author = -1
+            timestamp = 0
+            tokens = _tokens(proc.stdout)
+            for token in tokens:
+                token = token.lstrip(b'\n')
+                if token.startswith(b'commit '):
+                    name = next(tokens).decode('utf-8', 'replace')
+                    email = next(tokens).decode('utf-8', 'replace')
+                    author = self._author((name, email))
+                    timestamp = int(next(tokens))
+                    continue
+                if not token:
+                    continue
+                status = token[:1]
+                path = next(tokens).decode('utf-8', 'surrogateescape')
+                if status in (b'R', b'C'):
+                    old, path = \
+                        path, next(tokens).decode('utf-8', 'surrogateescape')
+                    if status == b'R':
+                        self._rename(old, path)
+                        changed.discard(old)
+                    else:
+                        self._copy(old, path)
+                if status != b'D':
+                    changed.add(path)
+
+                commits = self.__commits.setdefault(path, {})
+                commits[author] = commits.get(author, 0) + 1
+                self.__touched.setdefault(path, {})[author] = timestamp
+            completed = True
+        finally:
+            if completed:
+                proc.wait()
+            else:
+                proc.proc.kill()
+                proc.proc.wait()
+        return changed
+
+    def _rename(self, old: str, new: str) -> None:
+        """
+        Transfers the history of a file to its new name.
+        """
+        for table in (self.__commits, self.__touched, self.__lines):
+            if old in table:
+                table[new] = table.pop(old)
+
+    def _copy(self, old: str, new: str) -> None:
+        """
+        Copies the history of a file to a new file.
+        """
+        for table in (self.__commits, self.__touched):
+            if old in table:
+                table[new] = dict(table[old])
+
+    def _blame(self, filename: str, version: git.Commit) -> None:
+        """
+        Counts the lines of a given file that were last modified by each
+        author.
+        """
+        commits = self.__project.last_commits_for_file(filename, version)
+        identities: Dict[str, Identity] = {}
+        for c in commits:
+            if c.hexsha not in identities:
+                identities[c.hexsha] = (c.author.name, c.author.email)
+        self._normalize(identities.values())
+        lines: Dict[int, int] = {}
+        for c in commits:
+            col = self._author(self.__mailmap[identities[c.hexsha]])
+            lines[col] = lines.get(col, 0) + 1
+        self.__lines[filename] = lines
+
+    def extend(self, version: Optional[git.Commit] = None) -> None:
+        """
+        Updates this matrix to describe a later version of the project, by
+        walking the commits that were made since the currently described
+        version and blaming the files that they changed.
+
+        Params:
+          version: The version of the project that should be described.
+            Defaults to the HEAD of the repository. Must be a descendant of
+            the currently described version.
+        """
+        project = self.__project
+        if version is None:
+            version = project._head()
+        previous = self.__version
+        if previous is not None and previous.hexsha == version.hexsha:
+            return
+
+        changed = self._walk(project._rev_range(previous, version))
+        files = sorted(project.files_in_version(version))
+
+        present = set(files)
+        for filename in list(self.__lines):
+            if filename not in present:
+                del self.__lines[filename]
+        if self.__blame:
+            for filename in files:
+                if previous is None or filename in changed:
+                    self._blame(filename, version)
+
+        self.__files = files
+        self.__version = version
+        self.__matrices = {}
@@ -0,0 +1,185 @@
+"""
+Provides instrumentation for measuring where the time spent answering
+queries about a project goes: the wall time of each call to a public Project
+method or annotation column, the number and duration of the git processes
+that each call launches, and the number of cache hits and misses incurred.
+
+Instrumentation is disabled by default. Instrumented functions check whether
+their project has an active Recorder, and call straight through if it does
+not, so the overhead of a disabled recorder is a single attribute lookup.
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import functools
+import time
+import git
+
+
+class CallStats(NamedTuple):
+    """
+    Describes a single completed call to an instrumented function. Each of
+    the measurements includes the work done by any nested calls.
+    """
+    name: str
+    wall_time: float
+    git_calls: int
+    git_time: float
+    cache_hits: int
+    cache_misses: int
+
+
+class Recorder(object):
+    """
+    Accumulates measurements of the calls made to instrumented functions
+    and the git processes that they launch.
+    """
+    def __init__(self,
+                 counters: Callable[[], Tuple[int, int]],
+                 hook: Optional[Callable[[CallStats], None]] = None
+                 ) -> None:
+        """
+        Params:
+          counters: A function that returns the total number of cache hits
+            and misses incurred so far, as a tuple.
+          hook: An optional function that is called with the measurements
+            of each completed call, e.g., to forward them to an exporter.
+        """
+        self.__counters = counters
+        self.__hook = hook
+        self.__git_calls = 0
+        self.__git_time = 0.0
+        self.__active: Dict[str, int] = {}
+        self.__calls: Dict[str, List[float]] = {}
+        self.__commands: Dict[str, List[float]] = {}
+
+    @property
+    def hook(self) -> Optional[Callable[[CallStats], None]]:
+        """
+        The function that is called with the measurements of each call.
+        """
+        return self.__hook
+
+    def record_git(self, command: str, duration: float) -> None:
+        """
+        Records the execution of a single git process.
+
+        Params:
+          command: The name of the git subcommand, e.g., 'log'.
+          duration: The time spent waiting for the process, in seconds.
+        """
+        self.__git_calls += 1
+        self.__git_time += duration
+        totals = self.__commands.setdefault(command, [0, 0.0])
+        totals[0] += 1
+        totals[1] += duration
+
+    def call(self, name: str, f: Callable, *args, **kwargs) -> Any:
+        """
+        Calls a given function and records its measurements under a given
+        name. Recursive calls are measured only once, by their outermost
+        invocation.
+        """
+        depth = self.__active.get(name, 0)
+        if depth > 0:
+            self.__active[name] = depth + 1
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.__active[name] -= 1
+
+        hits, misses = self.__counters()
+        git_calls = self.__git_calls
+        git_time = self.__git_time
+        self.__active[name] = 1
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            wall_time = time.perf_counter() - start
+            self.__active[name] = 0
+            end_hits, end_misses = self.__counters()
+            stats = CallStats(name,
+                              wall_time,
+                              self.__git_calls - git_calls,
+                              self.__git_time - git_time,
+                              end_hits - hits,
+                              end_misses - misses)
+            totals = self.__calls.setdefault(name, [0, 0.0, 0, 0.0, 0, 0])
+            totals[0] += 1
+            for (i, value) in enumerate(stats[1:], 1):
+                totals[i] += value
+            if self.__hook is not None:
+                self.__hook(stats)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Returns the totals recorded for each instrumented function, under
+        'calls', and for each git subcommand, under 'git'.
+        """
+        fields = ('calls',) + CallStats._fields[1:]
+        return {
+            'calls': {name: dict(zip(fields, totals))
+                      for (name, totals) in self.__calls.items()},
+            'git': {command: {'calls': count, 'time': duration}
+                    for (command, (count, duration))
+                    in self.__commands.items()}
+        }
+
+    def reset(self) -> None:
+        """
+        Discards all of the measurements recorded so far.
+        """
+        self.__calls.clear()
+        self.__commands.clear()
+
+
+class InstrumentedGit(git.Git):
+    """
+    A git command wrapper that reports the execution of each git process to
+    a Recorder, if one is attached. Processes that are launched in the
+    background (i.e., with `as_process=True`) are counted, but only the time
+    taken to launch them is measured.
+    """
+    recorder: Optional[Recorder] = None
+
+    @staticmethod
+    def _subcommand(command: Any) -> str:
+        if isinstance(command, str):
+            command = command.split()
+        skip = False
+        for arg in list(command)[1:]:
+            if skip:
+                skip = False
+            elif arg == '-c':
+                skip = True
+            elif not str(arg).startswith('-'):
+                return str(arg)
+        return 'git'
+
+    def execute(self, command, *args, **kwargs):
+        recorder = self.recorder
+        if recorder is None:
+            return super().execute(command, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().execute(command, *args, **kwargs)
+        finally:
+            recorder.record_git(InstrumentedGit._subcommand(command),
+                                time.perf_counter() - start)
+
+
+def instrumented(f: Callable) -> Callable:
+    """
+    Decorates a function whose first argument is a Project (i.e., a method
+    of Project, or an annotation column) so that its calls are measured by
+    the project's recorder, when it has one.
+    """
+    name = f.__qualname__
+
+    @functools.wraps(f)
+    def wrapper(project, *args, **kwargs):
+        recorder = project.recorder
+        if recorder is None:
+            return f(project, *args, **kwargs)
+        return recorder.call(name, f, project, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import asyncio
+import tempfile
+import unittest
+import git
+from blameandshame.project import Project
+from blameandshame.aio import AsyncProject
+from blameandshame.annotate import annotate, column_last_commit, \
+    column_num_file_commits_after_modified, column_was_modified_by_commit
+from tests.util import commit, init
+
+
+def run(coroutine):
+    # asyncio.run is unavailable before Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncProjectTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+        init(d)
+        for contents in ('a\n', 'a\nb\n', 'c\na\nb\n'):
+            commit(d, {'x.txt': contents})
+        self.project = Project(git.Repo(d), offline=True)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_queries(self):
+        project = self.project
+        aio = AsyncProject(project, max_processes=2)
+        head = project.repo.head.commit
+        first = project.repo.commit('HEAD~2')
+
+        async def queries():
+            return await asyncio.gather(
+                aio.commits_to_repo(),
+                aio.commits_to_file('x.txt', after=first),
+                aio.last_commit_to_line('x.txt', 1, head),
+                aio.last_commits_for_file('x.txt', head),
+                aio.lines_modified_by_commit(head))
+
+        (to_repo, to_file, last, last_commits, modified) = \
+            run(queries())
+        self.assertEqual(to_repo, project.commits_to_repo())
+        self.assertEqual(to_file, project.commits_to_file('x.txt',
+                                                          after=first))
+        self.assertEqual(last, head)
+        self.assertEqual([c.hexsha for c in last_commits],
+                         [head.hexsha, first.hexsha, head.parents[0].hexsha])
+        self.assertEqual(modified, project.lines_modified_by_commit(head))
+
+        # the results are shared with the synchronous API
+        stats = project.cache_stats()
+        self.assertEqual(stats['last_commits_for_file']['entries'], 1)
+        self.assertEqual(stats['diffs']['entries'], 1)
+        self.assertEqual(stats['commits_to_file']['entries'], 1)
+
+    def test_annotate(self):
+        project = self.project
+        aio = AsyncProject(project)
+        head = project.repo.head.commit
+        columns = [column_last_commit,
+                   column_num_file_commits_after_modified,
+                   column_was_modified_by_commit]
+        table = run(aio.annotate(head, 'x.txt', columns))
+        self.assertEqual(table, annotate(project, head, 'x.txt', columns))
+
+    def test_event_loops(self):
+        project = self.project
+        aio = AsyncProject(project, max_processes=1)
+        first = project.repo.commit('HEAD~2')
+
+        async def queries(filename):
+            return await asyncio.gather(
+                aio.commits_to_file(filename),
+                aio.commits_to_file(filename, after=first))
+
+        # in each loop, one of the queries must wait for a process slot
+        for filename in ('x.txt', 'y.txt'):
+            self.assertEqual(
+                run(queries(filename)),
+                [project.commits_to_file(filename),
+                 project.commits_to_file(filename, after=first)])
+
+    def test_lines(self):
+        project = self.project
+        aio = AsyncProject(project)
+        head = project.repo.head.commit
+        first = project.repo.commit('HEAD~2')
+
+        histories = run(aio.commits_to_lines('x.txt', before=head))
+        self.assertEqual(run(aio.commits_to_file('x.txt', 2, before=head)),
+                         [first])
+        stats = project.cache_stats()
+        self.assertEqual(stats['commits_to_lines']['entries'], 1)
+        self.assertEqual(histories, project.commits_to_lines('x.txt',
+                                                             before=head))
+        with self.assertRaises(ValueError):
+            run(aio.commits_to_file('x.txt', 4, before=head))
+        with self.assertRaises(ValueError):
+            run(aio.last_commit_to_line('x.txt', 4, head))
+        with self.assertRaises(ValueError):
+            run(aio.last_commit_to_line('x.txt', 0, head))
+
+    def test_missing_file(self):
+        aio = AsyncProject(self.project)
+        head = self.project.repo.head.commit
+        self.assertEqual(
+            run(aio.last_commits_for_file('y.txt', head)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
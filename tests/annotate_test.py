@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
+import tempfile
 import unittest
 from blameandshame.project  import  Project
 from blameandshame.annotate import  annotate, \
+                                    annotate_many, \
+                                    annotate_table, \
+                                    annotate_tree, \
+                                    is_binary, \
+                                    is_generated, \
+                                    per_line, \
                                     use_different_commit, \
                                     column_last_commit, \
                                     column_num_file_commits_after_modified, \
@@ -11,7 +18,14 @@ from blameandshame.annotate import  annotate, \
                                     column_project_name, \
                                     column_project_age_commits, \
                                     column_file_age_commits_to_project, \
-                                    column_file_age_commits_to_file
+                                    column_file_age_commits_to_file, \
+                                    file_column_last_commit, \
+                                    file_column_num_file_commits_after_modified, \
+                                    file_column_num_project_commits_after_modified, \
+                                    file_column_num_days_since_modified, \
+                                    file_column_was_modified_by_commit, \
+                                    TASKS_PER_JOB
+from tests.util import commit, init
 
 
 class AnnotateTestCase(unittest.TestCase):
@@ -44,6 +58,108 @@ class AnnotateTestCase(unittest.TestCase):
         self.assertEqual(actual, expected)
 
 
+    def test_annotate_many(self):
+        project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
+        columns = [column_last_commit, column_num_file_commits_after_modified]
+        tasks = [('e1d2532', 'file-one.txt'),
+                 ('0d841d1', 'file-one.txt'),
+                 ('e1d2532', 'no-such-file.txt')]
+        results = list(annotate_many(project, tasks, columns, jobs=2))
+        self.assertEqual([(r.version, r.filename) for r in results], tasks)
+        for (result, (sha, filename)) in zip(results[:2], tasks):
+            expected = annotate(project, project.repo.commit(sha), filename,
+                                columns)
+            self.assertEqual(result.table, expected)
+            self.assertEqual(result.error, None)
+        self.assertEqual(results[2].table, None)
+        self.assertNotEqual(results[2].error, None)
+
+    def test_annotate_many_lazily(self):
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            sha = commit(d, {'a.txt': 'a\nb\n'})
+            project = Project.from_disk(d, offline=True)
+            submitted = []
+
+            def tasks():
+                for i in range(30):
+                    submitted.append(i)
+                    yield (sha, 'a.txt' if i % 2 else 'missing.txt')
+
+            results = annotate_many(project, tasks(), [column_last_commit],
+                                    jobs=2)
+            first = next(results)
+            self.assertLessEqual(len(submitted), TASKS_PER_JOB * 2 + 1)
+            results = [first] + list(results)
+            self.assertEqual(len(submitted), 30)
+            self.assertEqual([r.filename for r in results],
+                             ['a.txt' if i % 2 else 'missing.txt'
+                              for i in range(30)])
+            self.assertEqual(results[1].table,
+                             [(1, 'a', sha[:7]), (2, 'b', sha[:7])])
+
+
+    def test_annotate_table(self):
+        project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
+        columns = [
+            file_column_last_commit,
+            file_column_num_file_commits_after_modified,
+            file_column_num_project_commits_after_modified,
+            file_column_num_days_since_modified,
+            file_column_was_modified_by_commit,
+            per_line(column_project_name)
+        ]
+        actual = annotate_table(project,
+                                project.repo.commit("e1d2532"),
+                                "file-one.txt",
+                                columns)
+        self.assertEqual(list(actual['num']), [1, 2, 3, 4, 5])
+        self.assertEqual(list(actual['last_commit']),
+                         ['e1d2532', '922e13d', '922e13d', '0d841d1', '0d841d1'])
+        self.assertEqual(list(actual['num_file_commits_after_modified']),
+                         [0, 4, 4, 2, 2])
+        self.assertEqual(list(actual['num_project_commits_after_modified']),
+                         [0, 9, 9, 6, 6])
+        self.assertEqual(actual['num_days_since_modified'][0], 0)
+        self.assertEqual(actual['num_days_since_modified'][2], 1)
+        self.assertEqual(actual['was_modified_by_commit'][0], True)
+        self.assertEqual(actual['was_modified_by_commit'][2], False)
+        self.assertEqual(set(actual['project_name']),
+                         {'blameandshame-test-repo'})
+
+
+    def test_annotate_tree(self):
+        project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
+        version = project.repo.commit("e1d2532")
+        columns = [column_last_commit]
+        results = list(annotate_tree(project, version, columns, batch_size=2))
+        filenames = [f for (f, _) in results]
+        self.assertIn('file-one.txt', filenames)
+        self.assertEqual(set(filenames),
+                         set(project.files_in_version(version)))
+        for (filename, table) in results:
+            self.assertEqual(table,
+                             annotate(project, version, filename, columns))
+
+        results = list(annotate_tree(project, version, paths='file-one.*'))
+        self.assertEqual([f for (f, _) in results], ['file-one.txt'])
+
+        typed = dict(annotate_tree(project, version,
+                                   [file_column_last_commit], typed=True))
+        self.assertEqual(list(typed['file-one.txt']['last_commit']),
+                         ['e1d2532', '922e13d', '922e13d', '0d841d1', '0d841d1'])
+
+
+    def test_skip_rules(self):
+        self.assertTrue(is_binary(b'\x89PNG\r\n\x1a\n\x00\x00'))
+        self.assertFalse(is_binary(b'hello\nworld\n'))
+        self.assertTrue(is_generated('web/app.min.js', b'x'))
+        self.assertTrue(is_generated('proto/foo_pb2.py', b'x'))
+        self.assertTrue(is_generated('main.go',
+                                     b'// Code generated by x. DO NOT EDIT.\n'))
+        self.assertFalse(is_generated('src/app.js', b'let x = 1;\n'))
+
+
     def test_use_different_commit(self):
         def check_one(fun, project, commit, different_commit, filename, line, expected):
             commit = project.repo.commit(commit)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+import git
+from blameandshame.base import Change, Line, LineSet
+from blameandshame.cache import CacheBudget
+from blameandshame.project import Project
+from blameandshame.annotate import annotate, annotate_many, \
+    column_last_commit, column_num_file_commits_after_modified
+from tests.util import call_git, commit, init
+
+
+class SubprocessBackendTestCase(unittest.TestCase):
+    backend = 'subprocess'
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+        init(d)
+        self.shas = [
+            commit(d, {'a.txt': b'one\ntwo\n', 'b.txt': b'x\n'}),
+            commit(d, {'a.txt': b'one\n2\ntwo\n'}),
+            commit(d, {'b.txt': None, 'c.txt': b'z\n'}),
+            commit(d, {'a.txt': b'1\n2\ntwo\n', 'c.txt': b'z\ny'})
+        ]
+        # pack some of the objects, so that both loose and packed objects
+        # are read
+        call_git(d, 'gc', '-q')
+        commit(d, {'a.txt': b'1\n2\nthree\n'})
+        self.project = Project.from_disk(d,
+                                         offline=True,
+                                         backend=self.backend)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_backend(self):
+        self.assertEqual(self.project.backend.name, self.backend)
+
+    def test_commits(self):
+        backend = self.project.backend
+        head = self.project.repo.head.commit
+        self.assertEqual(backend.rev_parse('HEAD'), head.hexsha)
+        self.assertEqual(backend.rev_parse(self.shas[1][:8]), self.shas[1])
+        self.assertIsNone(backend.rev_parse('f' * 40))
+        commit = backend.commit(self.shas[1])
+        self.assertIs(backend.commit(self.shas[1]), commit)
+        self.assertEqual(commit.parents[0].hexsha, self.shas[0])
+        self.assertEqual(commit.author.email, 'a@b')
+        self.assertEqual(backend.commit('HEAD~1').hexsha, self.shas[3])
+
+    def test_commit_budget(self):
+        # memoized commits are held by a bounded table of the project
+        project = Project.from_disk(self.dir.name,
+                                    offline=True,
+                                    backend=self.backend,
+                                    cache_budget={
+                                        'commits': CacheBudget(max_entries=2)
+                                    })
+        for sha in self.shas:
+            self.assertEqual(project.backend.commit(sha).hexsha, sha)
+        self.assertEqual(project.cache_stats()['commits']['entries'], 2)
+        project.clear_caches()
+        self.assertEqual(project.cache_stats()['commits']['entries'], 0)
+
+    def test_files(self):
+        d = self.dir.name
+        os.makedirs(os.path.join(d, 'dir', 'sub'))
+        os.symlink('a.txt', os.path.join(d, 'link'))
+        sha = commit(d, {'dir/sub/x.txt': 'x\n', 'dir/y.txt': 'y\n',
+                         'z.txt': 'z\n'})
+        project = Project.from_disk(d, offline=True, backend=self.backend)
+        files = ['a.txt', 'c.txt', 'dir/sub/x.txt', 'dir/y.txt', 'z.txt']
+        self.assertEqual(project.files_in_version(), files)
+        self.assertEqual(project.backend.files(sha), files)
+        first = project.backend.commit(self.shas[0])
+        self.assertEqual(project.files_in_version(first), ['a.txt', 'b.txt'])
+
+    def test_annotate_many(self):
+        tasks = [(self.shas[1][:8], 'a.txt'), ('f' * 40, 'a.txt')]
+        results = list(annotate_many(self.project, tasks,
+                                     [column_last_commit], jobs=1))
+        self.assertEqual([(r.version, r.filename) for r in results], tasks)
+        self.assertEqual(len(results[0].table), 3)
+        self.assertIsInstance(results[1].error, ValueError)
+
+    def test_blobs(self):
+        blobs = self.project.blobs
+        head = self.project.repo.head.commit.hexsha
+        self.assertEqual(blobs.read(self.shas[0], 'a.txt'), b'one\ntwo\n')
+        self.assertEqual(blobs.read(head, 'a.txt'), b'1\n2\nthree\n')
+        self.assertIsNone(blobs.read(head, 'b.txt'))
+        self.assertIsNone(blobs.read(head, ''))
+        self.assertEqual(blobs.read_many([(self.shas[3], 'c.txt'),
+                                          (self.shas[0], 'c.txt'),
+                                          ('HEAD', 'a.txt')]),
+                         [b'z\ny', None, b'1\n2\nthree\n'])
+        self.assertEqual(blobs.num_lines(self.shas[3], 'c.txt'), 2)
+        self.assertEqual(blobs.lines(self.shas[1], 'a.txt', 2),
+                         [b'2', b'two'])
+
+    def test_queries(self):
+        project = self.project
+        head = project.repo.head.commit
+        versions = [project.backend.commit(sha) for sha in self.shas]
+        self.assertEqual([c.hexsha for c in project.commits_to_file('a.txt')],
+                         [head.hexsha, self.shas[3], self.shas[1],
+                          self.shas[0]])
+        self.assertEqual(
+            [c.hexsha for c in project.last_commits_for_file('a.txt', head)],
+            [self.shas[3], self.shas[1], head.hexsha])
+        self.assertEqual(project.files_in_commit(versions[2]),
+                         frozenset(['b.txt', 'c.txt']))
+        self.assertEqual(project.files_in_commit(versions[3],
+                                                 {Change.MODIFIED}),
+                         frozenset(['a.txt', 'c.txt']))
+        self.assertEqual(project.lines_modified_by_commit(versions[1]),
+                         (LineSet(), LineSet([Line('a.txt', 2)])))
+        self.assertEqual(len(project.commits_to_line('a.txt', 3)), 2)
+        self.assertEqual(project._num_lines_in_file('c.txt'), 2)
+
+        table = annotate(project, head, 'a.txt',
+                         [column_last_commit,
+                          column_num_file_commits_after_modified])
+        self.assertEqual(table, [(1, '1', self.shas[3][:7], '1'),
+                                 (2, '2', self.shas[1][:7], '2'),
+                                 (3, 'three', head.hexsha[:7], '0')])
+
+
+class InProcessBackendTestCase(SubprocessBackendTestCase):
+    backend = 'in-process'
+
+    def test_private_handle(self):
+        # objects are read through the backend's own handle on the repository
+        project = self.project
+        backend = project.backend
+        self.assertNotIsInstance(project.repo.odb, git.GitDB)
+        self.assertIsInstance(backend.objects.odb, git.GitDB)
+        self.assertIs(backend.commit(self.shas[0]).repo, backend.objects)
+        self.assertIs(project.commits_to_file('a.txt')[0].repo,
+                      backend.objects)
+
+    def test_blobless(self):
+        # blobs that are missing from a partial clone are fetched by git
+        d = self.dir.name
+        call_git(d, 'config', 'uploadpack.allowFilter', 'true')
+        clone = os.path.join(d, 'clone.git')
+        call_git(d, 'clone', '-q', '--mirror', '--filter=blob:none',
+                 'file://' + d, clone)
+        project = Project.from_disk(clone,
+                                    offline=True,
+                                    backend=self.backend)
+        self.assertEqual(project.blobs.read(self.shas[1], 'a.txt'),
+                         b'one\n2\ntwo\n')
+        self.assertIsNone(project.blobs.read(self.shas[1], 'c.txt'))
+
+    def test_blobless_histories(self):
+        # blobs that are requested by their hash are fetched, too
+        d = self.dir.name
+        call_git(d, 'config', 'uploadpack.allowFilter', 'true')
+        clone = os.path.join(d, 'clone.git')
+        call_git(d, 'clone', '-q', '--mirror', '--filter=blob:none',
+                 'file://' + d, clone)
+        project = Project.from_disk(clone,
+                                    offline=True,
+                                    backend=self.backend)
+        head = project.repo.head.commit
+        expected = [[c.hexsha for c in h]
+                    for h in self.project.commits_to_lines('a.txt')]
+        actual = [[c.hexsha for c in h]
+                  for h in project.commits_to_lines('a.txt', before=head)]
+        self.assertEqual(len(actual), 3)
+        self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import unittest
+from blameandshame.base import Line, LineSet
+
+
+class LineSetTestCase(unittest.TestCase):
+    def test_membership(self):
+        lines = LineSet([Line('a.c', 3), Line('a.c', 1), Line('b.c', 2)])
+        self.assertEqual(len(lines), 3)
+        self.assertIn(Line('a.c', 3), lines)
+        self.assertNotIn(Line('a.c', 2), lines)
+        self.assertNotIn(Line('c.c', 1), lines)
+        self.assertEqual(list(lines.lines_in('a.c')), [1, 3])
+        self.assertEqual(lines,
+                         frozenset([Line('a.c', 1), Line('a.c', 3),
+                                    Line('b.c', 2)]))
+
+    def test_operations(self):
+        x = LineSet.from_arrays({'a.c': [1, 2, 3], 'b.c': [4]})
+        y = LineSet.from_arrays({'a.c': [3, 4], 'c.c': [5]})
+        self.assertEqual(x & y, frozenset([Line('a.c', 3)]))
+        self.assertEqual(x - y, frozenset([Line('a.c', 1), Line('a.c', 2),
+                                           Line('b.c', 4)]))
+        self.assertEqual(x | y, frozenset(x) | frozenset(y))
+        self.assertEqual(x & frozenset([Line('b.c', 4)]),
+                         frozenset([Line('b.c', 4)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import tempfile
+import unittest
+import git
+from blameandshame.project.blobs import BlobReader, line_offsets
+from tests.util import commit, init
+
+
+class BlobReaderTestCase(unittest.TestCase):
+    def test_line_offsets(self):
+        self.assertEqual(line_offsets(b'').tolist(), [0])
+        self.assertEqual(line_offsets(b'a\nbc\n').tolist(), [0, 2, 5])
+        self.assertEqual(line_offsets(b'a\n\nbc').tolist(), [0, 2, 3, 5])
+
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            files = {'a.txt': b'one\ntwo\n\nfour\n',
+                     'b c.txt': b'x\r\ny',
+                     'big.txt': b'line\n' * 100000}
+            commit(d, files)
+
+            repo = git.Repo(d)
+            sha = repo.head.commit.hexsha
+            reader = BlobReader(repo)
+            self.assertEqual(reader.read(sha, 'a.txt'), files['a.txt'])
+            self.assertEqual(reader.read(sha, 'missing.txt'), None)
+            self.assertEqual(reader.read(sha, ''), None)
+
+            names = sorted(files) * 20 + ['missing.txt']
+            self.assertEqual(reader.read_many((sha, n) for n in names),
+                             [files.get(n) for n in names])
+
+            self.assertEqual(reader.num_lines(sha, 'a.txt'), 4)
+            self.assertEqual(reader.num_lines(sha, 'b c.txt'), 2)
+            self.assertEqual(reader.num_lines(sha, 'big.txt'), 100000)
+            self.assertEqual(reader.num_lines(sha, 'missing.txt'), None)
+            self.assertEqual(reader.lines(sha, 'a.txt'),
+                             [b'one', b'two', b'', b'four'])
+            self.assertEqual(reader.lines(sha, 'a.txt', 2, 4), [b'two', b''])
+            self.assertEqual(reader.lines(sha, 'b c.txt', 2), [b'y'])
+            reader.close()
+
+            # the reader should restart its process after being closed
+            self.assertEqual(reader.num_lines(sha, 'a.txt'), 4)
+            reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
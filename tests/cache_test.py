@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+import numpy as np
+from blameandshame.cache import CacheBudget, DiskCache, MemoryCache, \
+                              approximate_size
+
+
+class DiskCacheTestCase(unittest.TestCase):
+    def test_get_put(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'test.cache')
+            cache = DiskCache(path)
+            self.assertEqual(cache.get('commits_to_repo', 'abc'), None)
+            cache.put('commits_to_repo', 'abc', ['abc', 'def'])
+            self.assertEqual(cache.get('commits_to_repo', 'abc'),
+                             ['abc', 'def'])
+            self.assertEqual(cache.get('commits_to_file', 'abc'), None)
+            self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2})
+            cache.close()
+
+            # results should persist across instances
+            cache = DiskCache(path)
+            self.assertEqual(cache.get('commits_to_repo', 'abc'),
+                             ['abc', 'def'])
+            cache.close()
+
+
+class MemoryCacheTestCase(unittest.TestCase):
+    def test_approximate_size(self):
+        arr = np.zeros(1000, dtype=np.uint32)
+        self.assertGreaterEqual(approximate_size(arr), 4000)
+        self.assertGreaterEqual(approximate_size([arr, arr[:10]]), 4040)
+        self.assertGreater(approximate_size(['a' * 100]), 100)
+
+    def test_lru(self):
+        cache = MemoryCache(CacheBudget(max_entries=2))
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache['a'], 1)
+        cache['c'] = 3
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache['c'], 3)
+        with self.assertRaises(KeyError):
+            cache['d']
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 1)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.bytes, 0)
+
+    def test_max_bytes(self):
+        small = np.zeros(100, dtype=np.uint8)
+        large = np.zeros(10000, dtype=np.uint8)
+        budget = approximate_size(large) + 2 * approximate_size(small)
+
+        cache = MemoryCache(CacheBudget(max_bytes=budget))
+        cache['s1'] = small
+        cache['l'] = large
+        cache['s2'] = small
+        self.assertEqual(len(cache), 3)
+        cache['s3'] = small
+        self.assertNotIn('s1', cache)
+        self.assertLessEqual(cache.bytes, budget)
+
+        # under the size-aware policy, the largest entry is evicted first
+        cache = MemoryCache(CacheBudget(max_bytes=budget, policy='size'))
+        cache['s1'] = small
+        cache['l'] = large
+        cache['s2'] = small
+        cache['s3'] = small
+        self.assertEqual(set(k for k in ('s1', 's2', 's3', 'l')
+                             if k in cache), {'s1', 's2', 's3'})
+
+        # results that exceed the entire budget are never stored
+        cache = MemoryCache(CacheBudget(max_bytes=10))
+        cache['l'] = large
+        self.assertNotIn('l', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_size_heap_compaction(self):
+        # replacing results under the size-aware policy does not grow the
+        # heap used to find the largest result without bound
+        cache = MemoryCache(CacheBudget(max_bytes=10 ** 6, policy='size'))
+        for i in range(1000):
+            cache['k{}'.format(i % 10)] = np.zeros(i % 7, dtype=np.uint8)
+        self.assertEqual(len(cache), 10)
+        self.assertLessEqual(len(cache._MemoryCache__by_size), 20)
+
+        # the largest result is still evicted first once the heap is rebuilt
+        small = np.zeros(100, dtype=np.uint8)
+        large = np.zeros(10000, dtype=np.uint8)
+        budget = approximate_size(large) + 2 * approximate_size(small)
+        cache = MemoryCache(CacheBudget(max_bytes=budget, policy='size'))
+        for _ in range(100):
+            cache['s1'] = small
+        cache['l'] = large
+        cache['s2'] = small
+        cache['s3'] = small
+        self.assertEqual(set(k for k in ('s1', 's2', 's3', 'l')
+                             if k in cache), {'s1', 's2', 's3'})
+
+
+if __name__ == '__main__':
+    unittest.main()
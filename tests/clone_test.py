@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import tempfile
+import unittest
+import git
+from blameandshame.project import CloneStrategy, Project
+from blameandshame.project.clone import mirror_path
+from tests.util import call_git, commit, init
+
+
+def _open(args):
+    url, mirror_dir = args
+    project = Project.from_url(url,
+                               strategy=CloneStrategy.MIRROR,
+                               mirror_dir=mirror_dir)
+    return project.repo.git_dir
+
+
+class CloneTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.origin = os.path.join(self.dir.name, 'origin', 'repo')
+        self.mirrors = os.path.join(self.dir.name, 'mirrors')
+        self.url = 'file://' + self.origin
+        init(self.origin)
+        call_git(self.origin, 'config', 'uploadpack.allowFilter', 'true')
+        self.commit('a\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def commit(self, contents):
+        return commit(self.origin, {'x.txt': contents})
+
+    def test_mirror_path(self):
+        self.assertEqual(mirror_path('https://github.com/google/protobuf',
+                                     '/m'),
+                         '/m/github.com/google/protobuf.git')
+        self.assertEqual(mirror_path('https://github.com/google/protobuf.git',
+                                     '/m'),
+                         '/m/github.com/google/protobuf.git')
+
+    def test_mirror(self):
+        project = Project.from_url(self.url,
+                                   strategy=CloneStrategy.MIRROR,
+                                   mirror_dir=self.mirrors)
+        self.assertTrue(project.repo.bare)
+        self.assertEqual(project.name, 'repo')
+        self.assertEqual(project.repo.git_dir,
+                         mirror_path(self.url, self.mirrors))
+        head = project.repo.head.commit
+        self.assertEqual(project.last_commit_to_line('x.txt', 1, head), head)
+
+        # existing mirrors are updated, rather than cloned again
+        tip = self.commit('a\nb\n')
+        project = Project.from_url(self.url,
+                                   strategy=CloneStrategy.MIRROR,
+                                   mirror_dir=self.mirrors)
+        self.assertEqual(project.repo.head.commit.hexsha, tip)
+
+    def test_blobless(self):
+        tip = self.commit('a\nb\n')
+        project = Project.from_url(self.url,
+                                   strategy=CloneStrategy.BLOBLESS,
+                                   mirror_dir=self.mirrors)
+        repo = project.repo
+        self.assertEqual(repo.config_reader().get_value(
+            'remote "origin"', 'partialclonefilter'), 'blob:none')
+        missing = repo.git.rev_list('--objects', '--missing=print', 'HEAD')
+        self.assertIn('?', missing)
+
+        # contents are fetched on demand
+        version = repo.commit(tip)
+        self.assertEqual(project.blobs.num_lines(tip, 'x.txt'), 2)
+        last = project.last_commits_for_file('x.txt', version)
+        self.assertEqual([c.hexsha for c in last],
+                         [version.parents[0].hexsha, tip])
+
+    def test_blobless_failure(self):
+        tip = self.commit('a\nb\n')
+        project = Project.from_url(self.url,
+                                   persistent_cache=True,
+                                   strategy=CloneStrategy.BLOBLESS,
+                                   mirror_dir=self.mirrors)
+        version = project.repo.commit(tip)
+
+        # a blob that cannot be fetched is not remembered as an empty file
+        moved = self.origin + '.moved'
+        os.rename(self.origin, moved)
+        for _ in range(2):
+            self.assertRaises(git.exc.GitCommandError,
+                              project.last_commits_for_file, 'x.txt', version)
+        self.assertEqual(
+            project.last_commits_for_file('missing.txt', version), [])
+        os.rename(moved, self.origin)
+        last = project.last_commits_for_file('x.txt', version)
+        self.assertEqual([c.hexsha for c in last],
+                         [version.parents[0].hexsha, tip])
+
+    def test_parallel(self):
+        args = [(self.url, self.mirrors)] * 4
+        with multiprocessing.Pool(4) as pool:
+            paths = pool.map(_open, args)
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(paths[0]))),
+                         ['repo.git', 'repo.git.lock'])
+
+
+if __name__ == '__main__':
+    unittest.main()
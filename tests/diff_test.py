@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+import git
+from blameandshame.base import Change, Line
+from blameandshame.project.diff import iter_diff, parse_hunk_header, \
+                                       unquote_path, DiffSummary, Hunk
+from blameandshame.cache import approximate_size
+from blameandshame.project import Project
+from tests.util import commit, init
+
+
+class DiffTestCase(unittest.TestCase):
+    def test_parse_hunk_header(self):
+        self.assertEqual(parse_hunk_header(b'@@ -3 +3,2 @@ int main() {'),
+                         Hunk(3, 1, 3, 2))
+        self.assertEqual(parse_hunk_header(b'@@ -7,0 +8 @@'),
+                         Hunk(7, 0, 8, 1))
+        self.assertEqual(parse_hunk_header(b'-@@ -7,0 +8 @@'), None)
+
+    def test_unquote_path(self):
+        self.assertEqual(unquote_path(b'foo/bar.c'), 'foo/bar.c')
+        self.assertEqual(unquote_path(b'"tab\\tname.txt"'), 'tab\tname.txt')
+        self.assertEqual(unquote_path(b'"\\303\\251.txt"'), 'é.txt')
+
+    def test_iter_diff(self):
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            commit(d, {'x.txt': b'a\nb\nc\n', 'b.dat': b'bin\0ary'})
+            os.rename(os.path.join(d, 'x.txt'), os.path.join(d, 'y.txt'))
+            commit(d, {'y.txt': b'a\nB\nc\nd\n', 'b.dat': b'bin\0ary2',
+                    'n.txt': b'\xff\n'})
+
+            repo = git.Repo(d)
+            diffs = {(f.a_path, f.b_path): f
+                     for f in iter_diff(repo, 'HEAD~1', 'HEAD')}
+            self.assertEqual(set(diffs.keys()),
+                             {('b.dat', 'b.dat'),
+                              (None, 'n.txt'),
+                              ('x.txt', 'y.txt')})
+            self.assertTrue(diffs[('b.dat', 'b.dat')].binary)
+            self.assertEqual(diffs[(None, 'n.txt')].status, 'A')
+            renamed = diffs[('x.txt', 'y.txt')]
+            self.assertEqual(renamed.status, 'R')
+            self.assertEqual(list(renamed.old_lines), [2])
+            self.assertEqual(list(renamed.new_lines), [2, 4])
+
+            summary = DiffSummary(iter_diff(repo, 'HEAD~1', 'HEAD'))
+            self.assertEqual(summary.old_lines,
+                             frozenset([Line('x.txt', 2)]))
+            self.assertEqual(summary.new_lines,
+                             frozenset([Line('y.txt', 2), Line('y.txt', 4),
+                                        Line('n.txt', 1)]))
+            self.assertEqual(summary.files({Change.MODIFIED}),
+                             frozenset(['b.dat', 'x.txt']))
+            self.assertEqual(summary.files({Change.ADDED}),
+                             frozenset(['n.txt']))
+
+
+    def test_static_compatibility(self):
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            commit(d, {'x.txt': 'a\nb\n'})
+            commit(d, {'x.txt': 'a\nB\nc\n'})
+            project = Project.from_disk(d, offline=True)
+            head = project.repo.head.commit
+            parent = head.parents[0]
+            expected = ({Line('x.txt', 2)},
+                        {Line('x.txt', 2), Line('x.txt', 3)})
+
+            # the methods used to be static, and may still be used as such
+            with self.assertWarns(DeprecationWarning):
+                modified = Project.lines_modified_by_commit(head)
+            self.assertEqual(modified, expected)
+            with self.assertWarns(DeprecationWarning):
+                modified = Project.lines_modified_between_commits(
+                    parent, head, in_files=['x.txt'])
+            self.assertEqual(modified, expected[0])
+
+            self.assertEqual(project.lines_modified_by_commit(head), expected)
+            self.assertEqual(Project.lines_modified_by_commit(project, head),
+                             expected)
+
+    def test_cached_size(self):
+        # the lines of a diff are counted by the cache that holds it
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            body = ''.join('{}\n'.format(i) for i in range(1000))
+            commit(d, {'x.txt': body})
+            commit(d, {'x.txt': body.replace('1', 'one')})
+            project = Project.from_disk(d, offline=True)
+            version = project.repo.head.commit
+            diff = project._diff(version.parents[0], version)
+            size = project.cache_stats()['diffs']['bytes']
+            self.assertEqual(len(diff.old_lines), len(diff.new_lines))
+            self.assertEqual(size, approximate_size(diff))
+
+
+if __name__ == '__main__':
+    unittest.main()
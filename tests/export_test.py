@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import csv
+import json
+import os
+import tempfile
+import unittest
+from blameandshame.project import Project
+from blameandshame.annotate import annotate_table, \
+    file_column_last_commit, \
+    file_column_last_modified, \
+    file_column_was_modified_by_commit
+from blameandshame.export import Exporter, export, open_exporter
+from tests.util import commit, init
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+COLUMNS = [file_column_last_commit,
+           file_column_last_modified,
+           file_column_was_modified_by_commit]
+FIELDS = ['version', 'filename', 'num', 'line', 'last_commit',
+          'last_modified', 'was_modified_by_commit']
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.repo_dir = os.path.join(self.dir.name, 'repo')
+        init(self.repo_dir)
+        commit(self.repo_dir, {'README': 'readme\n'})
+        self.first = commit(self.repo_dir, {'a.txt': 'one\ntwo\n',
+                                             'b.txt': 'x\n',
+                                             'empty.txt': ''})
+        self.second = commit(self.repo_dir, {'a.txt': 'one\n2\n'})
+        self.project = Project.from_disk(self.repo_dir, offline=True)
+        self.tasks = [(self.first, 'a.txt'),
+                      (self.second, 'a.txt'),
+                      (self.second, 'empty.txt'),
+                      (self.second, 'missing.txt'),
+                      (self.second, 'b.txt')]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_csv(self):
+        path = self._path('out.csv')
+        failures = export(self.project, self.tasks, path, COLUMNS)
+        self.assertEqual([(f.version, f.filename) for f in failures],
+                         [(self.second, 'missing.txt')])
+        with open(path, newline='') as fh:
+            rows = list(csv.reader(fh))
+        self.assertEqual(rows[0], FIELDS)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[3][:5],
+                         [self.second, 'a.txt', '1', 'one', self.first[:7]])
+        self.assertEqual(rows[4][3:5], ['2', self.second[:7]])
+        self.assertEqual(rows[4][6], 'true')
+        self.assertEqual(rows[5][6], 'false')
+
+        # appending adds rows, without repeating the header
+        export(self.project, self.tasks[:1], path, COLUMNS, append=True)
+        with open(path, newline='') as fh:
+            rows = list(csv.reader(fh))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[6][:2], [self.first, 'a.txt'])
+
+        # the fields of appended tables must match
+        with self.assertRaises(ValueError):
+            export(self.project, self.tasks[:1], path, COLUMNS[:1],
+                   append=True)
+
+    def test_jsonl(self):
+        path = self._path('out.jsonl')
+        export(self.project, self.tasks, path, COLUMNS)
+        with open(path) as fh:
+            rows = [json.loads(line) for line in fh]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(list(rows[0].keys()), FIELDS)
+        self.assertEqual(rows[3]['num'], 2)
+        self.assertIs(rows[3]['was_modified_by_commit'], True)
+
+        export(self.project, self.tasks[:1], path, COLUMNS)
+        with open(path) as fh:
+            self.assertEqual(len(fh.readlines()), 2)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            open_exporter(self._path('out.txt'))
+        with self.assertRaises(ValueError):
+            open_exporter(self._path('out'), format='xml')
+
+    def test_incomplete_exporter(self):
+        # exporters that do not implement every hook cannot be created
+        class NoClose(Exporter):
+            def _open(self, fields, dtype):
+                pass
+
+            def _write(self, version, filename, table):
+                pass
+
+        with self.assertRaises(TypeError):
+            NoClose(self._path('out'))
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_parquet(self):
+        path = self._path('out.parquet')
+        export(self.project, self.tasks, path, COLUMNS)
+        export(self.project, self.tasks[:1], path, COLUMNS, append=True)
+        parts = sorted(os.listdir(path))
+        self.assertEqual(parts, ['part-00000.parquet', 'part-00001.parquet'])
+
+        first = pyarrow.parquet.ParquetFile(os.path.join(path, parts[0]))
+        self.assertEqual(first.num_row_groups, 3)
+        self.assertEqual(first.schema_arrow.names, FIELDS)
+        self.assertEqual(str(first.schema_arrow.field('num').type), 'int64')
+        self.assertEqual(str(first.schema_arrow.field('last_modified').type),
+                         'timestamp[ms]')
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, 7)
+
+        # overwriting replaces every part
+        export(self.project, self.tasks[:1], path, COLUMNS)
+        self.assertEqual(os.listdir(path), ['part-00000.parquet'])
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_abort(self):
+        path = self._path('out.parquet')
+        export(self.project, self.tasks[:1], path, COLUMNS)
+
+        # a part that is interrupted by an error is never published
+        version = self.project.repo.commit(self.second)
+        table = annotate_table(self.project, version, 'a.txt', COLUMNS)
+        with self.assertRaises(KeyboardInterrupt):
+            with open_exporter(path, append=True) as exporter:
+                exporter.write(self.second, 'a.txt', table)
+                raise KeyboardInterrupt
+        self.assertEqual(os.listdir(path), ['part-00000.parquet'])
+
+    @unittest.skipIf(pyarrow is None, 'requires pyarrow')
+    def test_arrow(self):
+        path = self._path('out.arrow')
+        export(self.project, self.tasks, path, COLUMNS)
+        with pyarrow.ipc.open_file(os.path.join(path, 'part-00000.arrow')) \
+                as reader:
+            self.assertEqual(reader.num_record_batches, 3)
+            table = reader.read_all()
+        self.assertEqual(table.column('line').to_pylist(),
+                         ['one', 'two', 'one', '2', 'x'])
+
+        with self.assertRaises(ValueError):
+            export(self.project, self.tasks[:1], path, COLUMNS[:1],
+                   append=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
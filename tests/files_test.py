@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import tempfile
+import unittest
+import git
+import numpy as np
+from blameandshame.cache import CacheBudget, approximate_size
+from blameandshame.project import Project
+from blameandshame.project.files import FileHistoryIndex
+from blameandshame.project.graph import CommitGraph
+from tests.util import call_git, commit, init
+
+
+# a file whose contents are large enough for its renames to be detected
+BODY = ''.join('line {}\n'.format(i) for i in range(20))
+
+
+class FileHistoryIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+        init(d)
+        self.shas = [
+            commit(d, {'a.txt': BODY, 'b.txt': 'b\n'}),
+            commit(d, {'a.txt': BODY + 'more\n'}),
+        ]
+        call_git(d, 'checkout', '-q', '-b', 'topic')
+        self.shas.append(commit(d, {'b.txt': 'b\nb\n'}))
+        self.shas.append(commit(d, {'a.txt': None,
+                                     'renamed.txt': BODY + 'more\n'}))
+        call_git(d, 'checkout', '-q', 'master')
+        self.shas.append(commit(d, {'copy.txt': BODY + 'more\n'}))
+        self.shas.append(commit(d, {'b.txt': 'c\n'}))
+        call_git(d, 'merge', '-q', '--no-edit', '-X', 'theirs', 'topic')
+        self.shas.append(commit(d, {'renamed.txt': BODY + 'again\n',
+                                     'b.txt': None}))
+        self.shas.append(commit(d, {'b.txt': 'new\n'}))
+        self.repo = git.Repo(d)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _follow(self, after, before, path):
+        rev_range = '{}..{}'.format(after, before) if after else before
+        return call_git(self.dir.name, 'log', '--format=%H', '--follow',
+                    rev_range, '--', path).split()
+
+    def test_matches_git_log(self):
+        graph = CommitGraph.build(self.repo)
+        index = FileHistoryIndex.build(self.repo, graph)
+        self.assertEqual(set(index.paths),
+                         {'a.txt', 'b.txt', 'renamed.txt', 'copy.txt'})
+        self.assertNotIn('missing.txt', index)
+
+        heads = self.shas + [self.repo.head.commit.hexsha]
+        for before in heads:
+            for after in [None] + self.shas:
+                for path in index.paths:
+                    expected = self._follow(after, before, path)
+                    actual = index.commits(path, after, before)
+                    self.assertEqual(actual, expected,
+                                     (after, before, path))
+
+    def test_ancestors(self):
+        graph = CommitGraph.build(self.repo)
+        heads = self.shas + [self.repo.head.commit.hexsha]
+        # query from the root upwards, so that later searches are cut short
+        # by the ancestors memoized by earlier ones
+        for before in heads:
+            expected = set(call_git(self.dir.name, 'rev-list',
+                                    before).split())
+            marked = graph.ancestors(before)
+            self.assertEqual({graph.sha(i) for i in range(len(graph))
+                              if marked[i]}, expected)
+            for after in [None] + self.shas:
+                rev_range = '{}..{}'.format(after, before) if after \
+                    else before
+                count = len(call_git(self.dir.name, 'rev-list',
+                                     rev_range).split())
+                self.assertEqual(graph.count(after, before), count,
+                                 (after, before))
+
+    def test_ancestors_cache(self):
+        budget = CacheBudget(max_entries=2)
+        project = Project.from_disk(self.dir.name,
+                                    offline=True,
+                                    cache_budget={'ancestors': budget})
+        head = project.repo.head.commit
+        for sha in self.shas:
+            after = project.repo.commit(sha)
+            self.assertEqual(project.count_commits_to_repo(after, head),
+                             len(project.commits_to_repo(after, head)))
+        stats = project.cache_stats()['ancestors']
+        self.assertEqual(stats['entries'], 2)
+        self.assertGreater(stats['evictions'], 0)
+        # each bitset holds one bit per commit
+        bitset = np.packbits(np.zeros(len(project.commit_graph), dtype=bool))
+        self.assertEqual(stats['bytes'], 2 * approximate_size(bitset))
+
+        project.clear_caches()
+        self.assertEqual(project.cache_stats()['ancestors']['entries'], 0)
+        self.assertEqual(project.count_commits_to_repo(before=head),
+                         len(project.commits_to_repo(before=head)))
+
+    def test_orders_cache(self):
+        budget = CacheBudget(max_entries=1)
+        project = Project.from_disk(self.dir.name,
+                                    offline=True,
+                                    index_files=True,
+                                    cache_budget={'orders': budget})
+        for sha in self.shas:
+            before = project.repo.commit(sha)
+            commits = project.commits_to_file('b.txt', before=before)
+            self.assertEqual([c.hexsha for c in commits],
+                             self._follow(None, sha, 'b.txt'))
+        stats = project.cache_stats()['orders']
+        self.assertEqual(stats['entries'], 1)
+        self.assertGreater(stats['evictions'], 0)
+
+        project.clear_caches()
+        self.assertEqual(project.cache_stats()['orders']['entries'], 0)
+
+    def test_project(self):
+        project = Project.from_disk(self.dir.name,
+                                    offline=True,
+                                    index_files=True)
+        self.assertTrue(project.index_files)
+        head = project.repo.head.commit
+        for path in ('renamed.txt', 'b.txt', 'copy.txt'):
+            commits = project.commits_to_file(path, before=head)
+            self.assertEqual([c.hexsha for c in commits],
+                             self._follow(None, head.hexsha, path))
+        after = project.repo.commit(self.shas[1])
+        commits = project.commits_to_file('renamed.txt', after=after,
+                                          before=head)
+        self.assertEqual([c.hexsha for c in commits],
+                         self._follow(self.shas[1], head.hexsha,
+                                      'renamed.txt'))
+        self.assertEqual(len(project.file_index), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import tempfile
+import unittest
+from blameandshame.project import Project
+from blameandshame.project.functions import Function, find_function, \
+    funcname_pattern, function_spans
+from tests.util import commit, init
+
+
+SOURCE = ['import os',
+          '',
+          'class Foo(object):',
+          '    def bar(self):',
+          '        return 1',
+          '',
+          '    async def baz(self):',
+          '        return 2',
+          '',
+          'def qux():',
+          '    pass']
+
+
+class FunctionsTestCase(unittest.TestCase):
+    def test_function_spans(self):
+        # git's default rule only recognises unindented lines
+        self.assertEqual(function_spans(SOURCE),
+                         [Function('import os', 1, 2),
+                          Function('class Foo(object):', 3, 9),
+                          Function('def qux():', 10, 11)])
+
+        pattern = funcname_pattern('foo.py')
+        self.assertEqual(function_spans(SOURCE, pattern),
+                         [Function('class Foo(object):', 3, 3),
+                          Function('    def bar(self):', 4, 6),
+                          Function('    async def baz(self):', 7, 9),
+                          Function('def qux():', 10, 11)])
+        self.assertEqual(funcname_pattern('foo.txt'), None)
+
+    def test_negated_patterns(self):
+        lines = ['int f(int x) {',
+                 '  if (x) {',
+                 '  }',
+                 '}']
+        pattern = '!^[ \t]*if\n^[ \t]*[a-z]+ [a-z]+\\('
+        self.assertEqual(function_spans(lines, pattern),
+                         [Function('int f(int x) {', 1, 4)])
+
+    def test_find_function(self):
+        pattern = funcname_pattern('foo.py')
+        self.assertEqual(find_function(SOURCE, 'baz', pattern),
+                         Function('    async def baz(self):', 7, 9))
+        # matching lines that do not start a function are ignored
+        self.assertEqual(find_function(SOURCE, 'return', pattern), None)
+        self.assertEqual(find_function(SOURCE, 'bar'), None)
+        self.assertEqual(find_function(SOURCE, 'Foo'),
+                         Function('class Foo(object):', 3, 9))
+
+
+class FunctionHistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+        init(d)
+        versions = [
+            SOURCE,
+            SOURCE[:4] + ['        return 10'] + SOURCE[5:],
+            SOURCE + ['', 'def quux():', '    pass'],
+            SOURCE[:2] + ['def first():', '    pass', ''] +
+            SOURCE[2:7] + ['        return 20'] + SOURCE[8:] +
+            ['', 'def quux():', '    return None']
+        ]
+        for contents in versions:
+            commit(d, {'code.py': '\n'.join(contents) + '\n'})
+        self.project = Project.from_disk(d, offline=True)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _git_log(self, regex, pattern):
+        attributes = os.path.join(self.dir.name, 'attributes')
+        with open(attributes, 'w') as f:
+            f.write('*.py diff=python\n' if pattern else '')
+        out = subprocess.check_output(
+            ['git', '-c', 'core.attributesFile=' + attributes, 'log',
+             '--format=%H', '-s', '-L', ':{}:code.py'.format(regex)],
+            cwd=self.dir.name)
+        return out.decode().split()
+
+    def test_matches_git_log(self):
+        for pattern in (None, funcname_pattern('code.py')):
+            histories = self.project.function_histories('code.py',
+                                                        funcname=pattern)
+            self.assertTrue(histories)
+            for (function, commits) in histories:
+                regex = '^' + function.header.split('(')[0]
+                expected = self._git_log(regex, pattern)
+                self.assertEqual([c.hexsha for c in commits], expected,
+                                 function)
+                actual = self.project.commits_to_function('code.py', regex,
+                                                          funcname=pattern)
+                self.assertEqual(actual, commits)
+
+    def test_missing(self):
+        with self.assertRaises(ValueError):
+            self.project.commits_to_function('code.py', 'nothing')
+        with self.assertRaises(ValueError):
+            self.project.function_histories('missing.py')
+
+    def test_disk_keys(self):
+        # funcname patterns and filenames that contain ':' are stored under
+        # distinct keys
+        d = self.dir.name
+        commit(d, {'a:b.py': 'def f():\n    pass\n', 'b.py': 'x = 1\n'})
+        cache = os.path.join(d, 'cache.db')
+        project = Project.from_disk(d, cache_path=cache, offline=True)
+        self.assertEqual(len(project.function_histories('a:b.py',
+                                                        funcname='^def')), 1)
+        project = Project.from_disk(d, cache_path=cache, offline=True)
+        self.assertEqual(project.function_histories('b.py',
+                                                    funcname='^def:a'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import unittest
+from blameandshame.project.history import map_across_diff, parse_hunks
+
+
+class HistoryTestCase(unittest.TestCase):
+    def test_parse_hunks(self):
+        patch = [b'diff --git a/x b/x',
+                 b'@@ -3 +3 @@',
+                 b'-foo',
+                 b'+bar',
+                 b'@@ -7,0 +8,2 @@ context',
+                 b'+baz',
+                 b'+qux',
+                 b'@@ -10,2 +11,0 @@']
+        self.assertEqual(parse_hunks(patch),
+                         ([(2, 3), (7, 7), (9, 11)],
+                          [(2, 3), (7, 9), (11, 11)]))
+
+    def test_map_across_diff(self):
+        def check_one(ranges, hunks, expected):
+            self.assertEqual(map_across_diff(ranges, hunks), expected)
+
+        # a single modified line
+        hunks = ([(2, 3)], [(2, 3)])
+        check_one([(2, 3)], hunks, (True, [(2, 3)]))
+        check_one([(5, 6)], hunks, (False, [(5, 6)]))
+
+        # lines inserted above are shifted away
+        hunks = ([(1, 1)], [(1, 3)])
+        check_one([(5, 6)], hunks, (False, [(3, 4)]))
+        check_one([(1, 2)], hunks, (True, []))
+
+        # a touched line expands to the whole parent side of the hunk
+        hunks = ([(4, 7)], [(4, 5)])
+        check_one([(4, 5)], hunks, (True, [(4, 7)]))
+
+        # deletions only touch ranges that strictly surround them
+        hunks = ([(4, 6)], [(4, 4)])
+        check_one([(4, 5)], hunks, (False, [(6, 7)]))
+        check_one([(3, 5)], hunks, (True, [(3, 7)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
+import os
+import tempfile
 import unittest
 from typing import List, Dict
 from blameandshame.observation import Observation
+from blameandshame.project import Project
 from blameandshame.base import Line
+from tests.util import commit, init
 
 
 class ObservationTestCase(unittest.TestCase):
@@ -45,3 +49,64 @@ class ObservationTestCase(unittest.TestCase):
 
         test_one('https://github.com/squaresLab/blameandshame-test-repo', 'a351329',
                  {'testfile.c': [8, 25]})
+
+
+class LocalObservationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.repos = []
+        for name in ('one', 'two'):
+            path = os.path.join(self.dir.name, name)
+            init(path)
+            shas = [commit(path, {'a.c': 'a\nb\nc\n', 'b.c': 'x\n',
+                                   'gone.c': 'g\n'}),
+                    commit(path, {'a.c': 'a\nB\nc\n', 'b.c': 'x\ny\n',
+                                   'gone.c': None, 'new.c': 'n\n'}),
+                    commit(path, {'a.c': 'A\nB\nc\n'})]
+            self.repos.append((path, shas))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_single_diff(self):
+        (path, shas) = self.repos[0]
+        project = Project.from_disk(path, offline=True)
+        project.enable_stats()
+        obs = Observation(project,
+                          project.repo.commit(shas[0]),
+                          project.repo.commit(shas[1]))
+        self.assertEqual(obs.modified_files, frozenset(['a.c', 'b.c']))
+        self.assertEqual(obs.modified_lines, frozenset([Line('a.c', 2)]))
+        self.assertEqual(obs.modified_files, frozenset(['a.c', 'b.c']))
+        self.assertEqual(project.stats()['git']['diff-tree']['calls'], 1)
+
+        limited = Observation(project,
+                              project.repo.commit(shas[0]),
+                              project.repo.commit(shas[1]),
+                              paths=['b.c'])
+        self.assertEqual(limited.modified_files, frozenset(['b.c']))
+        self.assertEqual(limited.modified_lines, frozenset())
+
+    def test_load_many(self):
+        specs = []
+        for (path, shas) in self.repos:
+            specs += [(path, shas[0], shas[1]), (path, shas[1], shas[2])]
+        opened = []
+
+        def open_project(url: str) -> Project:
+            opened.append(url)
+            return Project.from_disk(url, offline=True)
+
+        observations = Observation.load_many(specs, jobs=2,
+                                             open_project=open_project,
+                                             prefetch=True)
+        self.assertEqual(sorted(opened), sorted(p for (p, _) in self.repos))
+        self.assertEqual([(o.before.hexsha, o.after.hexsha)
+                          for o in observations],
+                         [(b, a) for (_, b, a) in specs])
+        self.assertIs(observations[0].project, observations[1].project)
+        # commits are looked up through the project's backend
+        self.assertIs(observations[1].before, observations[0].after)
+        self.assertIsNot(observations[0].project, observations[2].project)
+        self.assertEqual(observations[3].modified_lines,
+                         frozenset([Line('a.c', 1)]))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import tempfile
+import unittest
+from blameandshame.project import Project
+from tests.util import commit, init
+
+
+ALICE = ('Alice', 'alice@example.com')
+ALIAS = ('alice', 'alice@old.example.com')
+BOB = ('Bob', 'bob@example.com')
+BODY = ''.join('line {}\n'.format(i) for i in range(10))
+
+
+class OwnershipTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        d = self.dir.name
+        init(d)
+        commit(d, {'a.txt': BODY, 'b.txt': 'b\n',
+                   '.mailmap': 'Alice <alice@example.com> '
+                               '<alice@old.example.com>\n'},
+               author=ALICE, when=1000)
+        commit(d, {'a.txt': BODY + 'bob\n'}, author=BOB, when=2000)
+        commit(d, {'b.txt': 'b\nc\n'}, author=ALIAS, when=3000)
+        sha = commit(d, {'a.txt': None, 'moved.txt': BODY + 'bob\n'},
+                     author=BOB, when=4000)
+        self.project = Project.from_disk(d, offline=True)
+        self.version = self.project.repo.commit(sha)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _entry(self, matrix, table, filename, author):
+        row = matrix.files.index(filename)
+        col = [(a.name, a.email) for a in matrix.authors].index(author)
+        return getattr(matrix, table)[row, col]
+
+    def test_ownership(self):
+        matrix = self.project.ownership(self.version)
+        self.assertEqual(matrix.files, ['.mailmap', 'b.txt', 'moved.txt'])
+        self.assertEqual({(a.name, a.email) for a in matrix.authors},
+                         {ALICE, BOB})
+        self.assertEqual(matrix.commits.shape, (3, 2))
+
+        self.assertEqual(self._entry(matrix, 'commits', 'b.txt', ALICE), 2)
+        self.assertEqual(self._entry(matrix, 'commits', 'b.txt', BOB), 0)
+        self.assertEqual(self._entry(matrix, 'commits', 'moved.txt', ALICE),
+                         1)
+        self.assertEqual(self._entry(matrix, 'commits', 'moved.txt', BOB), 2)
+
+        self.assertEqual(self._entry(matrix, 'lines', 'b.txt', ALICE), 2)
+        self.assertEqual(self._entry(matrix, 'lines', 'moved.txt', ALICE),
+                         10)
+        self.assertEqual(self._entry(matrix, 'lines', 'moved.txt', BOB), 1)
+
+        self.assertEqual(
+            self._entry(matrix, 'last_touched', 'b.txt', ALICE), 3000)
+        self.assertEqual(
+            self._entry(matrix, 'last_touched', 'moved.txt', ALICE), 1000)
+        self.assertEqual(
+            self._entry(matrix, 'last_touched', 'moved.txt', BOB), 4000)
+
+        without_blame = self.project.ownership(self.version, blame=False)
+        self.assertEqual(without_blame.lines.nnz, 0)
+        self.assertEqual((without_blame.commits != matrix.commits).nnz, 0)
+
+    def test_extend(self):
+        d = self.dir.name
+        matrix = self.project.ownership(self.version)
+        carol = ('Carol', 'carol@example.com')
+        commit(d, {'moved.txt': 'carol\n' + BODY + 'bob\n',
+                   'c.txt': 'c\n'}, author=carol, when=5000)
+        sha = commit(d, {'b.txt': None}, author=ALICE, when=6000)
+        version = self.project.repo.commit(sha)
+
+        matrix.extend(version)
+        self.assertEqual(matrix.version, version)
+        rebuilt = self.project.ownership(version)
+        self.assertEqual(matrix.files, ['.mailmap', 'c.txt', 'moved.txt'])
+        self.assertEqual(matrix.files, rebuilt.files)
+        self.assertEqual(matrix.authors, rebuilt.authors)
+        for table in ('commits', 'lines', 'last_touched'):
+            expected = getattr(rebuilt, table)
+            self.assertEqual((getattr(matrix, table) != expected).nnz, 0)
+        self.assertEqual(self._entry(matrix, 'lines', 'moved.txt', carol), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
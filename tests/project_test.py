@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 import os
+import tempfile
 import unittest
 from blameandshame.project  import Project
 from blameandshame.base     import Change, Commits, Line
 from datetime import timedelta
+from tests.util import call_git, commit, init
 
 class ProjectTestCase(unittest.TestCase):
     def test_url_to_path(self):
@@ -75,6 +77,22 @@ class ProjectTestCase(unittest.TestCase):
         check_one(project, ['422cab3', '964adc5'],
                   before = '422cab3')
 
+    def test_count_commits_to_repo(self):
+        def check_one(project, expected, after = None, before = None):
+            after_commit = project.repo.commit(after) if after else None
+            before_commit = project.repo.commit(before) if before else None
+            self.assertEqual(
+                project.count_commits_to_repo(after = after_commit,
+                                              before = before_commit),
+                expected
+            )
+
+        project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
+        check_one(project, 3, after = '2282c66', before = 'e1d2532')
+        check_one(project, 2, after = '964adc5', before = '922e13d')
+        check_one(project, 0, after = '2282c66', before = '2282c66')
+        check_one(project, 2, before = '422cab3')
+
     def test_commits_to_file(self):
         def check_one(project, filename, expected, after = None, before = None):
             expected = [project.repo.commit(sha) for sha in expected]
@@ -111,6 +129,25 @@ class ProjectTestCase(unittest.TestCase):
         project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
         check_one(project, 'file.txt', 1, ['922e13d', '422cab3'])
 
+    def test_commits_to_lines(self):
+        project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
+        before = project.repo.commit('922e13d')
+        histories = project.commits_to_lines('file.txt', before=before)
+        self.assertEqual(histories[0],
+                         [project.repo.commit(sha) for sha in ['922e13d', '422cab3']])
+
+        # each history should match the result of `git log -L`
+        before = project.repo.commit('e1d2532')
+        histories = project.commits_to_lines('file-one.txt', before=before)
+        self.assertEqual(len(histories), 5)
+        for (i, history) in enumerate(histories, 1):
+            log = project.repo.git.log(before.hexsha,
+                                       format='commit %H',
+                                       L='{},{}:file-one.txt'.format(i, i))
+            expected = [project.repo.commit(l[7:]) for l in log.splitlines()
+                        if l.startswith('commit ')]
+            self.assertEqual(history, expected)
+
 
     def test_authors_of_file(self):
         def check_one(project, filename, before, expected):
@@ -140,6 +177,45 @@ class ProjectTestCase(unittest.TestCase):
         check_one(project, 'file-one.txt', 1, '422cab3', None)
         check_one(project, 'file-one.txt', 1, 'e1d2532', 'e1d2532')
 
+    def test_last_commit_to_line_bounds(self):
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            sha = commit(d, {'x.txt': 'a\nb\n'})
+            project = Project.from_disk(d, offline=True)
+            version = project.repo.commit(sha)
+            self.assertEqual(project.last_commit_to_line('x.txt', 2, version),
+                             version)
+            for lineno in (0, -1, 3):
+                self.assertRaises(ValueError, project.last_commit_to_line,
+                                  'x.txt', lineno, version)
+            self.assertIsNone(
+                project.last_commit_to_line('missing.txt', 1, version))
+
+    def test_last_commits_for_file(self):
+        def check_one(project, filename, before, expected):
+            before = project.repo.commit(before)
+            expected = [project.repo.commit(sha) for sha in expected]
+            actual = project.last_commits_for_file(filename, before)
+            self.assertEqual(actual, expected)
+
+        project = Project.from_url('https://github.com/squaresLab/blameandshame-test-repo')
+        check_one(project, 'file-one.txt', 'e1d2532',
+                  ['e1d2532', '922e13d', '922e13d', '0d841d1', '0d841d1'])
+        check_one(project, 'file-one.txt', '422cab3', [])
+
+    def test_incremental_blame(self):
+        url = 'https://github.com/squaresLab/blameandshame-test-repo'
+        full = Project.from_url(url)
+        project = Project.from_disk(full.repo.working_dir,
+                                    offline=True,
+                                    incremental_blame=True)
+        shas = project.repo.git.rev_list('--topo-order', '--reverse', 'HEAD')
+        for sha in shas.split():
+            version = project.repo.commit(sha)
+            self.assertEqual(
+                project.last_commits_for_file('file-one.txt', version),
+                full.last_commits_for_file('file-one.txt', version))
+
 
     def test_lines_modified_by_commit(self):
         project = Project.from_url('https://github.com/google/protobuf')
@@ -257,5 +333,38 @@ class ProjectTestCase(unittest.TestCase):
         self.assertRaises(ValueError,
                           lambda: project.age_commits_line(project, 0, '', None, 0))
 
+    def test_update_ttl(self):
+        with tempfile.TemporaryDirectory() as d:
+            origin = os.path.join(d, 'origin')
+            clone = os.path.join(d, 'clone')
+            init(origin)
+            commit(origin, {'x.txt': 'a\n'})
+            call_git(d, 'clone', '-q', 'file://' + origin, clone)
+            tip = commit(origin, {'x.txt': 'a\nb\n'})
+
+            # the first project fetches, but does not touch the working tree
+            project = Project.from_disk(clone, update_ttl=timedelta(hours=1))
+            self.assertIsNotNone(project.last_updated())
+            self.assertEqual(project.repo.commit('origin/HEAD').hexsha, tip)
+            self.assertNotEqual(project.repo.head.commit.hexsha, tip)
+
+            # later projects do not fetch until the TTL expires
+            tip = commit(origin, {'x.txt': 'a\nb\nc\n'})
+            project = Project.from_disk(clone, update_ttl=timedelta(hours=1))
+            self.assertNotEqual(project.repo.commit('origin/HEAD').hexsha, tip)
+            self.assertFalse(project.needs_update(timedelta(hours=1)))
+            self.assertTrue(project.needs_update(timedelta(0)))
+
+            os.environ[Project.OFFLINE_ENV] = '1'
+            try:
+                project = Project.from_disk(clone)
+            finally:
+                del os.environ[Project.OFFLINE_ENV]
+            self.assertNotEqual(project.repo.commit('origin/HEAD').hexsha, tip)
+
+            project = Project.from_disk(clone, update_ttl=timedelta(0))
+            self.assertEqual(project.repo.commit('origin/HEAD').hexsha, tip)
+
+
 if __name__ == '__main__':
     unittest.main()
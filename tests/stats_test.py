@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import tempfile
+import unittest
+import git
+from blameandshame.project import Project
+from blameandshame.annotate import annotate, column_last_commit
+from blameandshame.stats import InstrumentedGit
+from tests.util import commit, init
+
+
+class StatsTestCase(unittest.TestCase):
+    def test_subcommand(self):
+        self.assertEqual(InstrumentedGit._subcommand(
+            ['git', '-c', 'a=b', '--no-pager', 'log', '-n', '1']), 'log')
+        self.assertEqual(InstrumentedGit._subcommand('git blame -p'), 'blame')
+
+    def test_stats(self):
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            for contents in ('a\n', 'a\nb\n'):
+                commit(d, {'x.txt': contents})
+
+            project = Project(git.Repo(d), offline=True)
+            version = project.repo.head.commit
+            self.assertEqual(project.stats()['calls'], {})
+
+            events = []
+            project.enable_stats(hook=events.append)
+            annotate(project, version, 'x.txt', [column_last_commit])
+            stats = project.stats()
+
+            calls = stats['calls']
+            self.assertEqual(calls['column_last_commit']['calls'], 2)
+            self.assertEqual(calls['annotate']['calls'], 1)
+            # one blame, and one read of the file through cat-file
+            self.assertEqual(calls['annotate']['git_calls'], 2)
+            self.assertEqual(calls['Project.last_commits_for_file']['calls'],
+                             2)
+            self.assertEqual(
+                calls['Project.last_commits_for_file']['cache_hits'], 1)
+            self.assertEqual(stats['git']['blame']['calls'], 1)
+            self.assertEqual(stats['git']['cat-file']['calls'], 1)
+            self.assertEqual(events[-1].name, 'annotate')
+            self.assertGreater(events[-1].wall_time, 0)
+
+            project.disable_stats()
+            annotate(project, version, 'x.txt', [column_last_commit])
+            self.assertEqual(project.stats()['calls'], {})
+
+    def test_blob_reads(self):
+        # reads through the persistent cat-file process are reported
+        with tempfile.TemporaryDirectory() as d:
+            init(d)
+            commit(d, {'x.txt': 'a\n', 'y.txt': 'b\n'})
+            project = Project.from_disk(d, offline=True)
+            version = project.repo.head.commit.hexsha
+            project.blobs.read(version, 'x.txt')
+            project.enable_stats()
+            project.blobs.read_many([(version, 'x.txt'), (version, 'y.txt')])
+            project.blobs.read(version, 'y.txt')
+            stats = project.stats()['git']['cat-file']
+            self.assertEqual(stats['calls'], 2)
+            self.assertGreater(stats['time'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
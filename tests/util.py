@@ -0,0 +1,70 @@
+"""
+Helpers for building small, local git repositories for use by tests.
+"""
+from typing import Dict, Optional, Tuple, Union
+import os
+import subprocess
+
+# The name and email address of the default author of each commit.
+AUTHOR = ('a', 'a@b')
+
+
+def call_git(repo_dir: str,
+             *args: str,
+             author: Tuple[str, str] = AUTHOR,
+             env: Optional[Dict[str, str]] = None
+             ) -> str:
+    """
+    Runs a git command within a given repository, as a given author, and
+    returns its output.
+    """
+    name, email = author
+    cmd = ['git', '-c', 'user.name=' + name, '-c', 'user.email=' + email]
+    out = subprocess.check_output(cmd + list(args), cwd=repo_dir, env=env)
+    return out.decode()
+
+
+def init(repo_dir: str) -> None:
+    """
+    Creates an empty repository, whose initial branch is named master, at a
+    given location.
+    """
+    os.makedirs(repo_dir, exist_ok=True)
+    call_git(repo_dir, 'init', '-q', '-b', 'master', repo_dir)
+
+
+def commit(repo_dir: str,
+           files: Dict[str, Union[str, bytes, None]],
+           message: str = 'x',
+           author: Tuple[str, str] = AUTHOR,
+           when: Optional[int] = None
+           ) -> str:
+    """
+    Writes the given files to the working tree of a repository and commits
+    every change to that tree.
+
+    Params:
+      files: The new contents of each file, given as text or as bytes. Files
+        whose contents are None are deleted.
+      message: The commit message.
+      author: The name and email address of the author (and committer).
+      when: An optional Unix timestamp, used as the author and committer date.
+
+    Returns:
+        The hash of the new commit.
+    """
+    for (name, contents) in files.items():
+        path = os.path.join(repo_dir, name)
+        if contents is None:
+            os.remove(path)
+            continue
+        mode = 'wb' if isinstance(contents, bytes) else 'w'
+        with open(path, mode) as f:
+            f.write(contents)
+    env = None
+    if when is not None:
+        date = '@{} +0000'.format(when)
+        env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    call_git(repo_dir, 'add', '-A')
+    call_git(repo_dir, 'commit', '-q', '-m', message, author=author, env=env)
+    return call_git(repo_dir, 'rev-parse', 'HEAD').strip()